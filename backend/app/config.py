@@ -31,6 +31,21 @@ UPLOAD_DIR = "uploads"
 # Output directory
 output_dir = 'output'
 
+# COBOL analysis parallelism: worker processes for create_cobol_json and the
+# project size below which the serial path is used (pool startup costs more)
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", os.cpu_count() or 1))
+PARALLEL_ANALYSIS_MIN_FILES = int(os.environ.get("PARALLEL_ANALYSIS_MIN_FILES", 64))
+
+# RAG embedding: chunk texts per request, requests in flight, retries of a failed
+# batch, and the gateway's per-minute request and token limits (0 for none)
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 256))
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", 4))
+EMBED_MAX_RETRIES = int(os.environ.get("EMBED_MAX_RETRIES", 5))
+EMBED_REQUESTS_PER_MINUTE = int(os.environ.get("EMBED_REQUESTS_PER_MINUTE", 0))
+EMBED_TOKENS_PER_MINUTE = int(os.environ.get("EMBED_TOKENS_PER_MINUTE", 0))
+# Size bound of the on-disk embedding cache in MB; least recently used vectors go first (0 disables it)
+EMBED_CACHE_MAX_MB = int(os.environ.get("EMBED_CACHE_MAX_MB", 1024))
+
 # Logging setup
 def setup_logging():
     # Get the root logger
@@ -2,13 +2,13 @@ from flask import Blueprint, request, jsonify, current_app
 from ..config import logger, AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_DEPLOYMENT_NAME
 from openai import AzureOpenAI
 import json, traceback, os
-from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Mapping
 from datetime import datetime
 from ..utils.prompts import (
     create_business_requirements_prompt,
     create_technical_requirements_prompt,
-    create_target_structure_prompt
+    create_target_structure_prompt,
+    create_program_structure_summary
 )
 from ..utils.endpoint import sendtoEGPT
 from ..utils.logs import (
@@ -18,8 +18,11 @@ from ..utils.logs import (
 )
 from ..utils.response import extract_json_from_response
 from ..utils.file_classifier import classify_uploaded_files
+from ..utils.source_registry import SourceRegistry
 # from ..utils.rag_indexer import load_vector_store, query_vector_store, index_files_for_rag
-from ..utils.cobol_analyzer import create_cobol_json
+from ..utils.cobol_analyzer import create_cobol_json, ANALYZER_VERSION
+from ..utils.cobol_parser import ast_from_record
+from ..utils import project_store
  
 bp = Blueprint('analysis', __name__, url_prefix='/cobo')
  
@@ -29,35 +32,13 @@ bp = Blueprint('analysis', __name__, url_prefix='/cobo')
 #     azure_endpoint=AZURE_OPENAI_ENDPOINT,
 # )
  
-def enhanced_classify_files(file_data: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+def enhanced_classify_files(file_data: Mapping[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
     """Enhanced file classification using existing classifier"""
     logger.info("=== ENHANCED FILE CLASSIFICATION STARTED ===")
  
-    basic_classified = classify_uploaded_files(file_data)
- 
-    enhanced = {
-        "COBOL Code": [],
-        "JCL": [],
-        "Copybooks": [],
-        "VSAM Definitions": [],
-        "BMS Maps": [],
-        "Control Files": [],
-        "Standards Documents": [],
-        "Unknown": []
-    }
- 
-    for category, files in basic_classified.items():
-        if category in enhanced:
-            for file_info in files:
-                if isinstance(file_info, dict) and "fileName" in file_info:
-                    enhanced_file_info = {
-                        "fileName": file_info["fileName"],
-                        "content": file_info.get("content", ""),
-                        "size": len(file_info.get("content", "")),
-                        "extension": Path(file_info["fileName"]).suffix.lower(),
-                        "lines": len(str(file_info.get("content", "")).split('\n'))
-                    }
-                    enhanced[category].append(enhanced_file_info)
+    # classify_uploaded_files already returns every category with size, extension and line
+    # counts, and its records refer to the uploaded content, so they are used as they are
+    enhanced = classify_uploaded_files(file_data)
  
     logger.info("=== ENHANCED FILE CLASSIFICATION COMPLETED ===")
     return enhanced
@@ -398,34 +379,35 @@ def reverse_engineer_cobol_code(cobol_code: str, project_id: str, include_depend
             "project_id": project_id
         }
  
-def create_target_structure_analysis(project_id: str, file_data: Dict[str, Any], classified_files: Dict[str, List[Dict[str, Any]]], business_requirements: Dict[str, Any] = None, technical_requirements: Dict[str, Any] = None, reverse_engineering: Dict[str, Any] = None) -> Dict[str, Any]:
+def create_target_structure_analysis(project_id: str, sources: SourceRegistry, classified_files: Dict[str, List[Dict[str, Any]]], business_requirements: Dict[str, Any] = None, technical_requirements: Dict[str, Any] = None, reverse_engineering: Dict[str, Any] = None) -> Dict[str, Any]:
     """Create target structure analysis using GPT"""
     logger.info(f"=== TARGET STRUCTURE ANALYSIS STARTED for project: {project_id} ===")
  
-    # Combine all COBOL-related content
-    cobol_content = ""
-    for category in ["COBOL Code", "Copybooks", "JCL", "VSAM Definitions", "BMS Maps", "Control Files"]:
-        for file_info in classified_files.get(category, []):
-            cobol_content += f"\n\n=== {file_info['fileName']} ===\n{file_info['content']}"
+    # Combine all COBOL-related content, joined once from the request's sources
+    cobol_content = sources.join(
+        (file_info["fileName"]
+         for category in ["COBOL Code", "Copybooks", "JCL", "VSAM Definitions", "BMS Maps", "Control Files"]
+         for file_info in classified_files.get(category, [])),
+        separator="\n\n", headers=True)
  
     if not cobol_content.strip():
         logger.warning("No COBOL content found for target structure analysis")
         return {"error": "No COBOL content available for analysis"}
  
-    # Use the dynamic, detailed prompt
-    structure_prompt = create_target_structure_prompt( cobol_content)
- 
     # Add business and technical requirements context if available
     requirements_context = ""
     if business_requirements and technical_requirements:
         requirements_context = f"\n\nBUSINESS REQUIREMENTS:\n{json.dumps(business_requirements, indent=2)}\n\nTECHNICAL REQUIREMENTS:\n{json.dumps(technical_requirements, indent=2)}"
-        structure_prompt += requirements_context
  
  
     # Add reverse engineering context if available
+    reverse_engineering_context = ""
     if reverse_engineering:
         reverse_engineering_context = f"\n\nREVERSE ENGINEERING ANALYSIS:\n{json.dumps(reverse_engineering, indent=2)}"
-        structure_prompt += reverse_engineering_context
+ 
+    # Use the dynamic, detailed prompt, assembled in one step so the sources are not copied once per context
+    structure_prompt = "".join((create_target_structure_prompt( cobol_content), requirements_context, reverse_engineering_context))
+    del cobol_content
  
     try:
         structure_msgs = [
@@ -464,13 +446,9 @@ def create_target_structure_analysis(project_id: str, file_data: Dict[str, Any],
  
         structure_json = extract_json_from_response(structure_response)
  
-        # Save target structure JSON
-        output_dir = os.path.join("output", "analysis", project_id)
-        os.makedirs(output_dir, exist_ok=True)
-        structure_path = os.path.join(output_dir, "target_structure.json")
-        with open(structure_path, "w") as f:
-            json.dump(structure_json, f, indent=2)
-        logger.info(f"Target structure saved to: {structure_path}")
+        # Save target structure
+        project_store.save_stage(project_id, "target_structure", structure_json)
+        logger.info(f"Target structure saved for project: {project_id}")
  
         logger.info("=== TARGET STRUCTURE ANALYSIS COMPLETED ===")
         return structure_json
@@ -481,8 +459,15 @@ def create_target_structure_analysis(project_id: str, file_data: Dict[str, Any],
  
 @bp.route("/analysis-status", methods=["GET"])
 def analysis_status():
-    """Return the current analysis status for the project"""
+    """
+    Return the current analysis status for the project.
+
+    With a projectId query parameter the status comes from the project store
+    (file counts, stage timestamps and metadata; no stage output is read).
+    """
     try:
+        if request.args.get("projectId"):
+            return jsonify(project_store.project_status(request.args["projectId"]))
         project_id = current_app.comprehensive_analysis_data.get("project_id", "N/A")
         cobol_files = current_app.comprehensive_analysis_data.get("cobol_files", {})
         rag_status = {
@@ -510,7 +495,8 @@ def analyze_requirements():
     6) Index files for RAG
     """
     try:
-        data = request.json
+        # Not cached: the raw body would otherwise stay alive beside the parsed sources
+        data = request.get_json(cache=False)
         log_request_details("ANALYZE REQUIREMENTS", data)
         if not data:
             return jsonify({"error": "No data provided"}), 400
@@ -527,14 +513,13 @@ def analyze_requirements():
         }, 1)
  
         # 1) CLASSIFY FILES
-        file_data = data.get("file_data", {})
-        if isinstance(file_data, str):
-            file_data = json.loads(file_data)
+        # Every later step shares the registry's strings; the request body lets go of its own
+        sources = SourceRegistry(data.pop("file_data", {}))
  
-        if not file_data:
+        if not sources:
             return jsonify({"error": "No file data provided"}), 400
  
-        classified = enhanced_classify_files(file_data)
+        classified = enhanced_classify_files(sources)
  
         log_processing_step("File classification completed", {
             "total_files": sum(len(files) for files in classified.values()),
@@ -547,15 +532,9 @@ def analyze_requirements():
         log_processing_step("Generating COBOL analysis JSON", {"project_id": project_id}, 3)
         cobol_json = create_cobol_json(project_id)
  
-        # Save COBOL JSON
-        output_dir = os.path.join("output", "analysis", project_id)
-        os.makedirs(output_dir, exist_ok=True)
-        analysis_path = os.path.join(output_dir, "cobol_analysis.json")
-        with open(analysis_path, "w") as f:
-            json.dump(cobol_json, f, indent=2)
-        logger.info(f"COBOL JSON created at: {analysis_path}")
+        # create_cobol_json stores the analysis and exports cobol_analysis.json itself
  
-        cobol_list = [f["content"] for f in classified.get("COBOL Code", [])]
+        cobol_list = [f["fileName"] for f in classified.get("COBOL Code", [])]
         if not cobol_list:
             return jsonify({"error": "No COBOL code found"}), 400
  
@@ -564,7 +543,7 @@ def analyze_requirements():
             "project_id": project_id
         }, 4)
  
-        cobol_code_str = "\n".join(cobol_list)
+        cobol_code_str = sources.join(cobol_list)
  
  
  
@@ -590,7 +569,6 @@ def analyze_requirements():
         }, 5)
  
         # Combine COBOL code and analysis
-        cobol_code_str = "\n".join(cobol_list)
         cobol_analysis_str = json.dumps(cobol_json, indent=2)
  
         # Add standards context
@@ -599,8 +577,12 @@ def analyze_requirements():
             standards_context = f"\n\nSTANDARDS DOCUMENTS CONTEXT:\n{chr(10).join(current_app.standards_documents)}\n"
             logger.info(f"Adding standards context with {len(current_app.standards_documents)} documents")
  
-        bus_prompt = create_business_requirements_prompt(src, cobol_code_str) + standards_context + f"\n\nCOBOL ANALYSIS:\n{cobol_analysis_str}"
-        tech_prompt = create_technical_requirements_prompt(src, tgt, cobol_code_str) + standards_context + f"\n\nCOBOL ANALYSIS:\n{cobol_analysis_str}"
+        # Outline from the ASTs stored by create_cobol_json, so the code is not parsed again;
+        # they are read one file at a time rather than as the whole project's AST at once
+        program_structure = create_program_structure_summary(
+            (path, ast_from_record(record)) for path, record in project_store.iter_file_asts(project_id, ANALYZER_VERSION))
+
+        bus_prompt = create_business_requirements_prompt(src, cobol_code_str, program_structure) + standards_context + f"\n\nCOBOL ANALYSIS:\n{cobol_analysis_str}"
  
         # Business Requirements Analysis
         business_msgs = [
@@ -660,6 +642,10 @@ def analyze_requirements():
         business_json = extract_json_from_response(business_response)
  
         # Technical Requirements Analysis
+        # Built once the business prompt is released, so only one prompt copy of the sources is held at a time
+        del business_msgs, bus_prompt
+        tech_prompt = create_technical_requirements_prompt(src, tgt, cobol_code_str, program_structure) + standards_context + f"\n\nCOBOL ANALYSIS:\n{cobol_analysis_str}"
+        del cobol_code_str
         technical_msgs = [
             {
                 "role": "system",
@@ -696,20 +682,13 @@ def analyze_requirements():
         log_gpt_interaction("TECHNICAL_REQUIREMENTS", AZURE_OPENAI_DEPLOYMENT_NAME, technical_msgs, technical_response)
  
         technical_json = extract_json_from_response(technical_response)
+        del technical_msgs, tech_prompt
  
         # Save requirements
-        output_dir = os.path.join("output", "analysis", project_id)
-        os.makedirs(output_dir, exist_ok=True)
-        # Save business requirements
-        business_req_path = os.path.join(output_dir, "business_requirements.json")
-        with open(business_req_path, "w", encoding="utf-8") as f:
-            json.dump(business_json, f, indent=2)
-        logger.info(f"Business requirements saved to: {business_req_path}")
-        # Save technical requirements
-        tech_req_path = os.path.join(output_dir, "technical_requirements.json")
-        with open(tech_req_path, "w", encoding="utf-8") as f:
-            json.dump(technical_json, f, indent=2)
-        logger.info(f"Technical requirements saved to: {tech_req_path}")
+        project_store.save_stage(project_id, "business_requirements", business_json)
+        logger.info(f"Business requirements saved for project: {project_id}")
+        project_store.save_stage(project_id, "technical_requirements", technical_json)
+        logger.info(f"Technical requirements saved for project: {project_id}")
  
         # Save reverse engineering analysis
         # reverse_engineering_path = os.path.join(output_dir, "reverse_engineering_analysis.json")
@@ -719,7 +698,7 @@ def analyze_requirements():
  
         # 5) GENERATE TARGET STRUCTURE JSON (USING REQUIREMENTS, AND REVERSE ENGINEERING)
         log_processing_step("Generating target structure analysis with requirements and reverse engineering", {"project_id": project_id}, 8)
-        target_structure = create_target_structure_analysis(project_id, file_data, classified, business_json, technical_json)
+        target_structure = create_target_structure_analysis(project_id, sources, classified, business_json, technical_json)
  
         # 5) INDEX FOR RAG (COMMENTED OUT)
         # log_processing_step("Indexing files for RAG", {"project_id": project_id}, 8)
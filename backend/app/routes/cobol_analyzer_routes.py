@@ -1,16 +1,34 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from ..config import logger
-from ..utils.cobol_analyzer import create_cobol_json
+from ..utils.cobol_analyzer import create_cobol_json, stream_cobol_json
+from ..utils.call_graph import load_call_graph
+from ..utils.symbol_index import load_symbol_index, source_slice
+from ..utils.jcl_parser import load_jcl_graph
+from ..utils.record_layout import load_layouts, field_to_dict, flatten_layout
+from ..utils.record_decoder import decoder_for, DEFAULT_BATCH_RECORDS, DEFAULT_ENCODING
+from ..utils.data_migration import migrate_data_file, migration_target
+from ..utils.archive_ingest import archive_format, ingest_archive
+from ..utils import project_store
 from ..utils.rag_indexer import index_files_for_rag, index_standards_document, load_vector_store, query_vector_store
 from pathlib import Path
 import uuid
 import json
+import time
 
 bp = Blueprint('cobol_analyzer', __name__, url_prefix='/cobo')
 
 @bp.route("/upload-cobol-files", methods=["POST"])
 def upload_cobol_files():
-    """Upload COBOL files for a project."""
+    """
+    Upload COBOL files for a project.
+
+    Form: files (.cbl, .cpy and .jcl members, or .zip, .tar, .tar.gz/.tgz and
+    .tar.zst/.tzst archives of them, e.g. exported PDS libraries), optional
+    project_id to add them to an existing project and analyze ("true" to run
+    /analyze-cobol on the project right away). Archives are streamed member
+    by member into the project (see archive_ingest.ingest_archive); members
+    the project already holds with the same content are not rewritten.
+    """
     try:
         if 'files' not in request.files:
             return jsonify({"error": "No files provided"}), 400
@@ -19,13 +37,25 @@ def upload_cobol_files():
         if not files:
             return jsonify({"error": "No files selected"}), 400
 
-        project_id = str(uuid.uuid4())
-        project_dir = Path(current_app.config["UPLOAD_DIR"]) / project_id
+        project_id = request.form.get("project_id") or str(uuid.uuid4())
+        upload_root = Path(current_app.config["UPLOAD_DIR"]).resolve()
+        project_dir = (upload_root / project_id).resolve()
+        if project_dir.parent != upload_root:
+            return jsonify({"error": f"Invalid project ID: {project_id}"}), 400
         project_dir.mkdir(exist_ok=True, parents=True)
         uploaded_files = []
+        archives = []
 
         for file in files:
-            if file.filename and file.filename.lower().endswith((".cbl", ".cpy", ".jcl")):
+            if file.filename and archive_format(file.filename):
+                try:
+                    summary = ingest_archive(file.stream, file.filename, project_dir)
+                    uploaded_files.extend(summary["written"])
+                    archives.append({"archive": file.filename, **summary})
+                except Exception as e:
+                    logger.error(f"Error ingesting archive {file.filename}: {e}")
+                    archives.append({"archive": file.filename, "error": str(e)})
+            elif file.filename and file.filename.lower().endswith((".cbl", ".cpy", ".jcl")):
                 file_path = project_dir / file.filename
                 try:
                     file.save(file_path)
@@ -36,11 +66,19 @@ def upload_cobol_files():
             else:
                 logger.warning(f"Skipping invalid file: {file.filename}")
 
-        return jsonify({
+        response = {
             "project_id": project_id,
             "status": "Files uploaded successfully",
             "uploaded_files": uploaded_files
-        })
+        }
+        if archives:
+            response["archives"] = archives
+        if request.form.get("analyze", "").lower() == "true":
+            cobol_json = create_cobol_json(project_id)
+            current_app.comprehensive_analysis_data["cobol_analysis"] = cobol_json  # Share with analysis.py
+            response["analysis_cache"] = cobol_json["analysis_cache"]
+            response["output_path"] = str(Path(current_app.config["output_dir"]) / "analysis" / project_id / "cobol_analysis.json")
+        return jsonify(response)
     except Exception as e:
         logger.error(f"Error uploading COBOL files: {e}")
         return jsonify({"error": str(e)}), 500
@@ -90,24 +128,281 @@ def upload_standards_documents():
 
 @bp.route("/analyze-cobol", methods=["POST"])
 def analyze_cobol():
-    """Analyze uploaded COBOL files and generate JSON summary."""
+    """
+    Analyze uploaded COBOL files and generate JSON summary.
+
+    Body: project_id, optional workers and stream. With "stream": true the
+    response is NDJSON (application/x-ndjson): one line per file as soon as
+    it is analyzed, then a summary line (see cobol_analyzer.stream_cobol_json).
+    A failure after the first line is reported as a last {"type": "error"} line.
+    """
     try:
         data = request.json
         if not data or "project_id" not in data:
             return jsonify({"error": "Project ID is required"}), 400
 
         project_id = data["project_id"]
-        cobol_json = create_cobol_json(project_id)
+        workers = data.get("workers")  # Optional override of ANALYSIS_WORKERS
+        workers = int(workers) if workers is not None else None
+        if data.get("stream"):
+            lines = stream_cobol_json(project_id, workers=workers)
+            # The first line is produced here so that a missing project is still a JSON error
+            first = next(lines, None)
+
+            def generate():
+                try:
+                    if first is not None:
+                        yield first
+                    yield from lines
+                except Exception as e:
+                    logger.error(f"Error during streamed COBOL analysis: {e}")
+                    yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+        cobol_json = create_cobol_json(project_id, workers=workers)
         current_app.comprehensive_analysis_data["cobol_analysis"] = cobol_json  # Share with analysis.py
         return jsonify({
             "project_id": project_id,
             "status": "Analysis completed",
+            "analysis_cache": cobol_json["analysis_cache"],
             "output_path": str(Path(current_app.config["output_dir"]) / "analysis" / project_id / "cobol_analysis.json")
         })
     except Exception as e:
         logger.error(f"Error during COBOL analysis: {e}")
         return jsonify({"error": str(e)}), 500
 
+@bp.route("/call-graph", methods=["POST"])
+def call_graph_query():
+    """
+    Query the PERFORM/GO TO/CALL graph built by /analyze-cobol.
+
+    Body: project_id, query (summary, callees, callers, reachable or scc) and,
+    except for summary, node ("PROGRAM", "PROGRAM.PARAGRAPH" or a unique
+    paragraph name). reachable accepts "reverse" and "max_depth"; scc without
+    a node lists the cycles of the project.
+    """
+    try:
+        data = request.json
+        if not data or "project_id" not in data:
+            return jsonify({"error": "Project ID is required"}), 400
+
+        project_id = data["project_id"]
+        query = data.get("query", "summary")
+        graph = load_call_graph(project_id)
+        if graph is None:
+            return jsonify({"error": "Call graph not found. Run analysis first."}), 404
+
+        started = time.perf_counter()
+        response = {"project_id": project_id, "query": query}
+        if query == "summary":
+            response["summary"] = graph.header
+        elif query == "scc" and not data.get("node"):
+            response["results"] = graph.cycles(int(data.get("limit", 100)))
+        elif query in ("callees", "callers", "reachable", "scc"):
+            if not data.get("node"):
+                return jsonify({"error": f"node is required for {query}"}), 400
+            try:
+                node = graph.node(data["node"])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 404
+            response["node"] = graph.describe(node)
+            if query == "callees":
+                response["results"] = graph.callees(node)
+            elif query == "callers":
+                response["results"] = graph.callers(node)
+            elif query == "reachable":
+                max_depth = data.get("max_depth")
+                response["results"] = graph.reachable(node, bool(data.get("reverse")), int(max_depth) if max_depth is not None else None)
+            else:
+                response["results"] = graph.component_of(node)
+        else:
+            return jsonify({"error": f"Unknown query: {query}"}), 400
+
+        response["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return jsonify(response)
+    except Exception as e:
+        logger.error(f"Error during call graph query: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route("/symbols", methods=["POST"])
+def symbol_query():
+    """
+    Look up data names in the cross-reference index built by /analyze-cobol.
+
+    Body: project_id and either name (definitions and reference sites, with
+    optional max_references and include_code to attach the exact source
+    slices) or prefix (matching names).
+    """
+    try:
+        data = request.json
+        if not data or "project_id" not in data or not (data.get("name") or data.get("prefix")):
+            return jsonify({"error": "Project ID and name or prefix are required"}), 400
+
+        project_id = data["project_id"]
+        index = load_symbol_index(project_id)
+        if index is None:
+            return jsonify({"error": "Symbol index not found. Run analysis first."}), 404
+
+        if not data.get("name"):
+            return jsonify({"project_id": project_id, "names": index.search(data["prefix"], int(data.get("limit", 100)))})
+
+        max_references = data.get("max_references")
+        symbol = index.lookup(data["name"], int(max_references) if max_references is not None else None)
+        if symbol is None:
+            return jsonify({"error": f"Data name not found: {data['name']}"}), 404
+        if data.get("include_code"):
+            for site in symbol["definitions"] + symbol["references"]:
+                site["code"] = source_slice(project_id, site["file"], site["start"], site["end"])
+        return jsonify({"project_id": project_id, **symbol})
+    except Exception as e:
+        logger.error(f"Error during symbol query: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route("/exec-blocks", methods=["POST"])
+def exec_block_query():
+    """
+    EXEC SQL/CICS/DLI blocks indexed by /analyze-cobol, e.g. to send only a program's I/O code to the model.
+
+    Body: project_id and optional filters kind (SQL, CICS, DLI), verb (SELECT,
+    DECLARE CURSOR, READ, SEND MAP, ...), name (a table, cursor, host variable
+    or resource), file, paragraph and limit; include_code attaches the source
+    of each block.
+    """
+    try:
+        data = request.json
+        if not data or "project_id" not in data:
+            return jsonify({"error": "Project ID is required"}), 400
+
+        project_id = data["project_id"]
+        if "cobol_analysis" not in project_store.stage_status(project_id):
+            return jsonify({"error": "COBOL analysis not found. Run analysis first."}), 404
+        filters = {key: str(data[key]).upper() for key in ("kind", "verb", "name", "paragraph") if data.get(key)}
+        limit = data.get("limit")
+        blocks = project_store.find_exec_blocks(project_id, file_path=data.get("file") or None,
+                                                limit=int(limit) if limit is not None else None, **filters)
+        if data.get("include_code"):
+            for block in blocks:
+                block["code"] = source_slice(project_id, block["file"], block["start"], block["end"])
+        return jsonify({"project_id": project_id, "count": len(blocks), "blocks": blocks})
+    except Exception as e:
+        logger.error(f"Error during EXEC block query: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route("/record-layout", methods=["POST"])
+def record_layout_query():
+    """
+    Compiled record layouts (byte offsets and lengths of every field) of a copybook or program.
+
+    Body: project_id, member (copybook member name or project-relative file
+    path), optional record (name of one 01/77 record) and flat (one row per
+    field with its dotted path instead of the nested tree).
+    """
+    try:
+        data = request.json
+        if not data or "project_id" not in data or not data.get("member"):
+            return jsonify({"error": "Project ID and member are required"}), 400
+
+        project_id = data["project_id"]
+        records = load_layouts(project_id, data["member"])
+        if records is None:
+            return jsonify({"error": f"No layouts for {data['member']}. Run analysis first."}), 404
+        if data.get("record"):
+            name = str(data["record"]).upper()
+            records = [record for record in records if record.name == name]
+            if not records:
+                return jsonify({"error": f"Record not found: {name}"}), 404
+
+        if data.get("flat"):
+            layouts = [{"record": record.name, "length": record.length, "fields": flatten_layout(record)} for record in records]
+        else:
+            layouts = [field_to_dict(record) for record in records]
+        return jsonify({"project_id": project_id, "member": data["member"], "records": layouts})
+    except Exception as e:
+        logger.error(f"Error during record layout query: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route("/migrate-data", methods=["POST"])
+def migrate_data():
+    """
+    Bulk-load an uploaded data file of fixed-length records into the project's SQLite migration database.
+
+    Body: project_id, member (copybook describing the records), data_file
+    (path under the project's upload directory), optional record (01 name;
+    defaults to the longest record), table, encoding (default cp037),
+    batch_records and restart (reload from the start instead of resuming).
+    """
+    try:
+        data = request.json
+        if not data or "project_id" not in data or not data.get("member") or not data.get("data_file"):
+            return jsonify({"error": "Project ID, member and data_file are required"}), 400
+
+        project_id = data["project_id"]
+        project_dir = (Path(current_app.config["UPLOAD_DIR"]) / project_id).resolve()
+        data_path = (project_dir / data["data_file"]).resolve()
+        if project_dir not in data_path.parents or not data_path.is_file():
+            return jsonify({"error": f"Data file not found: {data['data_file']}"}), 404
+
+        records = load_layouts(project_id, data["member"])
+        if records is None:
+            return jsonify({"error": f"No layouts for {data['member']}. Run analysis first."}), 404
+        try:
+            decoder = decoder_for(records, data.get("record"), data.get("encoding", DEFAULT_ENCODING))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 404
+
+        summary = migrate_data_file(decoder, data_path, migration_target(project_id), data.get("table"),
+                                    int(data.get("batch_records", DEFAULT_BATCH_RECORDS)), not data.get("restart"))
+        return jsonify({"project_id": project_id, **summary})
+    except Exception as e:
+        logger.error(f"Error during data migration: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route("/jcl-graph", methods=["POST"])
+def jcl_graph_query():
+    """
+    Query the job/step/program/dataset graph built from the project's JCL by /analyze-cobol.
+
+    Body: project_id and query: summary, schedule (run order in waves, jobs on
+    cycles and shared datasets), job (steps of "job"), program (steps that run
+    "program") or dataset (writers and readers of "dataset").
+    """
+    try:
+        data = request.json
+        if not data or "project_id" not in data:
+            return jsonify({"error": "Project ID is required"}), 400
+
+        project_id = data["project_id"]
+        query = data.get("query", "summary")
+        graph = load_jcl_graph(project_id)
+        if graph is None:
+            return jsonify({"error": "JCL graph not found. Run analysis first."}), 404
+
+        response = {"project_id": project_id, "query": query}
+        if query == "summary":
+            response["summary"] = graph["header"]
+        elif query == "schedule":
+            response.update({key: graph[key] for key in ("schedule", "cyclic_jobs", "dependencies", "shared_datasets")})
+        elif query in ("job", "program", "dataset"):
+            name = data.get(query)
+            if not name:
+                return jsonify({"error": f"{query} is required"}), 400
+            name = str(name).upper()
+            if query == "job":
+                result = [job for job in graph["jobs"] if name in (job["id"], job["name"])]
+            elif query == "program":
+                result = graph["programs"].get(name)
+            else:
+                result = graph["datasets"].get(name)
+            if not result:
+                return jsonify({"error": f"{query.capitalize()} not found: {name}"}), 404
+            response["results"] = result
+        else:
+            return jsonify({"error": f"Unknown query: {query}"}), 400
+        return jsonify(response)
+    except Exception as e:
+        logger.error(f"Error during JCL graph query: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @bp.route("/index-rag", methods=["POST"])
 def index_rag():
     """Index COBOL analysis JSON for RAG."""
@@ -117,13 +412,10 @@ def index_rag():
             return jsonify({"error": "Project ID is required"}), 400
 
         project_id = data["project_id"]
-        cobol_json_path = Path(current_app.config["output_dir"]) / "analysis" / project_id / "cobol_analysis.json"
-        if not cobol_json_path.exists():
+        cobol_json = project_store.load_stage(project_id, "cobol_analysis")
+        if cobol_json is None:
             return jsonify({"error": "COBOL analysis JSON not found. Run analysis first."}), 404
 
-        with open(cobol_json_path, "r") as f:
-            cobol_json = json.load(f)
-
         index_files_for_rag(project_id, cobol_json)
         return jsonify({
             "project_id": project_id,
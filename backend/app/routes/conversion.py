@@ -8,7 +8,10 @@ from ..utils.prompts import  create_unit_test_prompt, create_functional_test_pro
 from ..utils.logs import log_request_details, log_processing_step, log_gpt_interaction
 from ..utils.response import extract_json_from_response
 from ..utils.db_usage import detect_database_usage
+from ..utils.cobol_parser import load_project_ast
+from ..utils import project_store
 from ..utils.db_templates import get_db_template
+from ..utils.source_reader import read_source
 from ..utils.prompts import  create_cobol_to_dotnet_conversion_prompt
 import json
 import re
@@ -467,8 +470,7 @@ def get_source_code_from_project(project_id):
             source_code = {}
             for file_path in uploads_dir.glob("**/*"):
                 if file_path.is_file() and file_path.suffix.lower() in ['.cbl', '.cpy', '.jcl']:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        source_code[file_path.name] = f.read()
+                    source_code[file_path.name] = read_source(file_path)
  
             if source_code:
                 logger.info(f"Loaded {len(source_code)} files from uploads directory")
@@ -481,54 +483,24 @@ def get_source_code_from_project(project_id):
         logger.error(f"Error getting source code for project {project_id}: {str(e)}")
         return {}
  
-def load_analysis_data(project_id):
-    """Load analysis data including cobol_analysis.json, target_structure.json"""
-    analysis_data = {}
- 
-    # Load COBOL analysis
-    cobol_analysis_path = os.path.join("output", "analysis", project_id, "cobol_analysis.json")
-    if os.path.exists(cobol_analysis_path):
-        with open(cobol_analysis_path, "r", encoding="utf-8") as f:
-            analysis_data["cobol_analysis"] = json.load(f)
-        logger.info(f"Loaded COBOL analysis for project: {project_id}")
-    else:
-        logger.warning(f"COBOL analysis not found for project: {project_id}")
- 
-    # Load target structure
-    target_structure_path = os.path.join("output", "analysis", project_id, "target_structure.json")
-    if os.path.exists(target_structure_path):
-        with open(target_structure_path, "r", encoding="utf-8") as f:
-            analysis_data["target_structure"] = json.load(f)
-        logger.info(f"Loaded target structure for project: {project_id}")
-    else:
-        logger.warning(f"Target structure not found for project: {project_id}")
- 
- 
-    # Load reverse engineering analysis
-    reverse_engineering_path = os.path.join("output", "analysis", project_id, "reverse_engineering_analysis.json")
-    if os.path.exists(reverse_engineering_path):
-        with open(reverse_engineering_path, "r", encoding="utf-8") as f:
-            analysis_data["reverse_engineering"] = json.load(f)
-        logger.info(f"Loaded reverse engineering analysis for project: {project_id}")
-    else:
-        logger.warning(f"Reverse engineering analysis not found for project: {project_id}")
- 
-    business_requirements_path = os.path.join("output", "analysis", project_id, "business_requirements.json")
-    if os.path.exists(business_requirements_path):
-        with open(business_requirements_path, "r", encoding="utf-8") as f:
-            analysis_data["business_requirements"] = json.load(f)
-        logger.info(f"Loaded business requirements for project: {project_id}")
-    else:
-        logger.warning(f"Business Requirements not found for project: {project_id}")
- 
-    technical_requirements_path = os.path.join("output", "analysis", project_id, "technical_requirements.json")
-    if os.path.exists(technical_requirements_path):
-        with open(technical_requirements_path, "r", encoding="utf-8") as f:
-            analysis_data["technical_requirements"] = json.load(f)
-        logger.info(f"Loaded technical requirements for project: {project_id}")
-    else:
-        logger.warning(f"Technical Requirements not found for project: {project_id}")
- 
+def load_analysis_data(project_id, stages=None):
+    """
+    Load analysis stage outputs of a project from the project store.
+
+    Args:
+        project_id: Project identifier
+        stages: Stages to load (see project_store.STAGE_FILES); all of them by default
+
+    Returns:
+        Stage name -> document for the stages that have run
+    """
+    stages = list(project_store.STAGE_FILES) if stages is None else stages
+    analysis_data = project_store.load_stages(project_id, stages)
+    for stage in stages:
+        if stage in analysis_data:
+            logger.info(f"Loaded {stage.replace('_', ' ')} for project: {project_id}")
+        else:
+            logger.warning(f"{stage.replace('_', ' ').capitalize()} not found for project: {project_id}")
     return analysis_data
  
 @bp.route("/convert", methods=["POST"])
@@ -543,14 +515,13 @@ def convert_cobol_to_csharp():
  
         logger.info(f"Starting conversion for project: {project_id}")
  
-        # Load analysis data (cobol_analysis.json and target_structure.json)
-        analysis_data = load_analysis_data(project_id)
- 
-        if not analysis_data.get("cobol_analysis"):
+        # Only the stages used by the prompts are read; the COBOL analysis just has to exist
+        if "cobol_analysis" not in project_store.stage_status(project_id):
             logger.error(f"No COBOL analysis data found for project: {project_id}")
             return jsonify({"error": "No analysis data found. Please run analysis first.", "files": {}}), 400
  
-        cobol_json = analysis_data["cobol_analysis"]
+        analysis_data = load_analysis_data(project_id, ["target_structure", "business_requirements",
+                                                        "technical_requirements", "reverse_engineering"])
         target_structure = analysis_data.get("target_structure", {})
         business_requirements = analysis_data.get("business_requirements", {})
         technical_requirements = analysis_data.get("technical_requirements", {})
@@ -580,10 +551,12 @@ def convert_cobol_to_csharp():
                 elif isinstance(file_data, str):
                     source_code[file_name] = file_data
  
-        # Second try: from project files
+        # Second try: from project files, whose ASTs were persisted by the analysis
+        project_ast = {}
         if not source_code:
             logger.info("Getting source code from project files")
             source_code = get_source_code_from_project(project_id)
+            project_ast = load_project_ast(project_id)
  
         # Validate source code
         if not source_code:
@@ -591,25 +564,24 @@ def convert_cobol_to_csharp():
             return jsonify({"error": "No source code found. Please upload COBOL files first.", "files": {}}), 400
  
         # Filter only COBOL-related files
-        cobol_code_list = []
+        cobol_sources = {}
         for file_name, content in source_code.items():
             if isinstance(content, str) and content.strip():
                 # Check if it's a COBOL file
                 if (file_name.lower().endswith(('.cbl', '.cpy', '.jcl')) or
                     any(keyword in content.upper() for keyword in ['IDENTIFICATION DIVISION', 'PROGRAM-ID', 'PROCEDURE DIVISION', 'WORKING-STORAGE'])):
-                    cobol_code_list.append(content)
+                    cobol_sources[file_name] = content
                     logger.info(f"Added COBOL file: {file_name}")
  
-        if not cobol_code_list:
+        if not cobol_sources:
             logger.error("No valid COBOL code found in source files")
             return jsonify({"error": "No valid COBOL code found for conversion.", "files": {}}), 400
  
-        logger.info(f"Found {len(cobol_code_list)} COBOL files for conversion")
+        logger.info(f"Found {len(cobol_sources)} COBOL files for conversion")
  
         # Prepare conversion data
-        print(cobol_code_list)
-        cobol_code_str = "\n".join(cobol_code_list)
-        print(cobol_code_str)
+        logger.debug(f"Conversion sources: {', '.join(f'{name} ({len(content)} chars)' for name, content in cobol_sources.items())}")
+        cobol_code_str = "\n".join(cobol_sources.values())
         target_structure_str = json.dumps(target_structure, indent=2)
         business_requirements_str = json.dumps(business_requirements, indent=2)
         technical_requirements_str = json.dumps(technical_requirements, indent=2)
@@ -631,13 +603,13 @@ def convert_cobol_to_csharp():
         #         logger.warning("No RAG results returned from vector store")
  
         # Detect database usage and get DB template
-        db_usage = detect_database_usage(cobol_code_str, source_language="COBOL")
+        db_usage = detect_database_usage(cobol_sources, source_language="COBOL", ast=project_ast or None)
         db_type = db_usage.get("db_type", "none")
  
-        # Use enhanced EF Core template for better implementation
+        # Follow the EF Core template with mapping notes for each data store the programs use
         if db_usage.get("has_db", False):
-            db_setup_template = get_db_template("C# Advanced")
-            logger.info("Using advanced Entity Framework Core template")
+            db_setup_template = get_db_template("C#", db_usage["flavors"])
+            logger.info(f"Using Entity Framework Core template for {', '.join(db_usage['flavors'])}")
         else:
             db_setup_template = get_db_template("C#")
             logger.info("Using standard Entity Framework Core template")
@@ -0,0 +1,217 @@
+from array import array
+from itertools import accumulate
+from sys import intern
+from typing import Any, Dict, List, Optional
+import orjson
+
+# Bump whenever the record layout written by model_to_record changes
+MODEL_FORMAT = 1
+
+SECTION_NAMES = ("working_storage", "linkage_section", "file_section")
+
+
+class LineTable:
+    """
+    The logical source lines of one member held as a single string.
+
+    Lines are addressed by index; ``starts`` holds the offset of every line plus
+    a trailing end offset, so a line costs four bytes instead of a str object.
+    """
+    __slots__ = ("text", "starts")
+
+    def __init__(self, text: str = "", starts: Optional[array] = None):
+        self.text = text
+        self.starts = starts if starts is not None else array("I", [0])
+
+    @classmethod
+    def from_lines(cls, lines: List[str]) -> "LineTable":
+        # Each line takes its length plus the newline; map/accumulate keep the loop in C
+        starts = array("I", accumulate(map((1).__add__, map(len, lines)), initial=0))
+        return cls("\n".join(lines) + "\n" if lines else "", starts)
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return self.text[self.starts[index]:self.starts[index + 1] - 1]
+
+    def split(self) -> List[str]:
+        """All lines as a list, for callers that look up many of them."""
+        return self.text.split("\n")[:-1]
+
+
+class DataItem:
+    """A data description entry (level, name and the clause text after the name)."""
+    __slots__ = ("section", "level", "name", "type")
+
+    def __init__(self, section: str, level: str, name: str, type: str):
+        self.section = intern(section)
+        self.level = intern(level)
+        self.name = intern(name)
+        self.type = intern(type)
+
+
+class CopyStatement:
+    """A COPY statement spanning lines ``first_line`` to ``last_line`` of the line table."""
+    __slots__ = ("name", "first_line", "last_line", "replacing")
+
+    def __init__(self, name: str, first_line: int, last_line: int, replacing: List[List[str]]):
+        self.name = intern(name)
+        self.first_line = first_line
+        self.last_line = last_line
+        self.replacing = replacing
+
+
+class CicsCommand:
+    """An EXEC CICS command; ``offset`` is where EXEC starts within its line."""
+    __slots__ = ("type", "line", "offset", "paragraph")
+
+    def __init__(self, type: str, line: int, offset: int, paragraph: Optional[str]):
+        self.type = intern(type)
+        self.line = line
+        self.offset = offset
+        self.paragraph = paragraph
+
+
+class Paragraph:
+    """A paragraph or section and the line-table indices of its code, header first."""
+    __slots__ = ("name", "lines")
+
+    def __init__(self, name: str, lines: Optional[array] = None):
+        self.name = intern(name)
+        self.lines = lines if lines is not None else array("I")
+
+
+class JclStatement:
+    """An EXEC, DD or DEFINE statement; ``name`` holds the resource for DEFINE."""
+    __slots__ = ("type", "name", "line")
+
+    def __init__(self, type: str, name: str, line: int):
+        self.type = intern(type)
+        self.name = intern(name)
+        self.line = line
+
+
+class ProgramModel:
+    """
+    Compact analysis result of one COBOL, copybook or JCL member.
+
+    Names are interned and code is referenced by line-table index, so a large
+    project costs roughly its source size in memory. ``to_legacy`` rebuilds the
+    nested dictionary that cobol_analysis.json has always contained.
+    """
+    __slots__ = ("file_name", "file_type", "program_id", "lines", "data_items",
+                 "copybooks", "cics_commands", "paragraphs", "jcl_statements")
+
+    def __init__(self, file_name: str, file_type: str):
+        self.file_name = file_name
+        self.file_type = file_type
+        self.program_id: Optional[str] = None
+        self.lines = LineTable()
+        self.data_items: List[DataItem] = []
+        self.copybooks: List[CopyStatement] = []
+        self.cics_commands: List[CicsCommand] = []
+        self.paragraphs: List[Paragraph] = []
+        self.jcl_statements: Optional[List[JclStatement]] = [] if file_type == ".jcl" else None
+
+    @property
+    def variables(self) -> List[str]:
+        return [item.name for item in self.data_items]
+
+    def to_legacy(self) -> Dict[str, Any]:
+        """Return the analysis in the nested dictionary shape of cobol_analysis.json."""
+        lines = self.lines.split()
+        sections = {section: [] for section in SECTION_NAMES}
+        for item in self.data_items:
+            sections[item.section].append({
+                "level": item.level,
+                "name": item.name,
+                "type": item.type,
+                "picture": item.type if "PIC" in item.type else ""
+            })
+
+        jcl_definitions = None
+        if self.jcl_statements is not None:
+            jcl_definitions = []
+            for statement in self.jcl_statements:
+                key = "resource" if statement.type == "DEFINE" else "name"
+                jcl_definitions.append({"type": statement.type, key: statement.name, "details": lines[statement.line]})
+
+        cics_commands = []
+        for command in self.cics_commands:
+            text = lines[command.line]
+            cics_commands.append({
+                "command": text,
+                "type": command.type,
+                "parameters": text[command.offset:],
+                "context": command.paragraph
+            })
+
+        return {
+            "file_name": self.file_name,
+            "file_type": self.file_type,
+            "divisions": {
+                "identification": {"program_id": self.program_id} if self.program_id is not None else {},
+                "environment": {},
+                "data": sections,
+                "procedure": [
+                    {"paragraph": paragraph.name, "code": [lines[index] for index in paragraph.lines]}
+                    for paragraph in self.paragraphs
+                ]
+            },
+            "copybooks": [
+                {
+                    "name": copybook.name,
+                    "content": " ".join(lines[copybook.first_line:copybook.last_line + 1]),
+                    "replacing": copybook.replacing
+                }
+                for copybook in self.copybooks
+            ],
+            "cics_commands": cics_commands,
+            "variables": self.variables,
+            "paragraphs": [paragraph.name for paragraph in self.paragraphs],
+            "jcl_definitions": jcl_definitions
+        }
+
+
+def model_to_record(model: ProgramModel) -> List[Any]:
+    """Flatten a model into nested lists for compact serialization."""
+    return [
+        MODEL_FORMAT,
+        model.file_name,
+        model.file_type,
+        model.program_id,
+        model.lines.text,
+        model.lines.starts.tolist(),
+        [[item.section, item.level, item.name, item.type] for item in model.data_items],
+        [[copybook.name, copybook.first_line, copybook.last_line, copybook.replacing] for copybook in model.copybooks],
+        [[command.type, command.line, command.offset, command.paragraph] for command in model.cics_commands],
+        [[paragraph.name, paragraph.lines.tolist()] for paragraph in model.paragraphs],
+        None if model.jcl_statements is None else [[s.type, s.name, s.line] for s in model.jcl_statements]
+    ]
+
+
+def model_from_record(record: List[Any]) -> ProgramModel:
+    """Rebuild a model from model_to_record output."""
+    if record[0] != MODEL_FORMAT:
+        raise ValueError(f"Unsupported analysis model format: {record[0]}")
+    (_, file_name, file_type, program_id, text, starts,
+     data_items, copybooks, cics_commands, paragraphs, jcl_statements) = record
+    model = ProgramModel(file_name, file_type)
+    model.program_id = program_id
+    model.lines = LineTable(text, array("I", starts))
+    model.data_items = [DataItem(*item) for item in data_items]
+    model.copybooks = [CopyStatement(*copybook) for copybook in copybooks]
+    model.cics_commands = [CicsCommand(*command) for command in cics_commands]
+    model.paragraphs = [Paragraph(name, array("I", lines)) for name, lines in paragraphs]
+    model.jcl_statements = None if jcl_statements is None else [JclStatement(*s) for s in jcl_statements]
+    return model
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """Serialize with orjson; ``indent`` matches the json.dump(indent=2) layout of existing files."""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data)
@@ -0,0 +1,205 @@
+import hashlib
+import os
+import tarfile
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from ..config import logger
+from .cobol_analyzer import COBOL_EXTENSIONS, file_sha256
+from .file_classifier import SNIFF_CHARS, classify_content, type_for_extension, type_from_indicators
+from .keyword_scanner import indicator_scanner
+from .source_reader import CARD_RECORD_LENGTH, detect_record_format
+
+# Archive suffixes and the format each one is read as
+ARCHIVE_SUFFIXES = {
+    ".zip": "zip",
+    ".tar": "tar",
+    ".tar.gz": "tar.gz",
+    ".tgz": "tar.gz",
+    ".tar.zst": "tar.zst",
+    ".tzst": "tar.zst",
+}
+# Members are read and written this many bytes at a time; smaller members are hashed before anything is written
+READ_SIZE = 1 << 20
+# Small members wait for classification until this many bytes of them are held
+PENDING_BYTES = 16 << 20
+# Extension given to a member whose content, not its name, says what it is
+TYPE_SUFFIXES = {"COBOL Code": ".cbl", "Copybooks": ".cpy", "JCL": ".jcl"}
+
+
+def archive_format(filename: str) -> Optional[str]:
+    """The format ("zip", "tar", "tar.gz" or "tar.zst") of an archive upload, or None for any other file."""
+    name = filename.lower()
+    for suffix, archive_type in ARCHIVE_SUFFIXES.items():
+        if name.endswith(suffix):
+            return archive_type
+    return None
+
+
+def iter_archive_members(stream: BinaryIO, archive_type: str) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Stream the regular members of an archive.
+
+    Tar archives, compressed or not, are read strictly forward; zip archives
+    need a seekable stream for their central directory. Each member must be
+    read before the next one is requested.
+
+    Yields:
+        (member name, binary stream of its content)
+    """
+    if archive_type == "zip":
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, member
+        return
+
+    if archive_type == "tar.zst":
+        # Imported here so that zstandard is only needed for .zst uploads
+        import zstandard
+        stream = zstandard.ZstdDecompressor().stream_reader(stream)
+    mode = "r|gz" if archive_type == "tar.gz" else "r|"
+    with tarfile.open(fileobj=stream, mode=mode) as archive:
+        for info in archive:
+            if info.isfile():
+                member = archive.extractfile(info)
+                yield info.name, member
+            # Stream mode keeps every header it has seen otherwise
+            archive.members = []
+
+
+def _member_key(name: str) -> Optional[str]:
+    """Project-relative path of a member, or None for names that would leave the project."""
+    parts = [part for part in PurePosixPath(name.replace("\\", "/")).parts if part not in ("/", ".")]
+    if not parts or ".." in parts or ":" in parts[0]:
+        return None
+    return "/".join(parts)
+
+
+def _sniff_sample(head: bytes) -> bytes:
+    """The first SNIFF_CHARS bytes of a member, card images split into lines, without a partial last line."""
+    cards = head[:SNIFF_CHARS - SNIFF_CHARS % CARD_RECORD_LENGTH]
+    if detect_record_format(cards) == "fixed":
+        return b"\n".join(cards[start:start + CARD_RECORD_LENGTH] for start in range(0, len(cards), CARD_RECORD_LENGTH))
+    sample = head[:SNIFF_CHARS]
+    cut = sample.rfind(b"\n") if len(head) > SNIFF_CHARS else -1
+    return sample[:cut + 1] if cut >= 0 else sample
+
+
+def _write_member(summary: Dict[str, Any], target: Path, head: bytes, member: Optional[BinaryIO]) -> None:
+    """
+    Write a member to ``target`` unless it already holds the same content.
+
+    ``head`` is the whole content of a small member; a large one is streamed
+    on from ``member`` to a .part file beside the target, hashed on the way.
+    """
+    target.parent.mkdir(exist_ok=True, parents=True)
+    digest = hashlib.sha256(head)
+    if member is None:
+        # The whole member is in hand: compare before writing anything
+        if target.is_file() and file_sha256(target) == digest.hexdigest():
+            summary["unchanged"].append(target)
+            return
+        with open(target, mode='wb') as f:
+            f.write(head)
+    else:
+        partial = target.with_name(target.name + ".part")
+        with open(partial, mode='wb') as f:
+            f.write(head)
+            for chunk in iter(lambda: member.read(READ_SIZE), b""):
+                digest.update(chunk)
+                f.write(chunk)
+        if target.is_file() and file_sha256(target) == digest.hexdigest():
+            partial.unlink()
+            summary["unchanged"].append(target)
+            return
+        os.replace(partial, target)
+    summary["written"].append(target)
+
+
+def ingest_archive(stream: BinaryIO, filename: str, project_dir: Path) -> Dict[str, Any]:
+    """
+    Write the COBOL, copybook and JCL members of an archive into a project.
+
+    Members are streamed from the archive straight to their place under
+    ``project_dir``, keeping their directory structure, and hashed (SHA-256,
+    as the analysis cache does) on the way; nothing is extracted to a
+    temporary tree. Members with a .cbl, .cpy or .jcl name are taken as they
+    are. Others, such as PDS members exported without an extension, are
+    classified from their first bytes and given the extension of their type,
+    so a program ``COBOL/PAYROLL`` is written as ``COBOL/PAYROLL.cbl`` and
+    ``PAYROLL.cob`` as ``PAYROLL.cbl``. Members under READ_SIZE are held
+    until about PENDING_BYTES of them are waiting and then classified in one
+    batched scan. Members of any other type are skipped. A member whose path
+    already holds the same content is not written again, so re-uploading a
+    library only touches the members that changed and analysis keeps its
+    cached results for the rest.
+
+    Args:
+        stream: Binary stream of the archive
+        filename: Name of the archive, which selects its format (see ARCHIVE_SUFFIXES)
+        project_dir: Upload directory of the project
+
+    Returns:
+        dict: 'written' and 'unchanged' (project paths), 'skipped' ({member,
+        reason} for unsafe names and unsupported types) and 'types' (member
+        count per classified type)
+    """
+    archive_type = archive_format(filename)
+    if archive_type is None:
+        raise ValueError(f"Unsupported archive: {filename}")
+
+    root = project_dir.resolve()
+    summary = {"written": [], "unchanged": [], "skipped": [], "types": {}}
+    # (member name, project path, suffix, content) of small members waiting for classification
+    pending: List[Tuple[str, str, str, bytes]] = []
+    pending_bytes = 0
+
+    def store(name: str, key: str, suffix: str, file_type: Optional[str], head: bytes,
+              member: Optional[BinaryIO]) -> None:
+        if file_type not in TYPE_SUFFIXES:
+            summary["skipped"].append({"member": name, "reason": f"not COBOL, copybook or JCL ({file_type or 'Unknown'})"})
+            return
+        if suffix not in COBOL_EXTENSIONS:
+            # A known extension of another spelling (.cob, .job, ...) is replaced, anything else is kept
+            key = (key[:-len(suffix)] if type_for_extension(suffix) else key) + TYPE_SUFFIXES[file_type]
+        summary["types"][file_type] = summary["types"].get(file_type, 0) + 1
+        _write_member(summary, root / key, head, member)
+
+    def flush() -> None:
+        found = indicator_scanner().found_in_parts((_sniff_sample(head) for _, _, _, head in pending),
+                                                   fixed_comments=True)
+        for (name, key, suffix, head), keywords in zip(pending, found):
+            store(name, key, suffix, type_from_indicators(keywords), head, None)
+        pending.clear()
+
+    for name, member in iter_archive_members(stream, archive_type):
+        key = _member_key(name)
+        if key is None:
+            summary["skipped"].append({"member": name, "reason": "unsafe path"})
+            continue
+        head = member.read(READ_SIZE)
+        suffix = PurePosixPath(key).suffix.lower()
+        small = len(head) < READ_SIZE
+        if suffix in COBOL_EXTENSIONS:
+            store(name, key, suffix, type_for_extension(suffix), head, None if small else member)
+        elif not small:
+            store(name, key, suffix, classify_content(_sniff_sample(head).decode("utf-8", "ignore")),
+                  head, member)
+        elif head:
+            pending.append((name, key, suffix, head))
+            pending_bytes += len(head)
+            if pending_bytes >= PENDING_BYTES:
+                flush()
+                pending_bytes = 0
+        else:
+            store(name, key, suffix, None, head, None)
+    if pending:
+        flush()
+
+    summary["written"] = [path.relative_to(root).as_posix() for path in summary["written"]]
+    summary["unchanged"] = [path.relative_to(root).as_posix() for path in summary["unchanged"]]
+    logger.info(f"Ingested {filename}: {len(summary['written'])} written, {len(summary['unchanged'])} unchanged, "
+                f"{len(summary['skipped'])} skipped")
+    return summary
@@ -0,0 +1,387 @@
+from array import array
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from ..config import logger, output_dir
+from .cobol_parser import AstNode, DIVISION, SECTION, PARAGRAPH, STATEMENT, EXEC
+from .index_store import write_index, read_index, pack_strings, StringTable
+
+CALL_GRAPH_FILE = "call_graph.idx"
+# Bump whenever the arrays written by build_call_graph change
+CALL_GRAPH_FORMAT = 1
+
+NODE_PROGRAM, NODE_SECTION, NODE_PARAGRAPH, NODE_EXTERNAL, NODE_DYNAMIC = range(5)
+NODE_KINDS = ("program", "section", "paragraph", "external", "dynamic")
+EDGE_PERFORM, EDGE_GOTO, EDGE_CALL, EDGE_ENTRY = range(4)
+EDGE_KINDS = ("perform", "goto", "call", "entry")
+
+_THRU = ("THRU", "THROUGH")
+
+
+def _statement_edges(node: AstNode) -> List[List[Any]]:
+    """[edge kind, target, THRU target or None] for the PERFORM, GO TO and CALL statements under ``node``."""
+    edges = []
+    for statement in node.walk():
+        operands = statement.operands
+        if statement.kind == EXEC:
+            # EXEC CICS LINK/XCTL PROGRAM('NAME') transfers control like a CALL
+            if statement.name == "CICS" and operands and operands[0] in ("LINK", "XCTL") and "PROGRAM" in operands:
+                index = operands.index("PROGRAM") + 1
+                target = operands[index + 1] if index < len(operands) and operands[index] == "(" else None
+                if target and index + 1 < len(operands):
+                    edges.append([EDGE_CALL, target, None])
+            continue
+        if statement.kind != STATEMENT or not operands:
+            continue
+        if statement.name == "PERFORM":
+            thru = operands[2] if len(operands) > 2 and operands[1] in _THRU else None
+            edges.append([EDGE_PERFORM, operands[0], thru])
+        elif statement.name == "GO":
+            for target in operands[1:] if operands[0] == "TO" else operands:
+                if target == "DEPENDING":
+                    break
+                edges.append([EDGE_GOTO, target, None])
+        elif statement.name == "CALL":
+            edges.append([EDGE_CALL, operands[0], None])
+    return edges
+
+
+def extract_flow(ast: AstNode) -> Optional[List[Any]]:
+    """
+    Reduce a program AST to the control-flow facts the call graph needs.
+
+    Returns:
+        [program name, edges of statements outside any paragraph,
+        [[procedure name, node kind, section name, edges], ...]] in source
+        order, or None when there is no PROCEDURE DIVISION
+    """
+    procedure_division = next(
+        (node for node in ast.children if node.kind == DIVISION and node.name == "PROCEDURE"), None)
+    if procedure_division is None:
+        return None
+    program_edges = []
+    procedures = []
+    for child in procedure_division.children:
+        if child.kind == SECTION:
+            section_edges = []
+            procedures.append([child.name, NODE_SECTION, None, section_edges])
+            for node in child.children:
+                if node.kind == PARAGRAPH:
+                    procedures.append([node.name, NODE_PARAGRAPH, child.name, _statement_edges(node)])
+                else:
+                    section_edges.extend(_statement_edges(node))
+        elif child.kind == PARAGRAPH:
+            procedures.append([child.name, NODE_PARAGRAPH, None, _statement_edges(child)])
+        else:
+            program_edges.extend(_statement_edges(child))
+    return [ast.name.upper(), program_edges, procedures]
+
+
+def _csr(count: int, sources: array, targets: array, kinds: array):
+    """Group edges by source node: (offsets, targets, kinds) with offsets[n]..offsets[n+1] per node."""
+    offsets = array("I", bytes(4 * (count + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for node in range(count):
+        offsets[node + 1] += offsets[node]
+    position = array("I", offsets[:-1])
+    grouped_targets = array("I", bytes(4 * len(targets)))
+    grouped_kinds = array("B", bytes(len(kinds)))
+    for source, target, kind in zip(sources, targets, kinds):
+        slot = position[source]
+        grouped_targets[slot] = target
+        grouped_kinds[slot] = kind
+        position[source] = slot + 1
+    return offsets, grouped_targets, grouped_kinds
+
+
+def _strongly_connected_components(count: int, offsets: array, targets: array) -> array:
+    """Iterative Tarjan: the component id of every node, numbered in reverse topological order."""
+    index = array("i", [-1]) * count
+    low = array("I", bytes(4 * count))
+    component = array("I", bytes(4 * count))
+    on_stack = bytearray(count)
+    stack: List[int] = []
+    next_index = 0
+    next_component = 0
+    for root in range(count):
+        if index[root] != -1:
+            continue
+        work = [(root, offsets[root])]
+        index[root] = low[root] = next_index
+        next_index += 1
+        stack.append(root)
+        on_stack[root] = 1
+        while work:
+            node, edge = work[-1]
+            if edge < offsets[node + 1]:
+                work[-1] = (node, edge + 1)
+                target = targets[edge]
+                if index[target] == -1:
+                    index[target] = low[target] = next_index
+                    next_index += 1
+                    stack.append(target)
+                    on_stack[target] = 1
+                    work.append((target, offsets[target]))
+                elif on_stack[target] and index[target] < low[node]:
+                    low[node] = index[target]
+                continue
+            work.pop()
+            if work and low[node] < low[work[-1][0]]:
+                low[work[-1][0]] = low[node]
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    component[member] = next_component
+                    if member == node:
+                        break
+                next_component += 1
+    return component
+
+
+def build_call_graph(flows: Dict[str, List[Any]]) -> Dict[str, Any]:
+    """
+    Link per-file flow records (see extract_flow) into one project graph.
+
+    Nodes are programs, their sections and paragraphs (named PROGRAM.PARAGRAPH)
+    and CALL targets outside the project; edges are PERFORM (every procedure
+    of a THRU range), GO TO, CALL, EXEC CICS LINK/XCTL, and entry edges from a
+    program to its first procedure and from a section to its paragraphs.
+    Unresolved PERFORM/GO TO targets are ignored.
+
+    Args:
+        flows: Project-relative file path -> flow record
+
+    Returns:
+        Dictionary with ``header`` (counts) and ``arrays`` (name table, node
+        kinds, node programs, forward and reverse adjacency, components)
+    """
+    names: List[str] = []
+    node_kinds = array("B")
+    node_programs = array("I")
+    programs: Dict[str, int] = {}
+    external: Dict[str, int] = {}
+
+    def add_node(name: str, kind: int, program: int) -> int:
+        names.append(name)
+        node_kinds.append(kind)
+        node_programs.append(len(names) - 1 if program < 0 else program)
+        return len(names) - 1
+
+    # Nodes first, so CALLs resolve regardless of file order
+    layouts = []
+    for path in sorted(flows):
+        program_name, program_edges, procedures = flows[path]
+        if program_name in programs:
+            logger.warning(f"Duplicate PROGRAM-ID {program_name} in {path}")
+            program_name = f"{program_name}@{path}"
+        program = add_node(program_name, NODE_PROGRAM, -1)
+        programs[program_name] = program
+        local: Dict[str, int] = {}
+        ordered = []
+        for name, kind, section, _ in procedures:
+            qualified = f"{program_name}.{name}"
+            if name in local and section:
+                qualified = f"{program_name}.{section}.{name}"
+            node = add_node(qualified, kind, program)
+            local.setdefault(name, node)
+            ordered.append(node)
+        layouts.append((program, program_edges, procedures, local, ordered))
+
+    seen = set()
+    sources, targets, kinds = array("I"), array("I"), array("B")
+
+    def add_edge(source: int, target: int, kind: int) -> None:
+        if (source, target, kind) not in seen:
+            seen.add((source, target, kind))
+            sources.append(source)
+            targets.append(target)
+            kinds.append(kind)
+
+    for program, program_edges, procedures, local, ordered in layouts:
+        if ordered:
+            add_edge(program, ordered[0], EDGE_ENTRY)
+        # Executing a section runs its paragraphs
+        section = None
+        for node, procedure in zip(ordered, procedures):
+            if procedure[1] == NODE_SECTION:
+                section = node
+            elif procedure[2] is not None and section is not None:
+                add_edge(section, node, EDGE_ENTRY)
+        for source, edges in [(program, program_edges)] + [(node, procedure[3]) for node, procedure in zip(ordered, procedures)]:
+            for kind, target, thru in edges:
+                if kind == EDGE_CALL:
+                    if target[:1] in ("'", '"'):
+                        name = target.strip("\"'").upper()
+                        node = programs.get(name)
+                        if node is None:
+                            node = external.get(name)
+                            if node is None:
+                                node = external[name] = add_node(name, NODE_EXTERNAL, -1)
+                    else:
+                        # CALL identifier: the program is only known at run time
+                        node = external.get(f"({target})")
+                        if node is None:
+                            node = external[f"({target})"] = add_node(f"({target})", NODE_DYNAMIC, -1)
+                    add_edge(source, node, EDGE_CALL)
+                    continue
+                node = local.get(target)
+                if node is None:
+                    continue
+                add_edge(source, node, kind)
+                if thru is not None and thru in local:
+                    for member in range(node + 1, local[thru] + 1):
+                        add_edge(source, member, kind)
+
+    count = len(names)
+    out_offsets, out_targets, out_kinds = _csr(count, sources, targets, kinds)
+    in_offsets, in_sources, in_kinds = _csr(count, targets, sources, kinds)
+    component = _strongly_connected_components(count, out_offsets, out_targets)
+    components = max(component) + 1 if count else 0
+    scc_offsets, scc_members, _ = _csr(components, component, array("I", range(count)), array("B", bytes(count)))
+
+    # A component is a cycle when it has several nodes or its single node calls itself
+    self_loops = {source for source, target in zip(sources, targets) if source == target}
+    cycles = sum(
+        1 for c in range(components)
+        if scc_offsets[c + 1] - scc_offsets[c] > 1 or scc_members[scc_offsets[c]] in self_loops
+    )
+    arrays = pack_strings(names, "names")
+    arrays.update({
+        "node_kinds": node_kinds,
+        "node_programs": node_programs,
+        "out_offsets": out_offsets,
+        "out_targets": out_targets,
+        "out_kinds": out_kinds,
+        "in_offsets": in_offsets,
+        "in_sources": in_sources,
+        "in_kinds": in_kinds,
+        "component": component,
+        "scc_offsets": scc_offsets,
+        "scc_members": scc_members,
+    })
+    header = {
+        "format": CALL_GRAPH_FORMAT,
+        "nodes": count,
+        "edges": len(sources),
+        "programs": len(programs),
+        "components": components,
+        "cycles": cycles
+    }
+    return {"header": header, "arrays": arrays}
+
+
+def call_graph_path(project_id: str) -> Path:
+    return Path(output_dir) / "analysis" / project_id / CALL_GRAPH_FILE
+
+
+def save_call_graph(project_id: str, graph: Dict[str, Any]) -> Path:
+    """Write a graph from build_call_graph to output/analysis/<project_id>/call_graph.idx."""
+    path = call_graph_path(project_id)
+    write_index(path, graph["header"], graph["arrays"])
+    return path
+
+
+class CallGraph:
+    """
+    Query view over a saved call graph.
+
+    The adjacency arrays stay memory-mapped, so loading is constant time and a
+    query only touches the nodes it visits.
+    """
+    __slots__ = ("header", "names", "node_kinds", "node_programs", "out_offsets", "out_targets", "out_kinds",
+                 "in_offsets", "in_sources", "in_kinds", "component", "scc_offsets", "scc_members")
+
+    def __init__(self, header: Dict[str, Any], arrays: Dict[str, memoryview]):
+        self.header = header
+        self.names = StringTable(arrays, "names")
+        for name in self.__slots__[2:]:
+            setattr(self, name, arrays[name])
+
+    def node(self, name: str) -> int:
+        """
+        Resolve ``PROGRAM``, ``PROGRAM.PARAGRAPH`` or an unqualified paragraph name.
+
+        Raises:
+            ValueError: When the name is unknown or an unqualified name is ambiguous
+        """
+        node = self.names.find(name.upper())
+        if node >= 0:
+            return node
+        suffix = "." + name.upper()
+        candidates = [index for index in range(len(self.names)) if self.names[index].endswith(suffix)]
+        if len(candidates) == 1:
+            return candidates[0]
+        if candidates:
+            raise ValueError(f"Ambiguous node {name}: {[self.names[index] for index in candidates[:10]]}")
+        raise ValueError(f"Unknown node: {name}")
+
+    def describe(self, node: int, edge_kind: Optional[int] = None) -> Dict[str, Any]:
+        described = {"name": self.names[node], "kind": NODE_KINDS[self.node_kinds[node]]}
+        if edge_kind is not None:
+            described["edge"] = EDGE_KINDS[edge_kind]
+        return described
+
+    def callees(self, node: int) -> List[Dict[str, Any]]:
+        start, end = self.out_offsets[node], self.out_offsets[node + 1]
+        return [self.describe(target, kind) for target, kind in zip(self.out_targets[start:end], self.out_kinds[start:end])]
+
+    def callers(self, node: int) -> List[Dict[str, Any]]:
+        start, end = self.in_offsets[node], self.in_offsets[node + 1]
+        return [self.describe(source, kind) for source, kind in zip(self.in_sources[start:end], self.in_kinds[start:end])]
+
+    def reachable(self, node: int, reverse: bool = False, max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Nodes reachable from ``node`` (or that reach it when ``reverse``), breadth-first with their depth."""
+        offsets, targets = (self.in_offsets, self.in_sources) if reverse else (self.out_offsets, self.out_targets)
+        visited = bytearray(len(self.node_kinds))
+        visited[node] = 1
+        queue = deque([(node, 0)])
+        found = []
+        while queue:
+            current, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for target in targets[offsets[current]:offsets[current + 1]]:
+                if not visited[target]:
+                    visited[target] = 1
+                    queue.append((target, depth + 1))
+                    described = self.describe(target)
+                    described["depth"] = depth + 1
+                    found.append(described)
+        return found
+
+    def _members(self, component: int) -> List[int]:
+        return self.scc_members[self.scc_offsets[component]:self.scc_offsets[component + 1]].tolist()
+
+    def _is_cycle(self, members: List[int]) -> bool:
+        if len(members) > 1:
+            return True
+        node = members[0]
+        return node in self.out_targets[self.out_offsets[node]:self.out_offsets[node + 1]].tolist()
+
+    def component_of(self, node: int) -> List[Dict[str, Any]]:
+        """The strongly connected component containing ``node``; a single node unless it is on a cycle."""
+        return [self.describe(member) for member in self._members(self.component[node])]
+
+    def cycles(self, limit: int = 100) -> List[List[Dict[str, Any]]]:
+        """Up to ``limit`` components with a cycle (recursive PERFORM/GO TO loops, mutual CALLs)."""
+        found = []
+        for component in range(len(self.scc_offsets) - 1):
+            members = self._members(component)
+            if self._is_cycle(members):
+                found.append([self.describe(member) for member in members])
+                if len(found) >= limit:
+                    break
+        return found
+
+
+def load_call_graph(project_id: str) -> Optional[CallGraph]:
+    """Open the saved call graph of a project, or None when the project has none or an outdated one."""
+    path = call_graph_path(project_id)
+    if not path.exists():
+        return None
+    header, arrays = read_index(path)
+    if header.get("format") != CALL_GRAPH_FORMAT:
+        return None
+    return CallGraph(header, arrays)
@@ -1,179 +1,651 @@
-import json
+import hashlib
 import logging
+import mmap
+import os
+import re
+import time
+from sys import intern
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict
-from ..config import logger, UPLOAD_DIR, output_dir
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from ..config import logger, UPLOAD_DIR, output_dir, ANALYSIS_WORKERS, PARALLEL_ANALYSIS_MIN_FILES
+from .source_reader import iter_records, record_offsets
+from .analysis_model import (
+    ProgramModel, LineTable, DataItem, CopyStatement, CicsCommand, Paragraph, JclStatement,
+    model_to_record, model_from_record, dumps
+)
+from .cobol_tokenizer import SourceLine, Token, iter_source_lines, tokenize_line, WORD, NUMBER, STRING, PERIOD
+from .cobol_parser import parse_cobol, ast_to_record, save_project_ast, project_ast_path
+from .call_graph import extract_flow, build_call_graph, save_call_graph, load_call_graph
+from .symbol_index import extract_symbols, build_symbol_index, save_symbol_index, load_symbol_index
+from .jcl_parser import iter_jcl_statements, build_jcl_graph, save_jcl_graph, jcl_graph_path, JCL_GRAPH_FORMAT
+from .record_layout import compile_layouts, layout_to_record, build_project_layouts, LAYOUT_FORMAT
+from .exec_blocks import extract_exec_blocks
+from . import project_store
 
 ANALYSIS_DIR = Path(output_dir) / "analysis"
+COBOL_EXTENSIONS = (".cbl", ".cpy", ".jcl")
+# Bump whenever the analysis output changes so cached results are recomputed
+ANALYZER_VERSION = "12"
+
+PARAGRAPH_VERBS = {"EXIT", "GOBACK", "CONTINUE", "STOP", "END-IF", "END-PERFORM", "END-EVALUATE", "END-EXEC", "ELSE"}
+DATA_LEVELS = {"01", "05", "77"}
+COPYBOOK_DATA_LEVELS = {"01", "05", "77", "88"}
+
+# COPY ... REPLACING operands: pseudo-text, literals or single words
+_REPLACING_RE = re.compile(r"(?<![A-Z0-9-])REPLACING(?![A-Z0-9-])")
+_COPY_OPERAND_RE = re.compile(r"""==.*?==|"[^"]*"|'[^']*'|\S+""")
+
+def _analyze_jcl_lines(lines: Iterable[str], model: ProgramModel) -> None:
+    """Collect EXEC and DD statements (continuations joined) and in-stream DEFINE commands from JCL lines."""
+    statements = model.jcl_statements
+    table = []
+    for card in iter_jcl_statements(lines):
+        if card.operation not in ("EXEC", "DD"):
+            continue
+        statements.append(JclStatement(card.operation, card.name, len(table)))
+        table.append(f"//{card.name} {card.operation} {card.operands}".upper())
+        for data_line in card.data or ():
+            words = data_line.upper().split()
+            if len(words) > 1 and words[0] == "DEFINE":
+                statements.append(JclStatement("DEFINE", words[1], len(table)))
+                table.append(data_line.strip().upper())
+    model.lines = LineTable.from_lines(table)
+
+def _is_paragraph_header(tokens: List[Token]) -> bool:
+    """A paragraph or section header is a lone name (optionally SECTION) closed by a period."""
+    first = tokens[0]
+    if first.type != WORD or first.area == "B" or first.value in PARAGRAPH_VERBS:
+        return False
+    if len(tokens) == 2:
+        return tokens[1].type == PERIOD
+    return len(tokens) == 3 and tokens[1].value == "SECTION" and tokens[2].type == PERIOD
+
+def _analyze_cobol_lines(source_lines: Iterable[SourceLine], model: ProgramModel, is_copybook: bool) -> None:
+    """
+    Fill ``model`` from a stream of logical COBOL lines.
+
+    Only the leading tokens of a line are materialized unless the whole line is
+    needed (CICS commands); code is recorded by index into the model's line table.
+    """
+    table = []  # upper-cased logical lines, packed into model.lines at the end
+    # Copybooks carry data descriptions without any division headers
+    current_division = "data" if is_copybook else None
+    current_section = "working_storage" if is_copybook else None
+    current_paragraph = None
+    data_levels = COPYBOOK_DATA_LEVELS if is_copybook else DATA_LEVELS
+    data_entry = None  # [level, name, [clause text, ...]] until the closing period
+    copy_statement = None  # COPY statement lines until the closing period
+    copy_first_line = 0
+    paragraph_code = None
+    pending_cics = None  # CICS command whose name is on the next line
+
+    append_line = table.append
+    for line_index, source_line in enumerate(source_lines):
+        _, _, area, _, text = source_line
+        append_line(text)
+        tokens = None
+
+        if "DIVISION" in text:
+            tokens = tokenize_line(source_line, 3)
+            if len(tokens) > 1 and tokens[1].value == "DIVISION":
+                division = tokens[0].value
+                if division in ("IDENTIFICATION", "ID"):
+                    current_division = "identification"
+                elif division == "ENVIRONMENT":
+                    current_division = "environment"
+                elif division == "DATA":
+                    current_division = "data"
+                elif division == "PROCEDURE":
+                    current_division = "procedure"
+                current_section = None
+                data_entry = copy_statement = None
+                continue
+
+        if pending_cics is not None:
+            # EXEC CICS ended the previous line; the command opens this one
+            tokens = tokenize_line(source_line, 1)
+            if tokens and tokens[0].type == WORD:
+                pending_cics.type = intern(tokens[0].value)
+            pending_cics = tokens = None
+        if not is_copybook and "EXEC" in text and "CICS" in text:
+            # The command name is the third token when the statement starts the line
+            cics_tokens = tokenize_line(source_line, 3 if text.startswith("EXEC") else 0)
+            pending_cics = _record_cics_command(cics_tokens, source_line, line_index, model, current_paragraph)
+
+        if current_division == "procedure":
+            if is_copybook:
+                continue
+            # Statements live in area B; only area A (or free-format) lines can open a paragraph
+            if area != "B" and text[-1] == ".":
+                tokens = tokenize_line(source_line, 4)
+                if _is_paragraph_header(tokens):
+                    current_paragraph = tokens[0].value
+                    paragraph = Paragraph(current_paragraph)
+                    paragraph_code = paragraph.lines
+                    paragraph_code.append(line_index)
+                    model.paragraphs.append(paragraph)
+                    continue
+            if paragraph_code is not None:
+                paragraph_code.append(line_index)
+            continue
+
+        if copy_statement is not None:
+            # COPY ... REPLACING operands often run over several lines
+            copy_statement.append(text)
+            if text[-1] == ".":
+                _record_copy_statement(" ".join(copy_statement), copy_first_line, line_index, model)
+                copy_statement = None
+            continue
+
+        if data_entry is not None:
+            # Continuation of a data description entry that spans several lines
+            data_entry[2].append(text)
+        else:
+            tokens = tokens or tokenize_line(source_line, 2 if current_division == "data" else 3)
+            first = tokens[0]
+            second = tokens[1] if len(tokens) > 1 else None
+
+            if current_division == "identification":
+                if first.value == "PROGRAM-ID":
+                    name = next((t.value for t in tokens[1:] if t.type in (WORD, STRING)), None)
+                    if name:
+                        model.program_id = name.strip("\"'")
+                continue
+
+            if current_division != "data":
+                continue
+
+            if second is not None and second.value == "SECTION":
+                current_section = {
+                    "WORKING-STORAGE": "working_storage",
+                    "LINKAGE": "linkage_section",
+                    "FILE": "file_section",
+                }.get(first.value, current_section)
+                continue
+            if first.value == "COPY" and second is not None:
+                if text[-1] == ".":
+                    _record_copy_statement(text, line_index, line_index, model)
+                else:
+                    copy_statement = [text]
+                    copy_first_line = line_index
+                continue
+            if (current_section not in ("working_storage", "linkage_section") or first.type != NUMBER
+                    or first.value not in data_levels or second is None or second.type != WORD):
+                continue
+            clauses = text[second.column - source_line.column + len(second.value):]
+            data_entry = [first.value, second.value, [clauses]]
+
+        if text[-1] == ".":
+            var_level, var_name, clauses = data_entry
+            var_type = " ".join(clauses).strip()
+            if var_type.endswith("."):
+                var_type = var_type[:-1].rstrip()
+            model.data_items.append(DataItem(current_section, var_level, var_name, var_type))
+            data_entry = None
+
+    model.lines = LineTable.from_lines(table)
+
+def parse_copy_replacing(statement: str) -> List[List[str]]:
+    """
+    Extract the REPLACING operands of a COPY statement.
+
+    Args:
+        statement: Upper-cased COPY statement, possibly joined from several lines
+
+    Returns:
+        List of [from, to] pairs with operands as written (pseudo-text keeps its
+        ``==`` delimiters); LEADING/TRAILING pairs carry the mode as a third item
+    """
+    match = _REPLACING_RE.search(statement)
+    if not match:
+        return []
+    operands = [operand for operand in _COPY_OPERAND_RE.findall(statement[match.end():]) if operand != "."]
+    if operands and not operands[-1].startswith("==") and operands[-1].endswith("."):
+        operands[-1] = operands[-1][:-1]
+
+    replacing = []
+    index = 0
+    while index < len(operands):
+        mode = operands[index] if operands[index] in ("LEADING", "TRAILING") else None
+        if mode:
+            index += 1
+        if index + 2 >= len(operands) or operands[index + 1] != "BY":
+            break
+        pair = [operands[index], operands[index + 2]]
+        if mode:
+            pair.append(mode)
+        replacing.append(pair)
+        index += 3
+    return replacing
+
+def _record_copy_statement(statement: str, first_line: int, last_line: int, model: ProgramModel) -> None:
+    parts = statement.split(None, 2)
+    model.copybooks.append(CopyStatement(
+        parts[1].rstrip(".").strip("\"'"), first_line, last_line, parse_copy_replacing(statement)
+    ))
+
+def _record_cics_command(tokens: List[Token], source_line: SourceLine, line_index: int,
+                         model: ProgramModel, paragraph: Optional[str]) -> Optional[CicsCommand]:
+    """Record the EXEC CICS command among ``tokens``; returns it when its name is not on this line."""
+    for index, token in enumerate(tokens[:-1]):
+        if token.value == "EXEC" and tokens[index + 1].value == "CICS":
+            command = tokens[index + 2] if index + 2 < len(tokens) else None
+            cics_command = CicsCommand(
+                command.value if command is not None and command.type == WORD else "UNKNOWN",
+                line_index,
+                token.column - source_line.column,
+                paragraph
+            )
+            model.cics_commands.append(cics_command)
+            return cics_command if command is None else None
+    return None
+
+def analyze_cobol_model(file_path: Path, source_lines: Optional[List[SourceLine]] = None) -> ProgramModel:
+    """
+    Analyze a single COBOL, copybook or JCL member into a compact ProgramModel.
+
+    Args:
+        file_path: Member to analyze
+        source_lines: The member's logical lines when the caller already read
+            them (COBOL and copybooks only), so the file is not read twice
+
+    Raises:
+        ValueError: For unsupported file extensions
+        OSError: When the file cannot be read
+    """
+    suffix = file_path.suffix.lower()
+    if suffix not in COBOL_EXTENSIONS:
+        raise ValueError(f"Invalid file extension: {file_path.suffix}")
+
+    model = ProgramModel(file_path.name, suffix)
+    if suffix == ".jcl":
+        _analyze_jcl_lines(iter_records(file_path), model)
+    else:
+        if source_lines is None:
+            source_lines = iter_source_lines(iter_records(file_path))
+        _analyze_cobol_lines(source_lines, model, suffix == ".cpy")
+
+    if suffix == ".cpy" and not model.data_items:
+        logger.warning(f"No variables found in copybook {file_path.name}. Content may be empty or malformed.")
+    logger.info(f"File {file_path.name} analyzed: {len(model.data_items)} variables, {len(model.cics_commands)} CICS commands, {len(model.paragraphs)} paragraphs")
+    return model
 
 def analyze_cobol_file(file_path: Path) -> Dict:
     """Analyze a single COBOL file and return its structure."""
     logger.info(f"Analyzing file: {file_path}")
-    if file_path.suffix.lower() not in [".cbl", ".cpy", ".jcl"]:
+    if file_path.suffix.lower() not in COBOL_EXTENSIONS:
         logger.warning(f"Invalid file extension for {file_path}. Expected .cbl, .cpy, or .jcl.")
         return {"error": f"Invalid file extension: {file_path.suffix}"}
 
     try:
-        with open(file_path, mode='r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
+        return analyze_cobol_model(file_path).to_legacy()
     except Exception as e:
         logger.error(f"Error reading file {file_path}: {e}")
         return {"error": f"Could not read file: {e}"}
-    
-    analysis = {
-        "file_name": file_path.name,
-        "file_type": file_path.suffix.lower(),
-        "divisions": {
-            "identification": {},
-            "environment": {},
-            "data": {
-                "working_storage": [],
-                "linkage_section": [],
-                "file_section": []
-            },
-            "procedure": []
-        },
-        "copybooks": [],
-        "cics_commands": [],
-        "variables": [],
-        "paragraphs": [],
-        "jcl_definitions": [] if file_path.suffix.lower() == ".jcl" else None
-    }
-    
-    lines = content.splitlines()
-    current_division = None
-    current_section = None
-    current_paragraph = None
-    is_copybook = file_path.suffix.lower() == ".cpy"
-    
-    for line in lines:
-        line = line.strip().upper()
-        if not line or line.startswith("*") or line.startswith("//*"):
-            continue
-        
+
+def _analyze_file_record(file_path: Path) -> Dict:
+    """
+    Worker entry point: the flat records (cheap to pickle) of one member, or an error dict.
+
+    Returns:
+        Dictionary with ``model`` (analysis_model.model_to_record), ``ast``
+        (cobol_parser.ast_to_record), ``flow`` (call_graph.extract_flow),
+        ``symbols`` (symbol_index.extract_symbols), ``layouts`` (record
+        layouts with COPY placeholders, see record_layout.compile_layouts),
+        ``segments`` (incremental.source_segments) and ``exec_blocks``
+        (exec_blocks.extract_exec_blocks); JCL members only have a model,
+        copybooks no flow or segments
+    """
+    # Imported here because incremental re-analysis builds on this module's line analyzer
+    from .incremental import source_segments
+    logger.info(f"Analyzing file: {file_path}")
+    try:
         if file_path.suffix.lower() == ".jcl":
-            if line.startswith("//") and not line.startswith("//*"):
-                parts = line.split()
-                if len(parts) > 1:
-                    if "EXEC" in line:
-                        analysis["jcl_definitions"].append({
-                            "type": "EXEC",
-                            "name": parts[1],
-                            "details": line
-                        })
-                    elif "DD" in line:
-                        analysis["jcl_definitions"].append({
-                            "type": "DD",
-                            "name": parts[1],
-                            "details": line
-                        })
-                    elif "DEFINE" in line:
-                        analysis["jcl_definitions"].append({
-                            "type": "DEFINE",
-                            "resource": line.split("DEFINE")[1].split()[0] if "DEFINE" in line else "",
-                            "details": line
-                        })
-            continue
-        
-        if line.startswith("IDENTIFICATION DIVISION"):
-            current_division = "identification"
-        elif line.startswith("ENVIRONMENT DIVISION"):
-            current_division = "environment"
-        elif line.startswith("DATA DIVISION"):
-            current_division = "data"
-        elif line.startswith("PROCEDURE DIVISION"):
-            current_division = "procedure"
-        
-        if current_division == "identification":
-            if line.startswith("PROGRAM-ID"):
-                analysis["divisions"]["identification"]["program_id"] = line.split()[1].strip(".")
-        
-        if current_division == "data":
-            if line.startswith("WORKING-STORAGE SECTION"):
-                current_section = "working_storage"
-            elif line.startswith("LINKAGE SECTION"):
-                current_section = "linkage_section"
-            elif line.startswith("FILE SECTION"):
-                current_section = "file_section"
-            elif line.startswith("COPY"):
-                copybook = line.split()[1].strip(".")
-                analysis["copybooks"].append({
-                    "name": copybook,
-                    "content": line
-                })
-        
-        if "EXEC CICS" in line and not is_copybook:
-            cics_type = line.split()[2] if len(line.split()) > 2 else "UNKNOWN"
-            analysis["cics_commands"].append({
-                "command": line,
-                "type": cics_type,
-                "parameters": line[line.find("EXEC CICS"):],
-                "context": current_paragraph
-            })
-        
-        if current_division == "data" and current_section in ["working_storage", "linkage_section"]:
-            if line.startswith(("01", "05", "77")) or (is_copybook and line.startswith(("01", "05", "77", "88"))):
-                parts = line.split()
-                if len(parts) >= 2:
-                    var_level = parts[0]
-                    var_name = parts[1].strip(".")
-                    var_type = " ".join(parts[2:]) if len(parts) > 2 else ""
-                    analysis["divisions"]["data"][current_section].append({
-                        "level": var_level,
-                        "name": var_name,
-                        "type": var_type,
-                        "picture": var_type if "PIC" in var_type else ""
-                    })
-                    analysis["variables"].append(var_name)
-        
-        if current_division == "procedure" and not is_copybook and line.endswith(".") and not line.startswith("EXEC"):
-            if not any(kw in line for kw in ["MOVE", "PERFORM", "IF", "ELSE", "END"]):
-                current_paragraph = line.split()[0]
-                analysis["paragraphs"].append(current_paragraph)
-                analysis["divisions"]["procedure"].append({
-                    "paragraph": current_paragraph,
-                    "code": [line]
-                })
-            elif current_paragraph and analysis["divisions"]["procedure"]:
-                analysis["divisions"]["procedure"][-1]["code"].append(line)
-    
-    if is_copybook and not analysis["variables"]:
-        logger.warning(f"No variables found in copybook {file_path.name}. Content may be empty or malformed.")
-    
-    logger.info(f"File {file_path.name} analyzed: {len(analysis['variables'])} variables, {len(analysis['cics_commands'])} CICS commands, {len(analysis['paragraphs'])} paragraphs")
-    return analysis
+            return {"model": model_to_record(analyze_cobol_model(file_path)), "ast": None, "flow": None, "symbols": None,
+                    "layouts": None, "segments": None, "exec_blocks": None}
+
+        # Both passes read the same logical lines
+        source_lines = list(iter_source_lines(iter_records(file_path)))
+        model = analyze_cobol_model(file_path, source_lines)
+        ast = parse_cobol(source_lines, model.program_id or file_path.stem)
+        offsets = record_offsets(file_path)
+        ast_record = ast_to_record(ast)
+        return {
+            "model": model_to_record(model),
+            "ast": ast_record,
+            "flow": extract_flow(ast),
+            "symbols": extract_symbols(ast, offsets),
+            "layouts": [layout_to_record(record) for record in compile_layouts(ast, file_path.stem.upper())],
+            "segments": source_segments(ast_record, file_path, offsets, source_lines),
+            "exec_blocks": extract_exec_blocks(ast, offsets)
+        }
+    except Exception as e:
+        logger.error(f"Error reading file {file_path}: {e}")
+        return {"error": f"Could not read file: {e}"}
+
+def _collect_cobol_files(project_dir: Path) -> List[Path]:
+    """Return the project's COBOL, copybook and JCL members in a stable order."""
+    return sorted(
+        file_path for file_path in project_dir.glob("**/*")
+        if file_path.suffix.lower() in COBOL_EXTENSIONS and file_path.is_file()
+    )
+
+def _iter_analyzed_files(file_paths: List[Path], workers: Optional[int] = None) -> Iterator[Dict]:
+    """
+    Analyze files, spreading them across a process pool when it pays off.
+
+    Results are yielded as they complete, in order, so callers can use the
+    first files while the pool works on the rest.
+
+    Args:
+        file_paths: Files to analyze
+        workers: Worker processes; defaults to ANALYSIS_WORKERS. Projects with
+            fewer than PARALLEL_ANALYSIS_MIN_FILES files are analyzed serially.
+
+    Yields:
+        One record dictionary (see _analyze_file_record) or error dict per
+        file, in the order of ``file_paths``
+    """
+    workers = ANALYSIS_WORKERS if workers is None else workers
+    workers = min(workers, len(file_paths))
+
+    done = 0
+    if workers > 1 and len(file_paths) >= PARALLEL_ANALYSIS_MIN_FILES:
+        # Several files per task keeps inter-process overhead low; executor.map keeps input order
+        chunksize = max(1, len(file_paths) // (workers * 4))
+        logger.info(f"Analyzing {len(file_paths)} files with {workers} worker processes")
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for record in executor.map(_analyze_file_record, file_paths, chunksize=chunksize):
+                    done += 1
+                    yield record
+            return
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning(f"Parallel analysis unavailable, falling back to serial analysis: {e}")
+
+    for file_path in file_paths[done:]:
+        yield _analyze_file_record(file_path)
+
+def file_sha256(file_path: Path) -> str:
+    """Return the SHA-256 hex digest of a file, hashed straight from its memory map."""
+    with open(file_path, mode='rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.sha256(mm).hexdigest()
+
+def create_cobol_json(project_id: str, workers: Optional[int] = None) -> Dict:
+    """
+    Create a JSON file summarizing COBOL file analysis.
+
+    Per-file results are cached in the project store (see project_store) keyed
+    by the SHA-256 of the file content and ANALYZER_VERSION, so only new or
+    changed files are re-analyzed and deleted files drop out of the cache.
+    Hit and miss counts are reported under ``analysis_cache``.
+
+    ``dependencies`` lists each copybook name once; ``copybook_graph`` holds the
+    program -> copybook adjacency lists and the shared copybook expansions
+    (see copybook_resolver.resolve_copybooks).
+
+    The statement-level AST of every COBOL member and copybook is cached with
+    the file's row in the store and written to ``cobol_ast.json`` (see
+    cobol_parser.load_project_ast), so consumers can query it without reparsing.
+    The PERFORM/GO TO/CALL graph of the project is written to ``call_graph.idx``
+    (see call_graph.load_call_graph) and the data-name cross-reference to
+    ``symbol_index.idx`` (see symbol_index.load_symbol_index); both are
+    summarized under ``call_graph`` and ``symbol_index``. JCL members are
+    linked into a job/step/program/dataset graph with their procedures
+    expanded, written to ``jcl_graph.json`` (see jcl_parser.load_jcl_graph)
+    and summarized under ``jcl_graph``. Record layouts of every member, with
+    copybooks spliced in, are compiled into the store (see
+    record_layout.load_layouts) and summarized under ``record_layouts``.
+    Complete EXEC SQL/CICS/DLI blocks are indexed in the store with their
+    verb, tables, cursors, host variables, resources and paragraph (see
+    project_store.find_exec_blocks) and counted under ``exec_blocks``.
+
+    The result is stored as the ``cobol_analysis`` stage of the project and
+    exported to ``cobol_analysis.json``. stream_cobol_json produces the same
+    analysis as NDJSON, one file at a time.
+    """
+    cobol_json = {"project_id": project_id, "files": []}
+    for item in _iter_cobol_analysis(project_id, workers):
+        if item[0] == "file":
+            cobol_json["files"].append(item[2])
+        else:
+            cobol_json.update(item[1])
+    return cobol_json
 
-def create_cobol_json(project_id: str) -> Dict:
-    """Create a JSON file summarizing COBOL file analysis."""
+def stream_cobol_json(project_id: str, workers: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Analyze a project like create_cobol_json, as NDJSON lines.
+
+    Each file yields one line as soon as it is ready, in project order:
+    ``{"type": "file", "file": <path in the project>, "analysis": {...}}``,
+    where cached files come straight from the store and changed files are
+    analyzed ahead in the worker pool. The last line is ``{"type": "summary",
+    ...}`` with every other key of create_cobol_json (dependencies, copybook
+    graph, cache counts and the project-wide summaries). The lines are also
+    written to ``cobol_analysis.ndjson`` next to ``cobol_analysis.json``; the
+    stage and the JSON export are written before the summary line, so the
+    iterator has to be consumed to the end. A stream that stops early (the
+    client disconnects, the iterator is closed or the analysis fails) writes
+    neither and leaves the previous ``cobol_analysis.ndjson`` in place.
+    """
+    ndjson_path = ANALYSIS_DIR / project_id / "cobol_analysis.ndjson"
+    ndjson_path.parent.mkdir(exist_ok=True, parents=True)
+    partial_path = ndjson_path.with_suffix(".ndjson.tmp")
+    completed = False
+    try:
+        with open(partial_path, mode='wb') as f:
+            for item in _iter_cobol_analysis(project_id, workers):
+                if item[0] == "file":
+                    line = b'{"type":"file","file":' + dumps(item[1]) + b',"analysis":' + item[3] + b'}\n'
+                else:
+                    line = dumps({"type": "summary", "project_id": project_id, **item[1]}) + b"\n"
+                f.write(line)
+                yield line
+        os.replace(partial_path, ndjson_path)
+        completed = True
+    finally:
+        if not completed:
+            # Client gone, iterator closed or analysis failed: keep the previous NDJSON, drop the partial one
+            logger.warning(f"COBOL NDJSON stream for {project_id} stopped before the end, discarding it")
+            partial_path.unlink(missing_ok=True)
+    logger.info(f"COBOL NDJSON created at: {ndjson_path}")
+
+def _iter_cobol_analysis(project_id: str, workers: Optional[int]) -> Iterator[Tuple]:
+    """
+    Analyze a project file by file for create_cobol_json and stream_cobol_json.
+
+    Yields:
+        ("file", path in the project, analysis, analysis as compact JSON) per
+        readable file in project order, then ("summary", every other key of
+        the result) once the project-wide artifacts, the stage and the JSON
+        export are written
+    """
     logger.info(f"Creating COBOL JSON for project: {project_id}")
     project_dir = Path(UPLOAD_DIR) / project_id
     if not project_dir.exists():
         logger.error(f"Project directory not found: {project_dir}")
         raise ValueError("Project directory not found")
     
-    cobol_json = {
-        "project_id": project_id,
-        "files": [],
-        "dependencies": []
-    }
-    
-    for file_path in project_dir.glob("**/*"):
-        if file_path.suffix.lower() in [".cbl", ".cpy", ".jcl"]:
-            file_analysis = analyze_cobol_file(file_path)
-            if "error" not in file_analysis:
-                cobol_json["files"].append(file_analysis)
-                if file_analysis.get("copybooks"):
-                    dependencies = [cb["name"] for cb in file_analysis["copybooks"]]
-                    cobol_json["dependencies"].extend(dependencies)
-                    logger.info(f"Extracted dependencies from {file_path.name}: {dependencies}")
+    summary = {"dependencies": []}
+    cached_files = project_store.load_file_models(project_id, ANALYZER_VERSION)
+    file_paths = _collect_cobol_files(project_dir)
+    keys = [file_path.relative_to(project_dir).as_posix() for file_path in file_paths]
+    digests = [file_sha256(file_path) for file_path in file_paths]
+    removed = len(set(cached_files) - set(keys))
+
+    # Cached and fresh results are record dictionaries (see _analyze_file_record)
+    records: List = []
+    misses = []
+    for index, (key, digest) in enumerate(zip(keys, digests)):
+        entry = cached_files.get(key)
+        if entry is not None and entry.get("sha256") == digest:
+            records.append(entry)
+        else:
+            records.append(None)
+            misses.append(index)
+
+    # ASTs, flows and symbols are only needed to rebuild the project-wide
+    # artifacts, so an unchanged project never loads the (much larger) structure column
+    saved_graph = load_call_graph(project_id)
+    saved_index = load_symbol_index(project_id)
+    # The JCL graph and layout summaries are kept in the store so an unchanged project does not load them
+    saved_summaries = project_store.get_metadata(project_id, ["jcl_graph", "record_layouts"])
+    saved_jcl_summary = saved_summaries.get("jcl_graph")
+    saved_layout_summary = saved_summaries.get("record_layouts")
+    jcl_current = jcl_graph_path(project_id).exists() and (saved_jcl_summary or {}).get("format") == JCL_GRAPH_FORMAT
+    layouts_current = (saved_layout_summary or {}).get("format") == LAYOUT_FORMAT
+    rebuild = bool(misses or removed or saved_graph is None or saved_index is None
+                   or not project_ast_path(project_id).exists() or not jcl_current or not layouts_current)
+    structures = {}
+    if rebuild:
+        structures = project_store.load_file_structures(project_id, ANALYZER_VERSION)
+        for index, (key, digest) in enumerate(zip(keys, digests)):
+            if records[index] is not None and structures.get(key, {}).get("sha256") != digest:
+                records[index] = None
+                misses.append(index)
+        misses.sort()
+
+    # Edited programs whose changes stay inside procedure paragraphs only re-parse those paragraphs
+    from .incremental import reanalyze_file_record
+    full = []
+    incremental = 0
+    for index in misses:
+        key = keys[index]
+        previous = cached_files.get(key)
+        record = None
+        if previous is not None and key in structures:
+            try:
+                record = reanalyze_file_record(file_paths[index], previous["model"], structures[key])
+            except Exception as e:
+                logger.warning(f"Incremental re-analysis of {key} failed, analyzing it in full: {e}")
+        if record is None:
+            full.append(index)
+        else:
+            records[index] = record
+            incremental += 1
+    # Pulled as each file comes up, so earlier files stream while the pool analyzes later ones
+    fresh = _iter_analyzed_files([file_paths[index] for index in full], workers)
+
+    # Rebuilt from the current file list, which drops entries for deleted files
+    new_cache = {}
+    new_structures = {}
+    seen_dependencies = set()
+    # Only what the copybook resolver reads is kept of each analysis
+    programs = []
+    parts = []
+    for index, (key, digest, file_path) in enumerate(zip(keys, digests, file_paths)):
+        record = records[index]
+        if record is None:
+            record = records[index] = next(fresh)
+        if "error" in record:
+            continue
+        new_cache[key] = {"sha256": digest, "model": record["model"]}
+        if rebuild:
+            structure = structures[key] if "ast" not in record else record
+            new_structures[key] = {"sha256": digest, "ast": structure["ast"], "flow": structure["flow"],
+                                   "symbols": structure["symbols"], "layouts": structure["layouts"],
+                                   "segments": structure["segments"], "exec_blocks": structure["exec_blocks"]}
+        file_analysis = model_from_record(record["model"]).to_legacy()
+        programs.append({field: file_analysis.get(field) for field in ("file_name", "file_type", "copybooks")})
+        if file_analysis.get("copybooks"):
+            dependencies = [cb["name"] for cb in file_analysis["copybooks"]]
+            for dependency in dependencies:
+                if dependency not in seen_dependencies:
+                    seen_dependencies.add(dependency)
+                    summary["dependencies"].append(dependency)
+            logger.info(f"Extracted dependencies from {file_path.name}: {dependencies}")
+        part = dumps(file_analysis)
+        parts.append(part)
+        yield "file", key, file_analysis, part
     
-    if not cobol_json["files"]:
+    if not parts:
         logger.warning(f"No valid COBOL files found for project: {project_id}")
-    
+
+    # Imported here because the resolver builds on this module's line analyzer
+    from .copybook_resolver import resolve_copybooks
+    summary["copybook_graph"] = resolve_copybooks(programs, file_paths, project_dir)
+
+    summary["analysis_cache"] = {
+        "hits": len(file_paths) - len(misses),
+        "misses": len(misses),
+        "incremental": incremental,
+        "removed": removed
+    }
+    logger.info(f"Analysis cache for {project_id}: {summary['analysis_cache']}")
+
+    if rebuild:
+        # Only the re-analyzed rows are rewritten; rows of deleted or now unreadable files go
+        written = {keys[index] for index in misses} & set(new_cache)
+        project_store.update_file_analyses(project_id, ANALYZER_VERSION,
+                                           {key: new_cache[key] for key in written},
+                                           {key: new_structures[key] for key in written},
+                                           set(cached_files) - set(new_cache))
+        save_project_ast(project_id, {
+            key: structure["ast"] for key, structure in new_structures.items() if structure["ast"] is not None
+        })
+        call_graph = build_call_graph({
+            key: structure["flow"] for key, structure in new_structures.items() if structure["flow"] is not None
+        })
+        save_call_graph(project_id, call_graph)
+        symbol_index = build_symbol_index({
+            key: structure["symbols"] for key, structure in new_structures.items() if structure["symbols"] is not None
+        })
+        save_symbol_index(project_id, symbol_index)
+        call_graph_summary, symbol_index_summary = call_graph["header"], symbol_index["header"]
+        # Incremental re-analysis only replaces procedure paragraphs of COBOL
+        # programs, which leaves the JCL graph and record layouts as they were
+        relink_only = not full and not removed
+        if relink_only and jcl_current:
+            jcl_graph_summary = saved_jcl_summary
+        else:
+            jcl_graph = build_jcl_graph([file_path for file_path in file_paths if file_path.suffix.lower() == ".jcl"])
+            save_jcl_graph(project_id, jcl_graph)
+            jcl_graph_summary = jcl_graph["header"]
+        if relink_only and layouts_current:
+            layout_summary = saved_layout_summary
+        else:
+            layouts = build_project_layouts({
+                key: structure["layouts"] for key, structure in new_structures.items() if structure["layouts"] is not None
+            })
+            project_store.save_layouts(project_id, layouts["documents"])
+            layout_summary = layouts["header"]
+    else:
+        call_graph_summary, symbol_index_summary = saved_graph.header, saved_index.header
+        jcl_graph_summary = saved_jcl_summary
+        layout_summary = saved_layout_summary
+    summary["call_graph"] = {key: value for key, value in call_graph_summary.items() if key != "format"}
+    summary["symbol_index"] = {key: value for key, value in symbol_index_summary.items() if key != "format"}
+    summary["jcl_graph"] = {key: value for key, value in jcl_graph_summary.items() if key != "format"}
+    summary["record_layouts"] = {key: value for key, value in layout_summary.items() if key != "format"}
+    summary["exec_blocks"] = project_store.exec_block_summary(project_id)
+
+    # The document is assembled from the per-file JSON already produced, so
+    # the stage and the export are serialized once and never held as one dictionary
+    document = (dumps({"project_id": project_id})[:-1] + b',"files":[' + b",".join(parts) + b"],"
+                + dumps(summary)[1:])
+    parts.clear()
+    project_store.save_stage(project_id, "cobol_analysis", document)
+    project_store.set_metadata(project_id, {
+        "analyzer_version": ANALYZER_VERSION,
+        "analyzed_at": time.time(),
+        "analysis_cache": summary["analysis_cache"],
+        "call_graph": summary["call_graph"],
+        "symbol_index": summary["symbol_index"],
+        "jcl_graph": jcl_graph_summary,
+        "record_layouts": layout_summary,
+        "exec_blocks": summary["exec_blocks"]
+    })
+
     json_path = ANALYSIS_DIR / project_id / "cobol_analysis.json"
     json_path.parent.mkdir(exist_ok=True, parents=True)
-    with open(json_path, mode='w', encoding='utf-8') as f:
-        json.dump(cobol_json, f, indent=2)
-    
+    with open(json_path, mode='wb') as f:
+        f.write(document)
+    del document
+
     logger.info(f"COBOL JSON created at: {json_path}")
-    return cobol_json
\ No newline at end of file
+    yield "summary", summary
\ No newline at end of file
@@ -0,0 +1,350 @@
+from pathlib import Path
+from sys import intern
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from ..config import logger, output_dir
+from .cobol_tokenizer import SourceLine, tokenize_line, WORD, NUMBER, PERIOD
+from .analysis_model import dumps, loads
+
+AST_FILE = "cobol_ast.json"
+# Bump whenever the node layout written by ast_to_record changes
+AST_FORMAT = 1
+
+# Node kinds
+PROGRAM = "PROGRAM"
+DIVISION = "DIVISION"
+SECTION = "SECTION"
+PARAGRAPH = "PARAGRAPH"
+STATEMENT = "STATEMENT"
+ENTRY = "ENTRY"
+FILE_DESCRIPTION = "FD"
+COPY = "COPY"
+EXEC = "EXEC"
+
+STATEMENT_VERBS = frozenset((
+    "ACCEPT", "ADD", "ALTER", "CALL", "CANCEL", "CLOSE", "COMPUTE", "CONTINUE", "DELETE", "DISPLAY",
+    "DIVIDE", "ELSE", "ENTRY", "EVALUATE", "EXIT", "GENERATE", "GO", "GOBACK", "IF", "INITIALIZE",
+    "INITIATE", "INSPECT", "INVOKE", "MERGE", "MOVE", "MULTIPLY", "OPEN", "PERFORM", "READ",
+    "RELEASE", "RETURN", "REWRITE", "SEARCH", "SET", "SORT", "START", "STOP", "STRING", "SUBTRACT",
+    "TERMINATE", "UNSTRING", "WHEN", "WRITE",
+))
+# Statements whose nested statements become their children until END-<verb> or a period
+BLOCK_VERBS = frozenset(("IF", "EVALUATE", "SEARCH"))
+# Statements that own the imperative statements of AT END, INVALID KEY, ON SIZE ERROR, ... phrases
+CONDITIONAL_VERBS = frozenset((
+    "ADD", "CALL", "COMPUTE", "DELETE", "DIVIDE", "MULTIPLY", "READ", "RETURN", "REWRITE", "START",
+    "STRING", "SUBTRACT", "UNSTRING", "WRITE",
+))
+_CONDITIONAL_PHRASES = frozenset(("END", "INVALID", "ERROR", "EXCEPTION", "OVERFLOW", "EOP", "END-OF-PAGE"))
+# Words right after PERFORM that make it an inline PERFORM ... END-PERFORM block
+_INLINE_PERFORM = frozenset(("UNTIL", "VARYING", "WITH", "TEST", "FOREVER"))
+# Words that may change the parser state; anything else inside a statement is a plain operand
+_STRUCTURAL_WORDS = STATEMENT_VERBS | _CONDITIONAL_PHRASES | {"EXEC"}
+_FILE_DESCRIPTIONS = frozenset(("FD", "SD", "RD", "CD"))
+_DIVISION_NAMES = {"IDENTIFICATION": "IDENTIFICATION", "ID": "IDENTIFICATION",
+                   "ENVIRONMENT": "ENVIRONMENT", "DATA": "DATA", "PROCEDURE": "PROCEDURE"}
+
+
+class AstNode:
+    """
+    One node of the COBOL syntax tree.
+
+    ``line``/``column`` and ``end_line``/``end_column`` span the node in the
+    source (1-based, end column exclusive). ``operands`` holds the words and
+    literals of the node that are not child nodes, e.g. ``["X", "TO", "Y"]``
+    for ``MOVE X TO Y``; ``level`` is the level number of data entries.
+    """
+    __slots__ = ("kind", "name", "level", "line", "column", "end_line", "end_column", "operands", "children")
+
+    def __init__(self, kind: str, name: str, line: int, column: int, end_column: int, level: int = 0):
+        self.kind = kind
+        self.name = intern(name)
+        self.level = level
+        self.line = line
+        self.column = column
+        self.end_line = line
+        self.end_column = end_column
+        self.operands: List[str] = []
+        self.children: List["AstNode"] = []
+
+    def walk(self, kind: Optional[str] = None) -> Iterator["AstNode"]:
+        """Yield this node and its descendants depth-first, optionally only of one kind."""
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            if kind is None or node.kind == kind:
+                yield node
+            pending.extend(reversed(node.children))
+
+    def find(self, kind: str, name: Optional[str] = None) -> Optional["AstNode"]:
+        return next((node for node in self.walk(kind) if name is None or node.name == name), None)
+
+    def span(self) -> Dict[str, int]:
+        return {"line": self.line, "column": self.column, "end_line": self.end_line, "end_column": self.end_column}
+
+    def __repr__(self) -> str:
+        return f"AstNode({self.kind} {self.name} {self.line}:{self.column}-{self.end_line}:{self.end_column})"
+
+
+def parse_cobol(source_lines: Iterable[SourceLine], name: str = "") -> AstNode:
+    """
+    Parse logical COBOL lines into a statement-level syntax tree in one linear pass.
+
+    The tree holds the divisions, sections and paragraphs; data description
+    entries nested by level under their FD or section; COPY statements; EXEC
+    SQL/CICS/DLI blocks; and procedure statements, with IF/ELSE, EVALUATE/WHEN,
+    SEARCH and inline PERFORM owning the statements they contain. Copybooks
+    without division headers parse the same way.
+
+    Args:
+        source_lines: Lines produced by iter_source_lines
+        name: Fallback program name when there is no PROGRAM-ID
+
+    Returns:
+        The PROGRAM root node
+    """
+    root = AstNode(PROGRAM, name, 1, 1, 1)
+    division: Optional[AstNode] = None
+    section: Optional[AstNode] = None
+    paragraph: Optional[AstNode] = None
+    file_description: Optional[AstNode] = None
+    blocks: List[AstNode] = []   # open IF/ELSE/EVALUATE/WHEN/SEARCH/inline PERFORM statements
+    entries: List[AstNode] = []  # open data description entries, outermost first
+    current: Optional[AstNode] = None  # node receiving operands until the next verb or period
+    exec_block: Optional[AstNode] = None
+    pending_perform: Optional[AstNode] = None
+    sentence_start = True
+    skip = 0
+    end_line = end_column = 1
+
+    def close(node: AstNode) -> None:
+        node.end_line = end_line
+        node.end_column = end_column
+
+    def close_blocks() -> None:
+        while blocks:
+            close(blocks.pop())
+
+    def close_entries(level: int = 0) -> None:
+        # Entries at or below ``level`` end; level 0 closes all of them
+        while entries and (not level or entries[-1].level >= level):
+            close(entries.pop())
+
+    def container() -> AstNode:
+        if blocks:
+            return blocks[-1]
+        if entries:
+            return entries[-1]
+        return paragraph or file_description or section or division or root
+
+    for source_line in source_lines:
+        tokens = tokenize_line(source_line)
+        count = len(tokens)
+        for index in range(count):
+            kind, value, line, column, token_area = tokens[index]
+            following = tokens[index + 1].value if index + 1 < count else None
+
+            if skip:
+                skip -= 1
+            elif (current is not None and not sentence_start and pending_perform is None and kind != PERIOD
+                    and value not in _STRUCTURAL_WORDS and value[:4] != "END-" and exec_block is None):
+                # Fast path: the bulk of the tokens are operands of the open statement or entry
+                current.operands.append(value)
+                current.end_line, current.end_column = line, column + len(value)
+            elif exec_block is not None:
+                if value != "END-EXEC":
+                    exec_block.operands.append(value)
+                exec_block.end_line, exec_block.end_column = line, column + len(value)
+                if value == "END-EXEC":
+                    exec_block = current = None
+            elif kind == PERIOD:
+                if current is not None:
+                    current.end_line, current.end_column = line, column + 1
+                current = pending_perform = None
+                end_line, end_column = line, column + 1
+                close_blocks()
+                sentence_start = True
+                continue
+            elif value == "EXEC" and following in ("SQL", "CICS", "DLI", "SQLIMS"):
+                pending_perform = None
+                if token_area == "A":
+                    close_entries()
+                exec_block = current = AstNode(EXEC, following, line, column, column + len(value))
+                container().children.append(exec_block)
+                skip = 1
+            elif sentence_start and kind == WORD and following == "DIVISION" and value in _DIVISION_NAMES:
+                close_blocks()
+                close_entries()
+                for node in (paragraph, file_description, section, division):
+                    if node is not None:
+                        close(node)
+                paragraph = file_description = section = None
+                division = current = AstNode(DIVISION, _DIVISION_NAMES[value], line, column, column + len(value))
+                root.children.append(division)
+                skip = 1
+            elif sentence_start and kind == WORD and following == "SECTION":
+                close_blocks()
+                close_entries()
+                for node in (paragraph, file_description, section):
+                    if node is not None:
+                        close(node)
+                paragraph = file_description = None
+                section = current = AstNode(SECTION, value, line, column, column + len(value))
+                (division or root).children.append(section)
+                skip = 1
+            elif (sentence_start and index == 0 and following == "." and kind == WORD
+                    and value not in STATEMENT_VERBS and (division is None or division.name != "DATA")):
+                close_blocks()
+                if paragraph is not None:
+                    close(paragraph)
+                paragraph = AstNode(PARAGRAPH, value, line, column, column + len(value))
+                (section or division or root).children.append(paragraph)
+                current = None
+            elif sentence_start and value == "COPY" and following is not None:
+                if token_area == "A":
+                    # A COPY in area A starts new records; one in area B belongs to the open group
+                    close_entries()
+                current = AstNode(COPY, following.strip("\"'"), line, column, column + len(value))
+                container().children.append(current)
+                skip = 1
+            elif (sentence_start and kind == NUMBER and value.isdigit()
+                    and (division is None or division.name == "DATA")):
+                level = int(value)
+                if level in (1, 66, 77):
+                    close_entries()
+                elif level != 88:
+                    close_entries(level)
+                entry_name = following if index + 1 < count and tokens[index + 1].type == WORD else "FILLER"
+                current = AstNode(ENTRY, entry_name, line, column, column + len(value), level)
+                container().children.append(current)
+                if level != 88:
+                    entries.append(current)
+                skip = 1 if entry_name == following else 0
+            elif sentence_start and kind == WORD and value in _FILE_DESCRIPTIONS and following is not None:
+                close_entries()
+                if file_description is not None:
+                    close(file_description)
+                file_description = current = AstNode(FILE_DESCRIPTION, following, line, column, column + len(value))
+                (section or division or root).children.append(file_description)
+                file_description.operands.append(value)
+                skip = 1
+            elif kind == WORD and (value in STATEMENT_VERBS or value.startswith("END-")) and (
+                    division is None and not entries or division is not None and division.name == "PROCEDURE"):
+                pending_perform = None
+                if value.startswith("END-"):
+                    # Scope terminator: close the innermost open block of that verb, if any
+                    verb = value[4:]
+                    if any(block.name == verb for block in blocks):
+                        while blocks:
+                            block = blocks.pop()
+                            block.end_line, block.end_column = line, column + len(value)
+                            if block.name == verb:
+                                break
+                        current = None
+                    elif current is not None:
+                        current.end_line, current.end_column = line, column + len(value)
+                        current = None
+                elif value == "ELSE" or value == "WHEN":
+                    owners = ("IF",) if value == "ELSE" else ("EVALUATE", "SEARCH")
+                    if any(block.name in owners for block in blocks):
+                        while blocks[-1].name not in owners:
+                            close(blocks.pop())
+                    current = AstNode(STATEMENT, value, line, column, column + len(value))
+                    container().children.append(current)
+                    blocks.append(current)
+                else:
+                    current = AstNode(STATEMENT, value, line, column, column + len(value))
+                    container().children.append(current)
+                    if value in BLOCK_VERBS:
+                        blocks.append(current)
+                    elif value == "PERFORM":
+                        pending_perform = current
+            else:
+                if pending_perform is not None:
+                    # PERFORM UNTIL/VARYING/n TIMES without a procedure name opens an inline block
+                    if value in _INLINE_PERFORM or following == "TIMES":
+                        blocks.append(pending_perform)
+                    pending_perform = None
+                if value in _CONDITIONAL_PHRASES and current is not None:
+                    if current.name in CONDITIONAL_VERBS and current.kind == STATEMENT and current not in blocks:
+                        blocks.append(current)
+                    elif blocks and blocks[-1].name in CONDITIONAL_VERBS and current is not blocks[-1]:
+                        # NOT AT END and similar after the statements of the first phrase
+                        current = blocks[-1]
+                if current is None:
+                    if division is not None and division.name == "IDENTIFICATION" and paragraph is not None:
+                        current = paragraph
+                    elif kind == WORD and (division is None or division.name != "PROCEDURE"):
+                        # Environment entries such as SELECT ... ASSIGN TO ... become statements
+                        current = AstNode(STATEMENT, value, line, column, column + len(value))
+                        container().children.append(current)
+                        sentence_start = False
+                        end_line, end_column = line, column + len(value)
+                        continue
+                if current is not None:
+                    current.operands.append(value)
+                    current.end_line, current.end_column = line, column + len(value)
+
+            sentence_start = False
+            end_line, end_column = line, column + len(value)
+
+    close_blocks()
+    close_entries()
+    for node in (paragraph, file_description, section, division, root):
+        if node is not None:
+            close(node)
+
+    program_id = root.find(PARAGRAPH, "PROGRAM-ID")
+    if program_id is not None and program_id.operands:
+        root.name = intern(program_id.operands[0].strip("\"'"))
+    return root
+
+
+def ast_to_record(node: AstNode) -> List[Any]:
+    """Flatten a node and its subtree into nested lists for compact serialization."""
+    return [node.kind, node.name, node.level, node.line, node.column, node.end_line, node.end_column,
+            node.operands, list(map(ast_to_record, node.children))]
+
+
+def ast_from_record(record: List[Any]) -> AstNode:
+    """Rebuild a subtree from ast_to_record output without reparsing the source."""
+    kind, name, level, line, column, end_line, end_column, operands, children = record
+    node = AstNode(kind, name, line, column, end_column, level)
+    node.end_line = end_line
+    node.operands = operands
+    node.children = [ast_from_record(child) for child in children]
+    return node
+
+
+def project_ast_path(project_id: str) -> Path:
+    return Path(output_dir) / "analysis" / project_id / AST_FILE
+
+
+def save_project_ast(project_id: str, records: Dict[str, List[Any]]) -> Path:
+    """Persist the per-file AST records of a project to output/analysis/<project_id>/cobol_ast.json."""
+    ast_path = project_ast_path(project_id)
+    ast_path.parent.mkdir(exist_ok=True, parents=True)
+    with open(ast_path, mode='wb') as f:
+        f.write(dumps({"format": AST_FORMAT, "files": records}))
+    return ast_path
+
+
+def load_project_ast(project_id: str) -> Dict[str, AstNode]:
+    """
+    Load the persisted ASTs of a project.
+
+    Returns:
+        Mapping of project-relative file path to PROGRAM node; empty when the
+        project has not been analyzed or the file uses another format
+    """
+    ast_path = project_ast_path(project_id)
+    if not ast_path.exists():
+        return {}
+    try:
+        with open(ast_path, mode='rb') as f:
+            data = loads(f.read())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load AST for project {project_id}: {e}")
+        return {}
+    if data.get("format") != AST_FORMAT:
+        return {}
+    return {path: ast_from_record(record) for path, record in data.get("files", {}).items()}
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from ..config import logger
+from .analysis_model import ProgramModel
+from .cobol_analyzer import _analyze_cobol_lines
+from .cobol_tokenizer import SourceLine, iter_source_lines
+from .source_reader import iter_records
+
+COPYBOOK_SUFFIXES = (".cpy", ".cbl")
+_WORD_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-")
+_WORD_START = r"(?<![A-Za-z0-9-])"
+_WORD_END = r"(?![A-Za-z0-9-])"
+
+
+def copybook_member_name(name: str) -> str:
+    """Normalize a COPY operand ('CUSTREC', "custrec.cpy") to the member name used as lookup key."""
+    name = name.strip("\"'").upper()
+    stem, dot, suffix = name.rpartition(".")
+    if dot and "." + suffix.lower() in COPYBOOK_SUFFIXES:
+        return stem
+    return name
+
+
+def expansion_key(name: str, replacing: List[List[str]]) -> str:
+    """Key of one expansion: the member name, suffixed with a digest of its REPLACING operands."""
+    if not replacing:
+        return name
+    digest = hashlib.sha1(json.dumps(replacing).encode("utf-8")).hexdigest()[:8]
+    return f"{name}#{digest}"
+
+
+def _operand_text(operand: str) -> str:
+    if len(operand) >= 4 and operand.startswith("==") and operand.endswith("=="):
+        return operand[2:-2].strip()
+    return operand
+
+
+def _compile_replacing(replacing: List[List[str]]) -> List[Tuple[re.Pattern, str]]:
+    """
+    Turn REPLACING pairs into (pattern, replacement) rules.
+
+    Operands match whole text words unless they start or end with a separator
+    (the usual ``==:TAG:==`` prefix convention), or LEADING/TRAILING is given.
+    """
+    rules = []
+    for pair in replacing:
+        source_text = _operand_text(pair[0])
+        target_text = _operand_text(pair[1])
+        mode = pair[2] if len(pair) > 2 else None
+        if not source_text:
+            continue
+        pattern = r"\s+".join(re.escape(part) for part in source_text.split())
+        if mode != "TRAILING" and source_text[0] in _WORD_CHARS:
+            pattern = _WORD_START + pattern
+        if mode != "LEADING" and source_text[-1] in _WORD_CHARS:
+            pattern += _WORD_END
+        rules.append((re.compile(pattern, re.IGNORECASE), target_text))
+    return rules
+
+
+def apply_replacing(source_lines: Iterable[SourceLine], replacing: List[List[str]]) -> Iterator[SourceLine]:
+    """
+    Apply COPY ... REPLACING operands to logical copybook lines.
+
+    Replacement works per logical line, so pseudo-text spanning several
+    statements is not matched.
+    """
+    rules = _compile_replacing(replacing)
+    for source_line in source_lines:
+        text = source_line.text
+        for pattern, target_text in rules:
+            text = pattern.sub(lambda _, target_text=target_text: target_text, text)
+        if text is source_line.text:
+            yield source_line
+        else:
+            yield SourceLine(source_line.line, source_line.column, source_line.area, text, text.upper())
+
+
+def build_copybook_index(file_paths: Iterable[Path], project_dir: Path) -> Dict[str, Path]:
+    """
+    Map copybook member names to files, preferring .cpy members over .cbl ones.
+
+    Args:
+        file_paths: Project files in a stable order
+        project_dir: Project root, used for warnings only
+
+    Returns:
+        Dictionary of member name to file path
+    """
+    index: Dict[str, Path] = {}
+    for suffix in COPYBOOK_SUFFIXES:
+        for file_path in file_paths:
+            if file_path.suffix.lower() != suffix:
+                continue
+            name = file_path.stem.upper()
+            if name not in index:
+                index[name] = file_path
+            elif index[name].suffix.lower() == suffix:
+                logger.warning(f"Duplicate copybook member {name}: using {index[name].relative_to(project_dir)}, "
+                               f"ignoring {file_path.relative_to(project_dir)}")
+    return index
+
+
+def resolve_copybooks(programs: List[Dict], file_paths: List[Path], project_dir: Path) -> Dict:
+    """
+    Resolve the COPY statements of analyzed programs against the project's copybooks.
+
+    Every (member, REPLACING) combination is read, replaced and analyzed once,
+    including nested COPY statements, and shared by all programs that include
+    it, so the cost grows with the number of distinct copybooks rather than
+    with programs x copybooks.
+
+    Args:
+        programs: Per-file analyses from analyze_cobol_file
+        file_paths: All COBOL members of the project
+        project_dir: Project root
+
+    Returns:
+        Dictionary with:
+            - adjacency: program file name or expansion key -> deduplicated list of expansion keys
+            - expansions: expansion key -> expanded copybook structure
+            - unresolved: sorted member names that were not found in the project
+    """
+    index = build_copybook_index(file_paths, project_dir)
+    sources: Dict[str, List[SourceLine]] = {}  # member -> logical lines, read once
+    expansions: Dict[str, Dict] = {}
+    adjacency: Dict[str, List[str]] = {}
+    unresolved = set()
+
+    def expand(name: str, replacing: List[List[str]], stack: Tuple[str, ...]) -> Optional[str]:
+        member = copybook_member_name(name)
+        key = expansion_key(member, replacing)
+        if key in expansions:
+            return key
+        if key in stack:
+            logger.warning(f"Recursive COPY of {member}: {' -> '.join(stack + (key,))}")
+            return key
+
+        file_path = index.get(member)
+        if file_path is None:
+            unresolved.add(member)
+            return None
+        if member not in sources:
+            try:
+                sources[member] = list(iter_source_lines(iter_records(file_path)))
+            except OSError as e:
+                logger.error(f"Error reading copybook {file_path}: {e}")
+                unresolved.add(member)
+                return None
+
+        model = ProgramModel(file_path.name, ".cpy")
+        source_lines = apply_replacing(sources[member], replacing) if replacing else sources[member]
+        _analyze_cobol_lines(source_lines, model, is_copybook=True)
+        nested = _link(key, [{"name": c.name, "replacing": c.replacing} for c in model.copybooks], stack + (key,))
+        expansions[key] = {
+            "name": member,
+            "file": file_path.relative_to(project_dir).as_posix(),
+            "replacing": replacing,
+            "variables": model.variables,
+            "data": model.to_legacy()["divisions"]["data"]["working_storage"],
+            "copybooks": nested
+        }
+        return key
+
+    def _link(node: str, copybooks: List[Dict], stack: Tuple[str, ...]) -> List[str]:
+        targets = []
+        for copybook in copybooks:
+            key = expand(copybook["name"], copybook.get("replacing") or [], stack)
+            if key is not None and key not in targets:
+                targets.append(key)
+        if targets:
+            adjacency[node] = targets
+        return targets
+
+    for program in programs:
+        if program["file_type"] != ".cpy" and program.get("copybooks"):
+            _link(program["file_name"], program["copybooks"], ())
+
+    if unresolved:
+        logger.warning(f"Unresolved copybooks: {sorted(unresolved)}")
+    logger.info(f"Resolved {len(expansions)} copybook expansions for {len(adjacency)} members")
+    return {
+        "adjacency": adjacency,
+        "expansions": expansions,
+        "unresolved": sorted(unresolved)
+    }
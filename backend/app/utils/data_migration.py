@@ -0,0 +1,240 @@
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from ..config import logger, output_dir
+from .record_decoder import RecordDecoder, Column, DEFAULT_BATCH_RECORDS, TEXT, NATIONAL, ZONED, PACKED, BINARY, HEX_FLOAT
+
+# Key of every migrated table: the 1-based relative record number in the data file
+RECORD_NUMBER_COLUMN = "RecordNumber"
+# Progress of every table loaded into a target database, committed with each batch
+CHECKPOINT_TABLE = "_migration_checkpoints"
+
+_CHECKPOINT_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+    table_name TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+def sql_name(cobol_name: str) -> str:
+    """
+    PascalCase SQL identifier of a COBOL data name, as EF Core names entities and properties.
+
+    CUST-REC becomes CustRec; names starting with a digit get an F prefix.
+    """
+    name = "".join(part.capitalize() for part in re.split(r"[^A-Za-z0-9]+", cobol_name) if part)
+    return f"F{name}" if not name or name[0].isdigit() else name
+
+
+class TableColumn:
+    """One SQL column: a decoded column, or one occurrence of it for OCCURS items."""
+    __slots__ = ("name", "source", "index", "sql_type")
+
+    def __init__(self, name: str, source: str, index: Tuple[int, ...], sql_type: str):
+        self.name = name
+        self.source = source
+        self.index = index
+        self.sql_type = sql_type
+
+    def __repr__(self) -> str:
+        return f"TableColumn({self.name} {self.sql_type} <- {self.source}{list(self.index) if self.index else ''})"
+
+
+def _sql_type(column: Column) -> str:
+    if column.kind == TEXT:
+        return f"VARCHAR({column.length})"
+    if column.kind == NATIONAL:
+        return f"NVARCHAR({column.length // 2})"
+    if column.kind in (ZONED, PACKED, BINARY):
+        if column.scale > 0:
+            return f"DECIMAL({column.digits},{column.scale})"
+        return "BIGINT"
+    if column.kind == HEX_FLOAT:
+        return "DOUBLE"
+    return "BLOB"
+
+
+def _occurs_shape(dtype: np.dtype, column: Column) -> Tuple[int, ...]:
+    """OCCURS dimensions of a decoded column: its enclosing tables, then its own."""
+    shape: Tuple[int, ...] = ()
+    for name in column.path[:-1]:
+        dtype = dtype.fields[name][0]
+        if dtype.subdtype:
+            dtype, dimensions = dtype.subdtype
+            shape += dimensions
+    return shape + column.shape
+
+
+def table_columns(decoder: RecordDecoder) -> List[TableColumn]:
+    """
+    SQL columns of a record, derived from its copybook fields.
+
+    OCCURS items are flattened into one column per occurrence (HistAmt1,
+    HistAmt2, ... and HistAmt1_1 for nested tables); names that collide are
+    qualified with their enclosing group.
+    """
+    columns, taken = [], {RECORD_NUMBER_COLUMN.lower()}
+    for column in decoder.columns:
+        base = sql_name(column.path[-1])
+        if base.lower() in taken:
+            base = sql_name("-".join(column.path))
+        shape = _occurs_shape(decoder.dtype, column)
+        for index in np.ndindex(*shape):
+            name = base + "_".join(str(position + 1) for position in index)
+            while name.lower() in taken:
+                name += "_"
+            taken.add(name.lower())
+            columns.append(TableColumn(name, column.name, index, _sql_type(column)))
+    return columns
+
+
+def create_table_sql(table: str, columns: List[TableColumn]) -> str:
+    definitions = [f'"{RECORD_NUMBER_COLUMN}" INTEGER PRIMARY KEY']
+    definitions += [f'"{column.name}" {column.sql_type}' for column in columns]
+    return f'CREATE TABLE IF NOT EXISTS "{table}" (\n    ' + ",\n    ".join(definitions) + "\n)"
+
+
+def _rows(first: int, count: int, values: Dict[str, np.ndarray], columns: List[TableColumn]) -> Iterator[Tuple[Any, ...]]:
+    """Rows of a decoded batch, numbered from ``first`` + 1, as plain Python values."""
+    lists = []
+    for column in columns:
+        data = values[column.source][(slice(None),) + column.index]
+        if data.ndim > 1:  # undecoded bytes
+            lists.append([row.tobytes() for row in data])
+        else:
+            lists.append(data.tolist())
+    return zip(range(first + 1, first + count + 1), *lists)
+
+
+def _signature(path: Path, record_length: int) -> str:
+    stat = path.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}:{record_length}"
+
+
+def _summary(table: str, target: Path, data_path: Path, record_length: int, columns: List[TableColumn], total: int,
+             start: int, batches: List[Dict[str, Any]], invalid: Dict[str, int], seconds: float) -> Dict[str, Any]:
+    """The result of migrate_data_file."""
+    loaded_records = sum(batch["records"] for batch in batches)
+    return {
+        "table": table,
+        "target": str(target),
+        "source": str(data_path),
+        "record_length": record_length,
+        "columns": [{"name": column.name, "type": column.sql_type, "source": column.source,
+                     "index": [position + 1 for position in column.index]} for column in columns],
+        "records_total": total,
+        "resumed_from": start,
+        "records_loaded": loaded_records,
+        "seconds": round(seconds, 4),
+        "records_per_second": round(loaded_records / seconds) if seconds and loaded_records else None,
+        "mb_per_second": round(loaded_records * record_length / (1 << 20) / seconds, 2) if seconds and loaded_records else None,
+        "invalid": invalid,
+        "batches": batches
+    }
+
+
+def migrate_data_file(decoder: RecordDecoder, data_path: Path, target: Path, table: Optional[str] = None,
+                      batch_records: int = DEFAULT_BATCH_RECORDS, resume: bool = True) -> Dict[str, Any]:
+    """
+    Bulk-load a file of fixed-length records into a table of a SQLite database.
+
+    The file is decoded batch by batch from its memory map and each batch is
+    inserted with one executemany in its own transaction, together with the
+    table's checkpoint, so memory is bounded by ``batch_records`` and an
+    interrupted load resumes after the last committed batch. The checkpoint
+    also records the file's size, modification time and record length; a
+    changed file is reloaded from the start.
+
+    Args:
+        decoder: Decoder of the file's record (see record_decoder.decoder_for)
+        data_path: Data file
+        target: SQLite database, created if needed
+        table: Table name, made an identifier like field names; defaults to the record name
+        batch_records: Records per batch and transaction
+        resume: Continue from the checkpoint; when False the table is emptied first
+
+    Returns:
+        Summary: table, columns, records loaded, overall and per-batch
+        throughput, and the invalid values found per column
+    """
+    table = sql_name(table or decoder.record.name)
+    columns = table_columns(decoder)
+    record_length = decoder.dtype.itemsize
+    signature = _signature(data_path, record_length)
+    total = data_path.stat().st_size // record_length
+
+    target.parent.mkdir(exist_ok=True, parents=True)
+    connection = sqlite3.connect(str(target), timeout=30)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with connection:
+            connection.execute(_CHECKPOINT_SCHEMA)
+            connection.execute(create_table_sql(table, columns))
+        checkpoint = connection.execute(
+            f"SELECT signature, records FROM {CHECKPOINT_TABLE} WHERE table_name = ?", (table,)).fetchone()
+        start = 0
+        if checkpoint and resume and checkpoint[0] == signature:
+            start = checkpoint[1]
+        elif checkpoint or not resume:
+            if checkpoint and resume:
+                logger.info(f"{data_path.name} changed since {table} was loaded, reloading it")
+            with connection:
+                connection.execute(f'DELETE FROM "{table}"')
+                connection.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE table_name = ?", (table,))
+        if start and start >= total:
+            logger.info(f"{table} already holds all {total} records of {data_path.name}, nothing to load")
+            return _summary(table, target, data_path, record_length, columns, total, start, [], {}, 0.0)
+        if start:
+            logger.info(f"Resuming load of {table} at record {start + 1} of {total}")
+
+        insert = (f'INSERT INTO "{table}" ("{RECORD_NUMBER_COLUMN}", '
+                  + ", ".join(f'"{column.name}"' for column in columns)
+                  + ") VALUES (" + ", ".join("?" * (len(columns) + 1)) + ")")
+        checkpoint_sql = (f"INSERT OR REPLACE INTO {CHECKPOINT_TABLE} (table_name, source, signature, records, updated_at) "
+                          "VALUES (?, ?, ?, ?, ?)")
+        batches: List[Dict[str, Any]] = []
+        invalid: Dict[str, int] = {}
+        started = time.perf_counter()
+        decode_started = started
+        for first, values, batch_invalid in decoder.iter_file(data_path, batch_records, start):
+            count = len(next(iter(values.values()))) if values else 0
+            decoded = time.perf_counter()
+            with connection:
+                connection.executemany(insert, _rows(first, count, values, columns))
+                connection.execute(checkpoint_sql, (table, str(data_path), signature, first + count, time.time()))
+            loaded = time.perf_counter()
+            seconds = loaded - decode_started
+            batch = {
+                "first_record": first + 1,
+                "records": count,
+                "decode_seconds": round(decoded - decode_started, 4),
+                "load_seconds": round(loaded - decoded, 4),
+                "records_per_second": round(count / seconds) if seconds else None,
+                "mb_per_second": round(count * record_length / (1 << 20) / seconds, 2) if seconds else None
+            }
+            batches.append(batch)
+            logger.info(f"{table}: records {first + 1}-{first + count} of {total} loaded, "
+                        f"{batch['records_per_second']} records/s")
+            for name, bad in batch_invalid.items():
+                invalid[name] = invalid.get(name, 0) + bad
+            decode_started = time.perf_counter()
+        seconds = time.perf_counter() - started
+    finally:
+        connection.close()
+
+    if invalid:
+        logger.warning(f"{table}: invalid values decoded as 0: {invalid}")
+    return _summary(table, target, data_path, record_length, columns, total, start, batches, invalid, seconds)
+
+
+def migration_target(project_id: str) -> Path:
+    """Local SQLite database that a project's data files are migrated into."""
+    return Path(output_dir) / "migration" / f"{project_id}.db"
@@ -314,12 +314,48 @@ using (var scope = app.Services.CreateScope())
 app.Run();
 """
 
-def get_db_template(target_language):
+# Mapping guidance appended to the C# template for each data store flavor found by db_usage
+CSHARP_FLAVOR_NOTES = {
+    "db2": """
+// DB2: map every EXEC SQL table to an entity and DbSet; DECLARE CURSOR / FETCH loops
+// become LINQ queries streamed with AsAsyncEnumerable(); SQLCODE checks become exceptions.
+""",
+    "ims": """
+// IMS DL/I: map each segment to an entity with a foreign key to its parent segment;
+// GU/GN/GNP calls become navigations over those relations, ISRT/REPL/DLET become Add/Update/Remove.
+""",
+    "sql": """
+// Database interface module CALLs: replace each call with a repository method on the DbContext.
+""",
+    "vsam_ksds": """
+// VSAM KSDS: one table per indexed file with the RECORD KEY as primary key and ALTERNATE
+// RECORD KEYs as indexes; START/READ NEXT become ordered range queries on the key.
+""",
+    "vsam_rrds": """
+// VSAM RRDS: one table per relative file keyed by the relative record number (RELATIVE KEY).
+""",
+    "vsam_esds": """
+// VSAM ESDS: an append-only table ordered by an identity column in place of the RBA.
+""",
+    "vsam": """
+// CICS file control: map each FILE to a keyed table; READ UPDATE/REWRITE pairs become
+// a load and SaveChangesAsync() in one transaction, STARTBR/READNEXT a keyed range query.
+""",
+    "sequential": """
+// Sequential files: read and write them as streams of records (or bulk-load them into a
+// staging table) rather than entities, preserving record order.
+""",
+}
+
+
+def get_db_template(target_language, flavors=()):
     """
     Returns the appropriate database setup template for the given target language.
     
     Args:
         target_language (str): The target programming language (e.g., "Java", "C#")
+        flavors: Data store flavors found by db_usage.detect_database_usage; the
+            template is followed by the mapping notes for each of them
         
     Returns:
         str: The template string for the specified language or empty string if not supported
@@ -327,5 +363,11 @@ def get_db_template(target_language):
     templates = {
         "C#": CSHARP_DB_SETUP_TEMPLATE
     }
+    notes = {
+        "C#": CSHARP_FLAVOR_NOTES
+    }
     
-    return templates.get(target_language, "")
\ No newline at end of file
+    template = templates.get(target_language, "")
+    if template:
+        template += "".join(notes[target_language].get(flavor, "") for flavor in flavors)
+    return template
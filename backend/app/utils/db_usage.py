@@ -1,5 +1,9 @@
-import re
 import logging
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+from .cobol_parser import AstNode, parse_cobol, EXEC, STATEMENT, FILE_DESCRIPTION, ENTRY, STATEMENT_VERBS
+from .cobol_tokenizer import iter_source_lines, detect_source_format, TEXT_END_COLUMN
+from .exec_blocks import tokenize_exec, command_details
+from .keyword_scanner import indicator_scanner, indicator_category
 
 
 # Configure logging
@@ -9,61 +13,237 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def detect_database_usage(source_code, source_language="COBOL"):
+# Database and file flavors, most significant first; db_type is the first one found
+DB2 = "db2"
+IMS = "ims"
+SQL = "sql"
+VSAM_KSDS = "vsam_ksds"
+VSAM_RRDS = "vsam_rrds"
+VSAM_ESDS = "vsam_esds"
+VSAM = "vsam"
+SEQUENTIAL = "sequential"
+FILE = "file"
+FLAVORS = (DB2, IMS, SQL, VSAM_KSDS, VSAM_RRDS, VSAM_ESDS, VSAM, SEQUENTIAL, FILE)
+
+# CALL targets that go through a database interface module
+DB_CALL_MARKERS = ("DB2", "SQL", "ORACLE", "DATABASE")
+# DL/I language interfaces of IMS
+IMS_CALL_TARGETS = frozenset(("CBLTDLI", "AIBTDLI", "AERTDLI", "CEETDLI", "PLITDLI", "ASMTDLI"))
+FILE_IO_VERBS = frozenset(("OPEN", "READ", "WRITE", "REWRITE", "START", "DELETE"))
+# EXEC CICS file control commands; their FILE is a VSAM data set defined to CICS
+CICS_FILE_COMMANDS = frozenset(("READ", "WRITE", "REWRITE", "DELETE", "STARTBR", "READNEXT", "READPREV",
+                                "RESETBR", "ENDBR", "UNLOCK"))
+_OPEN_MODES = frozenset(("INPUT", "OUTPUT", "I-O", "EXTEND", "WITH", "NO", "REWIND", "LOCK", "REVERSED", "SHARING",
+                         "ALL", "OTHER", "READ", "ONLY", "RETRY"))
+# A statement found by the scanner is re-parsed from its own lines only, never more than this many
+MAX_STATEMENT_LINES = 50
+# First words of a line that end the statement before it
+_STATEMENT_STARTS = STATEMENT_VERBS | {"EXEC", "AT", "NOT", "INVALID", "ON"}
+
+# Fields of a finding
+FINDING_FIELDS = ("flavor", "kind", "name", "file", "line")
+
+
+def _call_flavor(target: str) -> Optional[str]:
+    name = target.strip("'\"").upper()
+    if name in IMS_CALL_TARGETS:
+        return IMS
+    if name.startswith("DSN") or "DB2" in name:
+        return DB2
+    if any(marker in name for marker in DB_CALL_MARKERS):
+        return SQL
+    return None
+
+
+def _file_control_flavor(operands: List[str]) -> str:
+    """Flavor of a SELECT ... ASSIGN entry from its ORGANIZATION and ASSIGN name."""
+    if "INDEXED" in operands:
+        return VSAM_KSDS
+    if "RELATIVE" in operands:
+        return VSAM_RRDS
+    assign = operands.index("ASSIGN") + 1
+    while assign < len(operands) and operands[assign] in ("TO", "USING"):
+        assign += 1
+    # An AS- prefix on the DD name assigns a VSAM entry-sequenced data set
+    if assign < len(operands) and operands[assign].strip("'\"").upper().startswith("AS-"):
+        return VSAM_ESDS
+    return SEQUENTIAL
+
+
+def _iter_access_nodes(node: AstNode) -> Iterator[AstNode]:
+    for child in node.children:
+        if child.kind in (EXEC, STATEMENT, FILE_DESCRIPTION):
+            yield child
+        yield from _iter_access_nodes(child)
+
+
+def _collect_findings(sources: Iterable[Tuple[Optional[str], Iterable[AstNode]]]) -> List[Dict[str, Any]]:
+    """
+    Findings of every EXEC, CALL, file-control, FD and file I/O node.
+
+    File I/O statements take the flavor of the file they name, resolved
+    across all sources once every SELECT and FD has been seen.
+    """
+    findings: List[Dict[str, Any]] = []
+    file_flavors: Dict[str, str] = {}
+    record_files: Dict[str, str] = {}
+    # (finding, file name or None, record name or None) resolved after the walk
+    pending: List[Tuple[Dict[str, Any], Optional[str], Optional[str]]] = []
+
+    def add(flavor: str, kind: str, name: str, file: Optional[str], line: int) -> Dict[str, Any]:
+        finding = dict(zip(FINDING_FIELDS, (flavor, kind, name, file, line)))
+        findings.append(finding)
+        return finding
+
+    for file, roots in sources:
+        for root in roots:
+            for node in _iter_access_nodes(root):
+                if node.kind == EXEC:
+                    if node.name in ("SQL", "SQLIMS", "DLI"):
+                        add(DB2 if node.name == "SQL" else IMS, f"exec_{node.name.lower()}",
+                            node.operands[0] if node.operands else "", file, node.line)
+                    elif node.name == "CICS":
+                        verb, _, resources = command_details(tokenize_exec(node.operands), False)
+                        if verb in CICS_FILE_COMMANDS:
+                            for kind, name in resources:
+                                if kind == "file":
+                                    add(VSAM, "exec_cics", name, file, node.line)
+                elif node.kind == FILE_DESCRIPTION:
+                    if node.operands[:1] == ["FD"]:
+                        pending.append((add(FILE, "fd", node.name, file, node.line), node.name, None))
+                        for child in node.children:
+                            if child.kind == ENTRY:
+                                record_files[child.name] = node.name
+                elif node.name == "CALL" and node.operands:
+                    flavor = _call_flavor(node.operands[0])
+                    if flavor:
+                        add(flavor, "call", node.operands[0].strip("'\""), file, node.line)
+                elif node.name == "SELECT" and "ASSIGN" in node.operands:
+                    name = node.operands[1] if node.operands[0] == "OPTIONAL" else node.operands[0]
+                    file_flavors[name] = _file_control_flavor(node.operands)
+                    add(file_flavors[name], "select", name, file, node.line)
+                elif node.name in FILE_IO_VERBS and node.operands:
+                    if node.name == "OPEN":
+                        for name in node.operands:
+                            if name not in _OPEN_MODES:
+                                pending.append((add(FILE, "open", name, file, node.line), name, None))
+                    elif node.name in ("WRITE", "REWRITE"):
+                        record = node.operands[0]
+                        pending.append((add(FILE, node.name.lower(), record, file, node.line), None, record))
+                    else:
+                        name = node.operands[0]
+                        pending.append((add(FILE, node.name.lower(), name, file, node.line), name, None))
+
+    for finding, name, record in pending:
+        name = name or record_files.get(record)
+        finding["flavor"] = file_flavors.get(name, FILE)
+    return findings
+
+
+def _statement_end(source: str, start: int, fixed: bool, category: str) -> Tuple[int, int]:
+    """
+    End offset and line count of the statement whose first line starts at ``start``.
+
+    EXEC blocks run to END-EXEC, and other statements to the end of their
+    sentence or the next line that starts a statement or phrase of its own.
+    An FD runs on over its record entries, up to the next FD, section or
+    division. None runs past MAX_STATEMENT_LINES lines.
+    """
+    end = start
+    for count in range(1, MAX_STATEMENT_LINES + 1):
+        newline = source.find("\n", end)
+        line_end = newline if newline >= 0 else len(source)
+        code = source[end:line_end]
+        if fixed:
+            code = code[7:TEXT_END_COLUMN] if len(code) > 7 and code[6] not in "*/" else ""
+        code = code.strip().upper()
+        if count > 1:
+            if category == "fd":
+                stop = code.startswith(("FD ", "SD ")) or code.endswith(("SECTION.", "DIVISION."))
+            elif category == "exec":
+                stop = False
+            else:
+                first = code.split(None, 1)[0].rstrip(".") if code else ""
+                stop = first in _STATEMENT_STARTS or first.startswith("END-")
+            if stop:
+                return end, count - 1
+        end = line_end + 1
+        if newline < 0 or "END-EXEC" in code or (category != "fd" and code.endswith(".")):
+            return min(end, len(source)), count
+    return end, MAX_STATEMENT_LINES
+
+
+def _scan_statements(source: str) -> Iterator[AstNode]:
+    """
+    Parse just the statements around database and file indicators in raw source.
+
+    The shared indicator scanner finds the candidate lines; each candidate's
+    statement is re-parsed on its own, and indicators inside an already
+    parsed statement are skipped, so no line is parsed twice.
+    """
+    source_format = detect_source_format(source[:8192].splitlines())
+    fixed = source_format == "fixed"
+    parsed_through = 0
+    for keyword, offset, line, column in indicator_scanner().finditer(source, fixed_comments=True):
+        category = indicator_category(keyword)
+        if line <= parsed_through or category not in ("exec", "call", "select", "fd", "file_io"):
+            continue
+        start = offset - column + 1
+        if keyword == "EXEC CICS":
+            # Only file control commands matter; most commands are named on the EXEC line itself
+            line_end = source.find("\n", offset)
+            line_end = len(source) if line_end < 0 else line_end
+            if fixed:
+                line_end = min(line_end, start + TEXT_END_COLUMN)
+            command = source[offset + len(keyword):line_end].split(None, 1)
+            if command and command[0].split("(", 1)[0].upper() not in CICS_FILE_COMMANDS:
+                continue
+        end, count = _statement_end(source, start, fixed, category)
+        parsed_through = line + count - 1
+        yield parse_cobol(iter_source_lines(source[start:end].splitlines(), source_format, line))
+
+
+def detect_database_usage(source_code: Union[str, Mapping[str, str]], source_language="COBOL",
+                          ast: Union[AstNode, Iterable[AstNode], Mapping[str, AstNode], None] = None):
     """
     Detect if source code contains database operations or embedded SQL.
-    
+
+    COBOL sources are checked statement by statement: EXEC SQL/SQLIMS/DLI
+    blocks, EXEC CICS file control, CALLs to DB2, DL/I and other database
+    interface modules, SELECT ... ASSIGN file control entries, FD entries and
+    file I/O statements. Each finding carries its flavor: DB2, IMS, other SQL,
+    VSAM KSDS/RRDS/ESDS (or VSAM of unknown organization through CICS),
+    sequential, or a file whose organization is not in the sources.
+
     Args:
-        source_code (str): The source code to analyze
+        source_code: The source code to analyze, or a mapping of file name to source
         source_language (str): The programming language of the source code
-        
+        ast: Already parsed AST(s) of the source, e.g. the mapping of file to
+            AST from cobol_parser.load_project_ast; without one, only the
+            statements the keyword scanner points at are parsed
+
     Returns:
-        dict: Dictionary with 'has_db' (bool) and 'db_type' (str) keys
+        dict: 'has_db' (bool), 'db_type' (the most significant flavor found or
+        'none'), 'flavors' (flavors found, most significant first) and
+        'findings' ({flavor, kind, name, file, line} per finding)
     """
     # Initialize default response
-    result = {"has_db": False, "db_type": "none"}
-    
-    # For COBOL, check for common database-related keywords and statements
+    result = {"has_db": False, "db_type": "none", "flavors": [], "findings": []}
+
     if source_language.upper() == "COBOL":
-        # Check for embedded SQL
-        sql_patterns = [
-            r'EXEC\s+SQL',
-            r'SELECT\s+.*\s+FROM',
-            r'INSERT\s+INTO',
-            r'UPDATE\s+.*\s+SET',
-            r'DELETE\s+FROM',
-            r'CURSOR',
-            r'DECLARE\s+.*\s+TABLE',
-            r'FETCH',
-            
-            # Check for common COBOL database access methods
-            r'CALL\s+.*DB2',
-            r'CALL\s+.*SQL',
-            r'CALL\s+.*ORACLE',
-            r'CALL\s+.*DATABASE',
-            r'OPEN\s+.*INPUT',
-            r'OPEN\s+.*OUTPUT',
-            r'OPEN\s+.*I-O',
-            r'READ\s+.*FILE',
-            r'WRITE\s+.*RECORD',
-            r'START\s+.*KEY',
-            
-            # Data division entries that might indicate file/DB operations
-            r'FD\s+',
-            r'SELECT\s+.*ASSIGN\s+TO',
-            r'ORGANIZATION\s+IS\s+INDEXED',
-            r'ORGANIZATION\s+IS\s+RELATIVE',
-            r'ACCESS\s+MODE\s+IS\s+DYNAMIC',
-            r'ACCESS\s+MODE\s+IS\s+RANDOM',
-            r'RECORD\s+KEY'
-        ]
-        
-        # Look for any of the patterns in the source code
-        for pattern in sql_patterns:
-            if re.search(pattern, source_code, re.IGNORECASE):
-                logger.info(f"Database usage detected with pattern: {pattern}")
-                result["has_db"] = True
-                result["db_type"] = "sql"  # Default to SQL; can be extended to detect specific DBs
-                return result
-                
-    return result
\ No newline at end of file
+        if ast is None:
+            sources = source_code.items() if isinstance(source_code, Mapping) else [(None, source_code)]
+            findings = _collect_findings((file, _scan_statements(text)) for file, text in sources)
+        elif isinstance(ast, Mapping):
+            findings = _collect_findings((file, [root]) for file, root in ast.items())
+        else:
+            findings = _collect_findings([(None, [ast] if isinstance(ast, AstNode) else ast)])
+        if findings:
+            found = {finding["flavor"] for finding in findings}
+            result["has_db"] = True
+            result["flavors"] = [flavor for flavor in FLAVORS if flavor in found]
+            result["db_type"] = result["flavors"][0]
+            result["findings"] = findings
+            logger.info(f"Database usage detected: {len(findings)} findings, flavors {', '.join(result['flavors'])}")
+
+    return result
@@ -0,0 +1,137 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from ..config import (
+    logger, EMBED_BATCH_SIZE, EMBED_CONCURRENCY, EMBED_MAX_RETRIES, EMBED_REQUESTS_PER_MINUTE, EMBED_TOKENS_PER_MINUTE
+)
+
+# Rough token count of a text for the per-minute token limit; embedding models average about 4 characters a token
+CHARS_PER_TOKEN = 4
+# Backoff after the n-th failure of a batch: BACKOFF_BASE * 2 ** n seconds, jittered, at most BACKOFF_MAX
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# HTTP statuses that no retry can fix
+_FATAL_STATUSES = frozenset((400, 401, 403, 404, 422))
+
+
+class _RateLimiter:
+    """
+    Spaces requests out so neither per-minute limit is exceeded.
+
+    Each request reserves the next free slot, which lasts for the request's
+    share of the request and token budgets; a rate-limited response pauses
+    every worker.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self._lock = threading.Lock()
+        self._request_interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._seconds_per_token = 60.0 / tokens_per_minute if tokens_per_minute > 0 else 0.0
+        self._next = time.monotonic()
+
+    def acquire(self, tokens: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + max(self._request_interval, tokens * self._seconds_per_token)
+        if start > now:
+            time.sleep(start - now)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked to wait (Retry-After) before the next request, if it did."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def embed_texts(client, texts: Sequence[str], batch_size: Optional[int] = None, concurrency: Optional[int] = None,
+                max_retries: Optional[int] = None, requests_per_minute: Optional[int] = None,
+                tokens_per_minute: Optional[int] = None) -> Tuple[List[List[float]], Dict[str, Any]]:
+    """
+    Embed many texts in batches, with a bounded number of requests in flight.
+
+    Texts are sent ``batch_size`` at a time through ``client.embed_documents``
+    from ``concurrency`` worker threads, paced to the per-minute request and
+    token limits. A failed batch is retried on its own with exponential
+    backoff (or after the server's Retry-After, which also holds back the
+    other workers); the batches that succeeded are kept. Errors no retry can
+    fix (bad request, authentication) fail at once.
+
+    Args:
+        client: A langchain Embeddings object, e.g. rag_indexer.embedding_client
+        texts: Texts to embed
+        batch_size, concurrency, max_retries, requests_per_minute,
+            tokens_per_minute: Default to the EMBED_* settings of config
+
+    Returns:
+        (one vector per text, in order; stats: chunks, batches, retries,
+        seconds and chunks_per_second)
+
+    Raises:
+        RuntimeError: A batch still failed after max_retries retries
+    """
+    batch_size = max(1, batch_size or EMBED_BATCH_SIZE)
+    concurrency = max(1, concurrency or EMBED_CONCURRENCY)
+    max_retries = EMBED_MAX_RETRIES if max_retries is None else max_retries
+    limiter = _RateLimiter(EMBED_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute,
+                           EMBED_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute)
+    starts = range(0, len(texts), batch_size)
+    stats = {"chunks": len(texts), "batches": len(starts), "retries": 0, "seconds": 0.0, "chunks_per_second": 0.0}
+    stats_lock = threading.Lock()
+
+    def embed_batch(start: int) -> Tuple[int, List[List[float]]]:
+        batch = list(texts[start:start + batch_size])
+        tokens = sum(len(text) // CHARS_PER_TOKEN + 1 for text in batch)
+        for attempt in range(max_retries + 1):
+            limiter.acquire(tokens)
+            try:
+                vectors = client.embed_documents(batch)
+                if len(vectors) != len(batch):
+                    raise ValueError(f"{len(vectors)} embeddings returned for {len(batch)} texts")
+                return start, vectors
+            except Exception as e:
+                if attempt == max_retries or getattr(e, "status_code", None) in _FATAL_STATUSES:
+                    raise RuntimeError(f"Embedding batch at chunk {start} failed after {attempt + 1} attempts: {e}") from e
+                delay = _retry_after(e)
+                if delay is not None:
+                    limiter.pause(delay)
+                else:
+                    time.sleep(min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random() / 2))
+                with stats_lock:
+                    stats["retries"] += 1
+                logger.warning(f"Embedding batch at chunk {start} failed (attempt {attempt + 1}), retrying: {e}")
+
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+    started = time.perf_counter()
+    done = 0
+    reported = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(embed_batch, start) for start in starts]
+        try:
+            for future in as_completed(futures):
+                start, batch_vectors = future.result()
+                vectors[start:start + len(batch_vectors)] = batch_vectors
+                done += len(batch_vectors)
+                # Progress every tenth of the chunks
+                if done * 10 // len(texts) > reported:
+                    reported = done * 10 // len(texts)
+                    elapsed = time.perf_counter() - started
+                    logger.info(f"Embedded {done}/{len(texts)} chunks ({done / elapsed if elapsed else 0:.1f} chunks/s)")
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["chunks_per_second"] = round(len(texts) / stats["seconds"], 1) if stats["seconds"] else 0.0
+    logger.info(f"Embedding finished: {stats}")
+    return vectors, stats
@@ -0,0 +1,196 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from ..config import logger, output_dir, EMBED_CACHE_MAX_MB
+from .embedding import embed_texts
+
+# One cache for all projects, so a standards document shared between projects is embedded once
+EMBEDDING_CACHE_FILE = "embedding_cache.db"
+# Bump whenever the key, the vector encoding or the schema below changes
+CACHE_SCHEMA_VERSION = 2
+# Keys looked up per query, below SQLite's bound-parameter limit
+LOOKUP_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (
+    key BLOB PRIMARY KEY,
+    vector BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage (
+    key BLOB PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS usage_by_last_used ON usage (last_used);
+"""
+
+_local = threading.local()
+
+
+def cache_path() -> Path:
+    return Path(output_dir) / "rag" / EMBEDDING_CACHE_FILE
+
+
+def connect() -> sqlite3.Connection:
+    """Return this thread's connection to the embedding cache, creating the schema on first use."""
+    path = cache_path()
+    connection = getattr(_local, "connection", None)
+    if connection is not None and _local.path == path:
+        return connection
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+    connection = sqlite3.connect(str(path), timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    (version,) = connection.execute("PRAGMA user_version").fetchone()
+    if version != CACHE_SCHEMA_VERSION:
+        if version:
+            logger.info(f"Embedding cache {path} has schema {version}, recreating it")
+            with connection:
+                for table in ("vectors", "usage"):
+                    connection.execute(f"DROP TABLE IF EXISTS {table}")
+        with connection:
+            connection.executescript(_SCHEMA)
+            connection.execute(f"PRAGMA user_version={CACHE_SCHEMA_VERSION}")
+    _local.connection, _local.path = connection, path
+    return connection
+
+
+def cache_key(model: str, deployment: Optional[str], dimensions: Optional[int], text: str) -> bytes:
+    """
+    SHA-256 of the model, the Azure deployment, the requested dimensions and the text.
+
+    The same text embedded any other way is another entry. On Azure the
+    deployment, not the client's model setting, selects the model that runs.
+    """
+    key = f"{model}\0{deployment or ''}\0{dimensions or ''}\0{text}"
+    return hashlib.sha256(key.encode("utf-8", "surrogatepass")).digest()
+
+
+def load_embeddings(keys: Iterable[bytes]) -> Dict[bytes, Sequence[float]]:
+    """
+    Cached vectors of the given keys, marking them as just used.
+
+    Vectors come back as float32 arrays rather than lists: FAISS converts
+    them to a float32 matrix in one copy, and a list would hold a Python
+    float object per dimension (3072 of them for text-embedding-3-large).
+
+    Returns:
+        Key -> vector for the keys that are cached
+    """
+    keys = list(dict.fromkeys(keys))
+    found: Dict[bytes, Sequence[float]] = {}
+    connection = connect()
+    for start in range(0, len(keys), LOOKUP_BATCH):
+        batch = keys[start:start + LOOKUP_BATCH]
+        rows = connection.execute(
+            f"SELECT key, vector FROM vectors WHERE key IN ({', '.join('?' * len(batch))})", batch)
+        for key, blob in rows:
+            vector = array("f")
+            vector.frombytes(blob)
+            found[key] = vector
+    if found:
+        now = time.time()
+        with connection:
+            # Recency lives apart from the vectors, so marking a hit does not rewrite its vector
+            connection.executemany("UPDATE usage SET last_used = ? WHERE key = ?", ((now, key) for key in found))
+    return found
+
+
+def save_embeddings(entries: Iterable[Tuple[bytes, Sequence[float]]], max_bytes: Optional[int] = None) -> int:
+    """
+    Add vectors to the cache and evict the least recently used ones beyond the size bound.
+
+    Vectors are stored as float32, the precision the FAISS index keeps them in.
+
+    Args:
+        entries: (cache_key, vector) pairs
+        max_bytes: Size bound of the cache; defaults to EMBED_CACHE_MAX_MB
+
+    Returns:
+        int: Number of entries evicted
+    """
+    max_bytes = EMBED_CACHE_MAX_MB << 20 if max_bytes is None else max_bytes
+    now = time.time()
+    rows = []
+    for key, vector in entries:
+        blob = array("f", vector).tobytes()
+        rows.append((key, blob, len(key) + len(blob), now))
+    connection = connect()
+    with connection:
+        connection.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?)", ((key, blob) for key, blob, _, _ in rows))
+        connection.executemany("INSERT OR REPLACE INTO usage VALUES (?, ?, ?)",
+                               ((key, size, used) for key, _, size, used in rows))
+        (total,) = connection.execute("SELECT total(size) FROM usage").fetchone()
+        excess = int(total) - max_bytes
+        if excess <= 0:
+            return 0
+        victims = []
+        for key, size in connection.execute("SELECT key, size FROM usage ORDER BY last_used"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany("DELETE FROM vectors WHERE key = ?", victims)
+        connection.executemany("DELETE FROM usage WHERE key = ?", victims)
+    logger.info(f"Evicted {len(victims)} least recently used embeddings from the cache")
+    return len(victims)
+
+
+def embed_texts_cached(client, texts: Sequence[str], before_embedding=None, **embed_options) -> Tuple[List[Sequence[float]], Dict[str, Any]]:
+    """
+    embed_texts in front of the on-disk embedding cache.
+
+    Each text is looked up by cache_key of the client's model, deployment and
+    dimensions; only texts that are not cached are sent, each distinct text
+    once, and their vectors are added to the cache. Re-indexing unchanged
+    content makes no embedding calls at all.
+
+    Args:
+        client: A langchain Embeddings object, e.g. rag_indexer.embedding_client
+        texts: Texts to embed
+        before_embedding: Called once before any text is sent, e.g. to check the service is up
+        embed_options: Passed on to embed_texts
+
+    Returns:
+        (one vector per text, in order, cached ones as float32 arrays; the stats of embed_texts for the texts
+        that were sent, plus cache_hits, cache_misses and cache_hit_ratio
+        counted per text)
+    """
+    if EMBED_CACHE_MAX_MB <= 0:
+        keys, found = None, {}
+        missing = list(dict.fromkeys(texts))
+    else:
+        model = getattr(client, "model", None) or type(client).__name__
+        deployment = getattr(client, "deployment", None)
+        keys = [cache_key(model, deployment, getattr(client, "dimensions", None), text) for text in texts]
+        found = load_embeddings(keys)
+        missing = list(dict.fromkeys(text for key, text in zip(keys, texts) if key not in found))
+
+    embedded: Dict[str, List[float]] = {}
+    if missing:
+        if before_embedding is not None:
+            before_embedding()
+        new_vectors, stats = embed_texts(client, missing, **embed_options)
+        embedded = dict(zip(missing, new_vectors))
+        if keys is not None:
+            save_embeddings({key: embedded[text] for key, text in zip(keys, texts) if key not in found}.items())
+    else:
+        stats = {"chunks": 0, "batches": 0, "retries": 0, "seconds": 0.0, "chunks_per_second": 0.0}
+
+    if keys is None:
+        vectors = [embedded[text] for text in texts]
+    else:
+        vectors = [found[key] if key in found else embedded[text] for key, text in zip(keys, texts)]
+    hits = 0 if keys is None else sum(key in found for key in keys)
+    stats.update({
+        "cache_hits": hits,
+        "cache_misses": len(texts) - hits,
+        "cache_hit_ratio": round(hits / len(texts), 4) if texts else 0.0,
+    })
+    logger.info(f"Embedding cache: {hits}/{len(texts)} chunks cached ({stats['cache_hit_ratio']:.1%})")
+    return vectors, stats
@@ -0,0 +1,198 @@
+import re
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+from .cobol_parser import AstNode, EXEC, DIVISION, SECTION, PARAGRAPH
+from .symbol_index import _byte_offset
+
+# Fields of an exec block record, see extract_exec_blocks
+BLOCK_FIELDS = ("kind", "verb", "paragraph", "line", "end_line", "start", "end",
+                "tables", "cursors", "host_variables", "resources")
+
+# Block operands are re-lexed from their text: the COBOL tokenizer keeps
+# INTO(WS-REC) or C.ID=O.CID together, which SQL and CICS options need apart
+_TOKEN = re.compile(r"""
+    '(?:[^']|'')*'? | "(?:[^"]|"")*"?        # literals
+  | :[\w$#@-]+(?:\.[\w$#@-]+)*               # host variable; :VALUE:INDICATOR lexes as two
+  | [\w$#@][\w$#@-]*(?:\.[\w$#@][\w$#@-]*)*  # names, qualified names and numbers
+  | [^\s\w]                                  # punctuation
+""", re.VERBOSE)
+
+# Words that end a FROM/JOIN table list or can never be a table or alias
+_SQL_KEYWORDS = frozenset((
+    "AND", "AS", "BY", "CROSS", "CURRENT", "ELSE", "END", "EXCEPT", "FETCH", "FOR", "FROM", "FULL", "GROUP",
+    "HAVING", "INNER", "INTERSECT", "INTO", "JOIN", "LEFT", "LIMIT", "NATURAL", "NOT", "OFFSET", "ON",
+    "OPTIMIZE", "OR", "ORDER", "OUTER", "QUERYNO", "RIGHT", "SELECT", "SET", "THEN", "UNION", "USING",
+    "VALUES", "WHEN", "WHERE", "WITH",
+))
+# Keywords that keep a FROM clause open (joins and their conditions)
+_FROM_CLAUSE = frozenset(("AS", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "OUTER", "CROSS", "NATURAL",
+                          "ON", "AND", "OR", "NOT", "FROM", "USING"))
+# Cursor positioning words between FETCH and the cursor name
+_FETCH_ORIENTATION = frozenset((
+    "NEXT", "PRIOR", "FIRST", "LAST", "CURRENT", "BEFORE", "AFTER", "ABSOLUTE", "RELATIVE", "FROM",
+    "ROWSET", "STARTING", "AT", "SENSITIVE", "INSENSITIVE", "WITH", "CONTINUE",
+))
+# CICS commands whose second word is part of the command rather than an option
+_CICS_COMMANDS = frozenset((
+    ("SEND", "MAP"), ("SEND", "TEXT"), ("SEND", "CONTROL"), ("SEND", "PAGE"), ("RECEIVE", "MAP"),
+    ("HANDLE", "CONDITION"), ("HANDLE", "AID"), ("HANDLE", "ABEND"), ("IGNORE", "CONDITION"),
+    ("READQ", "TS"), ("READQ", "TD"), ("WRITEQ", "TS"), ("WRITEQ", "TD"), ("DELETEQ", "TS"),
+    ("DELETEQ", "TD"), ("SYNCPOINT", "ROLLBACK"), ("PUT", "CONTAINER"), ("GET", "CONTAINER"),
+))
+# CICS and DL/I options that name a resource, and the resource type they name
+RESOURCE_OPTIONS = {
+    "FILE": "file", "DATASET": "file", "PROGRAM": "program", "MAP": "map", "MAPSET": "mapset",
+    "QUEUE": "queue", "QNAME": "queue", "TRANSID": "transaction", "TERMID": "terminal",
+    "SYSID": "system", "CHANNEL": "channel", "CONTAINER": "container", "SEGMENT": "segment", "PSB": "psb",
+}
+
+
+def tokenize_exec(operands: List[str]) -> List[str]:
+    """Tokens of an EXEC block's operands: literals, host variables, names and punctuation."""
+    return _TOKEN.findall(" ".join(operands))
+
+
+def _is_name(token: str) -> bool:
+    return token[0].isalpha() or token[0] in "$#@"
+
+
+def _unique(values: List[str]) -> List[str]:
+    return list(dict.fromkeys(values))
+
+
+def _sql_details(tokens: List[str]) -> Tuple[str, List[str], List[str], List[str], List[List[str]]]:
+    """Verb, tables, cursors, host variables and included members of one EXEC SQL block."""
+    verb = tokens[0] if tokens else "UNKNOWN"
+    tables, cursors, resources = [], [], []
+    host_variables = [token[1:] for token in tokens if token[0] == ":"]
+    if verb == "DECLARE" and len(tokens) > 2 and tokens[2] in ("CURSOR", "TABLE"):
+        verb = f"DECLARE {tokens[2]}"
+        (cursors if tokens[2] == "CURSOR" else tables).append(tokens[1])
+    elif verb in ("OPEN", "CLOSE") and len(tokens) > 1:
+        cursors.append(tokens[1])
+    elif verb == "FETCH":
+        for token in tokens[1:]:
+            if token == "INTO":
+                break
+            if _is_name(token) and token not in _FETCH_ORIENTATION:
+                cursors.append(token)
+    elif verb == "INCLUDE" and len(tokens) > 1:
+        resources.append(["member", tokens[1]])
+
+    # One entry per open parenthesis: [opened by a subquery, inside its FROM clause].
+    # Other parentheses are function calls such as EXTRACT(YEAR FROM ...)
+    levels = [[True, False]]
+    count = len(tokens)
+    for index, token in enumerate(tokens):
+        following = tokens[index + 1] if index + 1 < count else ""
+        level = levels[-1]
+        if token == "(":
+            levels.append([following in ("SELECT", "WITH"), False])
+            continue
+        if token == ")":
+            if len(levels) > 1:
+                levels.pop()
+            continue
+        if token == "CURRENT" and following == "OF" and index + 2 < count:
+            cursors.append(tokens[index + 2])
+        if token == "FROM" and level[0] and verb != "FETCH":
+            level[1] = True
+        elif token in _SQL_KEYWORDS and token not in _FROM_CLAUSE:
+            level[1] = False
+        # The name after FROM, JOIN or a comma of the FROM clause, INSERT/MERGE INTO,
+        # UPDATE and LOCK/TRUNCATE TABLE is a table
+        if ((token in ("FROM", "JOIN", ",") and level[1])
+                or (token == "INTO" and verb in ("INSERT", "MERGE"))
+                or (token == "UPDATE" and index == 0)
+                or (token == "TABLE" and verb in ("LOCK", "TRUNCATE"))):
+            if _is_name(following) and following not in _SQL_KEYWORDS:
+                tables.append(following)
+    return verb, _unique(tables), _unique(cursors), _unique(host_variables), resources
+
+
+def command_details(tokens: List[str], dli: bool) -> Tuple[str, List[str], List[List[str]]]:
+    """Command, data names and named resources of one EXEC CICS or EXEC DLI block."""
+    if not tokens:
+        return "UNKNOWN", [], []
+    verb, position = tokens[0], 1
+    if len(tokens) > 1 and (tokens[0], tokens[1]) in _CICS_COMMANDS:
+        verb, position = f"{tokens[0]} {tokens[1]}", 2
+    host_variables, resources = [], []
+    count = len(tokens)
+    while position < count:
+        option = tokens[position]
+        position += 1
+        if position >= count or tokens[position] != "(":
+            continue
+        # The option's argument runs to the matching parenthesis
+        depth, start = 1, position + 1
+        position += 1
+        while position < count and depth:
+            depth += {"(": 1, ")": -1}.get(tokens[position], 0)
+            position += 1
+        argument = tokens[start:position - 1 if not depth else position]
+        if option in RESOURCE_OPTIONS and argument:
+            value = argument[0]
+            resources.append([RESOURCE_OPTIONS[option], value[1:-1] if value[0] in "'\"" else value])
+            # Quoted names are constants, and so are DL/I segment and PSB names
+            if value[0] in "'\"" or dli:
+                continue
+        for index, token in enumerate(argument):
+            # LENGTH OF X and ADDRESS OF X name X; DL/I WHERE(FIELD = X) compares a segment field
+            if token in ("LENGTH", "ADDRESS") and index + 1 < len(argument) and argument[index + 1] == "OF":
+                continue
+            if option == "WHERE" and index == 0:
+                continue
+            if _is_name(token) and token != "OF":
+                host_variables.append(token[1:] if token[0] == ":" else token)
+    return verb, _unique(host_variables), resources
+
+
+def exec_block_record(node: AstNode, paragraph: Optional[str], offsets: array) -> List[Any]:
+    """One EXEC node as an exec block record (see extract_exec_blocks)."""
+    tokens = tokenize_exec(node.operands)
+    if node.name in ("SQL", "SQLIMS"):
+        verb, tables, cursors, host_variables, resources = _sql_details(tokens)
+    else:
+        verb, host_variables, resources = command_details(tokens, node.name == "DLI")
+        tables, cursors = [], []
+    return [node.name, verb, paragraph, node.line, node.end_line,
+            _byte_offset(offsets, node.line, node.column), _byte_offset(offsets, node.end_line, node.end_column),
+            tables, cursors, host_variables, resources]
+
+
+def extract_exec_blocks(ast: AstNode, offsets: array) -> List[List[Any]]:
+    """
+    Collect the complete EXEC SQL, CICS and DLI blocks of one member.
+
+    Args:
+        ast: Member AST from cobol_parser.parse_cobol, whose EXEC nodes span
+            EXEC to END-EXEC across lines
+        offsets: Record byte offsets from source_reader.record_offsets
+
+    Returns:
+        [kind, verb, paragraph, line, end line, start byte, end byte, tables,
+        cursors, host variables, resources] per block in source order (see
+        BLOCK_FIELDS). ``paragraph`` is the enclosing paragraph or section,
+        None outside the procedure division; ``resources`` holds [type,
+        name] pairs for CICS/DLI resource options (file, program, map,
+        queue, ...) and SQL INCLUDE members.
+    """
+    blocks = []
+
+    def visit(node: AstNode, paragraph: Optional[str], procedure: bool) -> None:
+        for child in node.children:
+            if child.kind == EXEC:
+                blocks.append(exec_block_record(child, paragraph, offsets))
+            elif child.kind == DIVISION:
+                visit(child, None, child.name == "PROCEDURE")
+            else:
+                visit(child, child.name if procedure and child.kind in (SECTION, PARAGRAPH) else paragraph, procedure)
+
+    # Copybooks without division headers may hold procedure code
+    visit(ast, None, True)
+    return blocks
+
+
+def exec_block_to_dict(record: List[Any]) -> Dict[str, Any]:
+    return dict(zip(BLOCK_FIELDS, record))
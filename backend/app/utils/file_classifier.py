@@ -1,17 +1,70 @@
 import os
 import logging
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, Iterable, List, Any, Mapping, Optional
 from ..config import logger
+from .source_reader import count_lines
+from .keyword_scanner import indicator_scanner, indicator_category
+
+# Type-to-extension mappings; an extension claimed by several types is settled by content
+TYPE_EXTENSIONS = {
+    "COBOL Code": [".cob", ".cbl", ".cobol", ".pco", ".ccp"],
+    "JCL": [".jcl", ".job", ".cntl", ".ctl"],
+    "Copybooks": [".cpy", ".copybook", ".cblcpy", ".inc"],
+    "VSAM Definitions": [".ctl", ".cntl", ".def", ".vsam"],
+    "BMS Maps": [".bms", ".map"],
+    "Control Files": [".ctl", ".cfg", ".conf"],
+    "Standards Documents": [".pdf", ".docx", ".pptx", ".txt", ".md"]
+}
+# Content sniffing reads at most this many characters of a file, cut back to a line end
+SNIFF_CHARS = 4096
+# Content indicator categories in order of precedence, and the type each one means
+_CONTENT_TYPES = (("cobol", "COBOL Code"), ("jcl", "JCL"), ("copybook", "Copybooks"), ("bms", "BMS Maps"),
+                  ("vsam", "VSAM Definitions"))
+
+# Normalize extensions for quick lookup; the last type listing an extension is its fallback
+_EXT_TO_TYPE = {ext: type_name for type_name, exts in TYPE_EXTENSIONS.items() for ext in exts}
+AMBIGUOUS_EXTENSIONS = frozenset(
+    ext for ext in _EXT_TO_TYPE if sum(ext in exts for exts in TYPE_EXTENSIONS.values()) > 1)
+
+
+def _sniff_prefix(content: str) -> str:
+    """The first SNIFF_CHARS characters of ``content``, without a partial last line."""
+    if len(content) <= SNIFF_CHARS:
+        return content
+    cut = content.rfind("\n", 0, SNIFF_CHARS)
+    return content[:cut + 1] if cut >= 0 else content[:SNIFF_CHARS]
+
+
+def type_for_extension(ext: str) -> Optional[str]:
+    """The file type an extension (with its dot) stands for, or None for an unknown one; see AMBIGUOUS_EXTENSIONS."""
+    return _EXT_TO_TYPE.get(ext.lower())
+
+
+def type_from_indicators(keywords: Iterable[str]) -> Optional[str]:
+    """The file type of the highest-precedence content indicator category among ``keywords``, or None."""
+    found = {indicator_category(keyword) for keyword in keywords}
+    for category, file_type in _CONTENT_TYPES:
+        if category in found:
+            return file_type
+    return None
+
 
 def classify_uploaded_files(file_json):
     """
     Enhanced file classification that handles both file uploads and content
     
+    Files are classified by extension. Files without a known extension, or
+    with one several types share (.ctl, .cntl), are classified by the first
+    SNIFF_CHARS characters of their content, all sniffed together in a few
+    batched scans. Each record refers to the uploaded content string rather
+    than a copy of it.
+    
     Args:
         file_json: Can be either:
             - Dict of filename -> content (string)
             - Dict of file objects with fileName and content
+            - A source_registry.SourceRegistry
     
     Returns:
         Classified files dictionary
@@ -21,72 +74,48 @@ def classify_uploaded_files(file_json):
     # Normalize input data
     normalized_files = {}
     
-    if isinstance(file_json, dict):
+    if isinstance(file_json, Mapping):
         for key, value in file_json.items():
             if isinstance(value, dict) and "fileName" in value:
                 # Format from current project
-                filename = value["fileName"]
-                content = value.get("content", "")
-                normalized_files[filename] = content
+                normalized_files[value["fileName"]] = value.get("content", "")
             else:
                 # Direct filename -> content format
                 normalized_files[key] = value
     
     logger.info(f"Number of files to classify: {len(normalized_files)}")
     
-    # Enhanced type-to-extension mappings
-    type_extensions = {
-        "COBOL Code": [".cob", ".cbl", ".cobol", ".pco", ".ccp"],
-        "JCL": [".jcl", ".job", ".cntl", ".ctl"],
-        "Copybooks": [".cpy", ".copybook", ".cblcpy", ".inc"],
-        "VSAM Definitions": [".ctl", ".cntl", ".def", ".vsam"],
-        "BMS Maps": [".bms", ".map"],
-        "Control Files": [".ctl", ".cfg", ".conf"],
-        "Standards Documents": [".pdf", ".docx", ".pptx", ".txt", ".md"]
-    }
-
-    # Normalize extensions for quick lookup
-    ext_to_type = {}
-    for type_name, exts in type_extensions.items():
-        for ext in exts:
-            ext_to_type[ext.lower()] = type_name
-
     # Prepare result dictionary
-    classified = {
-        "COBOL Code": [],
-        "JCL": [],
-        "Copybooks": [],
-        "VSAM Definitions": [],
-        "BMS Maps": [],
-        "Control Files": [],
-        "Standards Documents": [],
-        "Unknown": []
-    }
-
-    # Classify files
+    classified = {file_type: [] for file_type in TYPE_EXTENSIONS}
+    classified["Unknown"] = []
+    
+    records = []
+    sniffed = []
     for filename, content in normalized_files.items():
         file_ext = Path(filename).suffix.lower()
-        matched_type = ext_to_type.get(file_ext, None)
-        
-        # Content-based classification if extension doesn't match
-        if not matched_type:
-            matched_type = _classify_by_content(filename, content)
-        
+        text = content if isinstance(content, str) else str(content)
         file_info = {
             "fileName": filename,
             "content": content,
-            "size": len(content) if isinstance(content, str) else len(str(content)),
+            "size": len(text),
             "extension": file_ext,
-            "lines": len(str(content).split('\n'))
+            "lines": count_lines(text)
         }
-        
-        if matched_type and matched_type in classified:
-            classified[matched_type].append(file_info)
-            logger.info(f"Classified '{filename}' as '{matched_type}'")
-        else:
-            classified["Unknown"].append(file_info)
-            logger.info(f"Could not classify '{filename}' - marked as Unknown")
-
+        records.append((file_info, _EXT_TO_TYPE.get(file_ext)))
+        if content and isinstance(content, str) and (file_ext in AMBIGUOUS_EXTENSIONS or file_ext not in _EXT_TO_TYPE):
+            sniffed.append(len(records) - 1)
+    
+    # Content-based classification where the extension does not settle it
+    matched_types = [matched_type for _, matched_type in records]
+    found = indicator_scanner().found_in_parts(
+        (_sniff_prefix(records[index][0]["content"]) for index in sniffed), fixed_comments=True)
+    for index, keywords in zip(sniffed, found):
+        matched_types[index] = type_from_indicators(keywords) or matched_types[index]
+    
+    for (file_info, _), matched_type in zip(records, matched_types):
+        classified[matched_type or "Unknown"].append(file_info)
+        logger.debug(f"Classified '{file_info['fileName']}' as '{matched_type or 'Unknown'}'")
+    
     # Log classification summary
     for file_type, files in classified.items():
         if files:
@@ -95,12 +124,15 @@ def classify_uploaded_files(file_json):
     logger.info("=== FILE CLASSIFICATION COMPLETED ===")
     return classified
 
-def _classify_by_content(filename: str, content: str) -> str:
+def classify_content(content: str) -> Optional[str]:
     """
     Classify file by analyzing its content
     
+    One scan of the first SNIFF_CHARS characters finds every indicator;
+    COBOL division headers, PROGRAM-ID or WORKING-STORAGE win over JCL, JCL over copybook PIC
+    clauses, those over BMS macros and those over IDCAMS DEFINEs.
+    
     Args:
-        filename: Name of the file
         content: File content as string
         
     Returns:
@@ -109,34 +141,7 @@ def _classify_by_content(filename: str, content: str) -> str:
     if not content or not isinstance(content, str):
         return None
     
-    content_upper = content.upper()
-    
-    # COBOL indicators
-    if any(keyword in content_upper for keyword in [
-        "IDENTIFICATION DIVISION", "PROGRAM-ID", "DATA DIVISION", 
-        "PROCEDURE DIVISION", "WORKING-STORAGE"
-    ]):
-        return "COBOL Code"
-    
-    # JCL indicators
-    if any(keyword in content_upper for keyword in [
-        "//", "JOB ", "EXEC PGM=", "DD DSN="
-    ]):
-        return "JCL"
-    
-    # Copybook indicators (data structures without divisions)
-    if any(keyword in content_upper for keyword in [
-        "01 ", "05 ", "PIC ", "PICTURE"
-    ]) and "PROCEDURE DIVISION" not in content_upper:
-        return "Copybooks"
-    
-    # BMS indicators
-    if any(keyword in content_upper for keyword in [
-        "DFHMSD", "DFHMDI", "DFHMDF"
-    ]):
-        return "BMS Maps"
-    
-    return None
+    return type_from_indicators(indicator_scanner().found(_sniff_prefix(content), fixed_comments=True))
 
 def get_cobol_files_for_analysis(classified_files: Dict[str, List[Dict[str, Any]]]) -> Dict[str, str]:
     """
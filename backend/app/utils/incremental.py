@@ -0,0 +1,408 @@
+import hashlib
+import mmap
+import os
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from ..config import logger
+from .analysis_model import MODEL_FORMAT, ProgramModel
+from .cobol_analyzer import _analyze_cobol_lines
+from .cobol_parser import parse_cobol, ast_to_record, DIVISION, SECTION, PARAGRAPH
+from .cobol_tokenizer import SourceLine, iter_source_lines, detect_source_format, INDICATOR_COLUMN
+from .call_graph import extract_flow
+from .symbol_index import extract_symbols
+from .exec_blocks import extract_exec_blocks
+from .source_reader import CARD_RECORD_LENGTH, detect_record_format
+
+# Kind of the first segment: everything before the first procedure paragraph or section
+PROLOGUE = "PROLOGUE"
+_PROCEDURE_HEADER = "PROCEDURE DIVISION."
+# Records sniffed for the source format, as iter_source_lines does
+_FORMAT_SAMPLE = 50
+_NEWLINE = ord("\n")
+# Fields of an AST record, see cobol_parser.ast_to_record
+_KIND, _NAME, _LINE, _END_LINE, _END_COLUMN, _CHILDREN = 0, 1, 3, 5, 6, 8
+
+
+def procedure_units(ast: List[Any]) -> List[Tuple[List[Any], List[Any]]]:
+    """
+    The sections and paragraphs of the PROCEDURE DIVISION in source order.
+
+    Args:
+        ast: Member AST record (cobol_parser.ast_to_record); incremental
+            re-analysis edits the stored records without rebuilding nodes
+
+    Returns:
+        (record, parent record) pairs; the parent is the division or the enclosing section
+    """
+    division = next((node for node in ast[_CHILDREN] if node[_KIND] == DIVISION and node[_NAME] == "PROCEDURE"), None)
+    units = []
+    if division is None:
+        return units
+    for child in division[_CHILDREN]:
+        if child[_KIND] == SECTION:
+            units.append((child, division))
+            units.extend((node, child) for node in child[_CHILDREN] if node[_KIND] == PARAGRAPH)
+        elif child[_KIND] == PARAGRAPH:
+            units.append((child, division))
+    return units
+
+
+def _digest(data, start: int, end: int) -> str:
+    """Digest of the raw bytes ``data[start:end]`` of a mapped member."""
+    return hashlib.blake2b(data[start:end], digest_size=16).hexdigest()
+
+
+def source_segments(ast: List[Any], file_path: Path, offsets: array,
+                    source_lines: List[SourceLine]) -> Optional[List[List[Any]]]:
+    """
+    Split a program into the segments incremental re-analysis diffs and re-parses.
+
+    The prologue runs up to the first procedure section or paragraph header;
+    every section and paragraph then runs up to the next header.
+
+    Args:
+        ast: Member AST record
+        file_path: The member, whose bytes are digested
+        offsets: Byte offsets of its records (source_reader.record_offsets)
+        source_lines: Logical lines the model and AST were built from
+
+    Returns:
+        [kind, name, first line (1-based), line count, byte offset, first
+        model line index, digest, byte length] per segment, or None for
+        members without a PROCEDURE DIVISION
+    """
+    units = procedure_units(ast)
+    if not units:
+        return None
+    starts = [0] + [node[_LINE] - 1 for node, _ in units] + [len(offsets) - 1]
+    if any(end <= start for start, end in zip(starts[1:], starts[2:])):
+        return None
+    physical = [source_line.line for source_line in source_lines]
+    kinds = [(PROLOGUE, "")] + [(node[_KIND], node[_NAME]) for node, _ in units]
+    with open(file_path, mode='rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return [
+            [kind, name, start + 1, end - start, offsets[start], bisect_left(physical, start + 1),
+             _digest(mm, offsets[start], offsets[end]), offsets[end] - offsets[start]]
+            for (kind, name), start, end in zip(kinds, starts, starts[1:])
+        ]
+
+
+class _RegionOffsets:
+    """
+    source_reader.record_offsets of the records around an edit only.
+
+    Index ``n`` is the byte offset of record ``n`` for records ``first`` to
+    ``first + len(offsets) - 1``, and -1 the file size, which is all that
+    symbol_index and exec_blocks look up for the re-parsed paragraphs.
+    """
+    __slots__ = ("first", "offsets", "size")
+
+    def __init__(self, first: int, offsets: List[int], size: int):
+        self.first = first
+        self.offsets = offsets
+        self.size = size
+
+    def __getitem__(self, index: int) -> int:
+        if index == -1:
+            return self.size
+        if index < self.first:
+            raise IndexError(f"Record {index} is before the edited region")
+        return self.offsets[index - self.first]
+
+
+def _on_boundary(data, position: int, fixed: bool) -> bool:
+    """Whether a record starts at byte ``position`` (or the file ends there)."""
+    if position in (0, len(data)):
+        return True
+    return position % CARD_RECORD_LENGTH == 0 if fixed else data[position - 1] == _NEWLINE
+
+
+def _read_region(data, start: int, end: int, fixed: bool) -> Tuple[List[str], List[int]]:
+    """
+    The records of ``data[start:end]``, decoded as source_reader.iter_records does, and their byte offsets.
+
+    ``start`` and ``end`` must be record boundaries.
+    """
+    if fixed:
+        offsets = list(range(start, end, CARD_RECORD_LENGTH))
+        return [str(data[offset:offset + CARD_RECORD_LENGTH], "utf-8", "ignore") for offset in offsets], offsets
+    text = str(data[start:end], "utf-8", "ignore")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n")
+    records = text.split("\n")
+    if records[-1] == "":
+        records.pop()
+    offsets = []
+    position = start
+    while position < end:
+        offsets.append(position)
+        newline = data.find(b"\n", position, end)
+        position = end if newline < 0 else newline + 1
+    return records, offsets
+
+
+def _record_end(data, start: int, fixed: bool) -> int:
+    """Byte offset just past the record starting at ``start``, terminator included."""
+    if fixed:
+        return min(start + CARD_RECORD_LENGTH, len(data))
+    newline = data.find(b"\n", start)
+    return len(data) if newline < 0 else newline + 1
+
+
+def _head_records(data, fixed: bool) -> List[str]:
+    """The first _FORMAT_SAMPLE records, for detect_source_format."""
+    end = 0
+    for _ in range(_FORMAT_SAMPLE):
+        if end >= len(data):
+            break
+        end = _record_end(data, end, fixed)
+    return _read_region(data, 0, end, fixed)[0]
+
+
+def _shifted(values: List[int], delta: int) -> List[int]:
+    return [value + delta for value in values] if delta else values
+
+
+def _shift(node: List[Any], after: int, delta: int) -> None:
+    """Move the AST records that start or end after line ``after`` by ``delta`` lines, skipping subtrees before it."""
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        if node[_END_LINE] <= after:
+            continue
+        if node[_LINE] > after:
+            node[_LINE] += delta
+        node[_END_LINE] += delta
+        pending.extend(node[_CHILDREN])
+
+
+def reanalyze_file_record(file_path: Path, model_record: List[Any], structure: Dict[str, Any]) -> Optional[Dict]:
+    """
+    Re-analyze an edited program by re-parsing only its changed paragraphs.
+
+    The stored segments are compared with the new source from both ends, by
+    digesting the bytes at their recorded offsets in the memory-mapped file;
+    only the bytes between the unchanged prefix and suffix are decoded,
+    re-tokenized and re-parsed, then spliced into the stored model, AST, flow,
+    symbol and EXEC block records. Edits outside procedure paragraphs (the
+    prologue, section headers, a new section or program) are not handled.
+
+    Decoding, parsing and analysis cost depends on the size of the edit only.
+    The cost is still O(file size) in two places: digesting the unchanged
+    segments (hashing of the mapped bytes, as cheap as the SHA-256 the
+    analysis cache takes of every file anyway) and moving the line numbers
+    and byte offsets recorded after the edit. The second is skipped when the
+    edit keeps the line count or byte length. Writing the records back to the
+    project store is a whole-file rewrite too.
+
+    Args:
+        file_path: Edited member
+        model_record: Its previous model record (analysis_model.model_to_record)
+        structure: Its previous structure record (see cobol_analyzer._analyze_file_record)
+
+    Returns:
+        A record dictionary like cobol_analyzer._analyze_file_record, or None
+        when the member has to be analyzed in full
+    """
+    segments = structure.get("segments")
+    if not segments or structure.get("ast") is None or structure.get("exec_blocks") is None:
+        return None
+    if model_record[0] != MODEL_FORMAT:
+        return None
+    with open(file_path, mode='rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _reanalyze_mapped(file_path, mm, model_record, structure, segments)
+
+
+def _reanalyze_mapped(file_path: Path, data, model_record: List[Any], structure: Dict[str, Any],
+                      segments: List[List[Any]]) -> Optional[Dict]:
+    """reanalyze_file_record on the mapped bytes ``data`` of the member."""
+    size = len(data)
+    fixed = detect_record_format(data) == "fixed"
+    byte_delta = size - (segments[-1][4] + segments[-1][7])
+
+    prefix = 0
+    for segment in segments:
+        if segment[4] + segment[7] > size or _digest(data, segment[4], segment[4] + segment[7]) != segment[6]:
+            break
+        prefix += 1
+    if prefix == 0 or prefix == len(segments) and not byte_delta:
+        return None
+    region_start = segments[prefix - 1][2] - 1 + segments[prefix - 1][3]
+    region_byte = segments[prefix - 1][4] + segments[prefix - 1][7]
+    suffix = 0
+    for segment in reversed(segments[prefix:]):
+        start = segment[4] + byte_delta
+        if start < region_byte or _digest(data, start, start + segment[7]) != segment[6]:
+            break
+        suffix += 1
+    changed = segments[prefix:len(segments) - suffix]
+    following = segments[len(segments) - suffix] if suffix else None
+    if any(segment[0] != PARAGRAPH for segment in changed):
+        return None
+    old_end = following[2] - 1 if following else segments[-1][2] - 1 + segments[-1][3]
+    end_byte = following[4] + byte_delta if following else size
+    # Matching bytes that no longer start a record (a joined or split line) are not unchanged segments
+    if not (_on_boundary(data, region_byte, fixed) and _on_boundary(data, end_byte, fixed)):
+        return None
+    records, region_offsets = _read_region(data, region_byte, end_byte, fixed)
+    new_end = region_start + len(records)
+    delta = new_end - old_end
+    source_format = detect_source_format(_head_records(data, fixed))
+    if following:
+        header = _read_region(data, end_byte, _record_end(data, end_byte, fixed), fixed)[0][0]
+        if source_format == "fixed" and header[INDICATOR_COLUMN - 1:INDICATOR_COLUMN] == "-":
+            return None
+        records.append(header)
+    # The last record before the edit carries the PROCEDURE DIVISION header the fragment is parsed under
+    previous_byte = region_byte - CARD_RECORD_LENGTH if fixed else data.rfind(b"\n", 0, region_byte - 1) + 1
+    offsets = _RegionOffsets(region_start - 1, [previous_byte] + region_offsets + [end_byte], size)
+
+    # The edited lines, after a PROCEDURE DIVISION header and followed by the next unchanged header
+    # so the parse must end where the stored one did
+    header_line = SourceLine(region_start, 8, "A", _PROCEDURE_HEADER, _PROCEDURE_HEADER)
+    fragment_lines = [header_line] + list(iter_source_lines(records, source_format, region_start + 1))
+    fragment = parse_cobol(fragment_lines)
+    division = fragment.children[0] if len(fragment.children) == 1 else None
+    if division is None or division.name != "PROCEDURE":
+        return None
+    paragraphs = division.children
+    if following:
+        if not paragraphs or paragraphs[-1].line != new_end + 1 or paragraphs[-1].name != following[1]:
+            return None
+        paragraphs = paragraphs[:-1]
+    # The edited code must start with a paragraph header (comment lines before it are fine)
+    if any(node.kind != PARAGRAPH for node in paragraphs) or paragraphs and paragraphs[0].line != fragment_lines[1].line:
+        return None
+    fragment_flow = extract_flow(fragment)
+    division.children = paragraphs
+    fragment_definitions, fragment_references = extract_symbols(fragment, offsets)
+    if fragment_definitions:
+        return None
+    fragment_blocks = extract_exec_blocks(fragment, offsets)
+    fragment_model = ProgramModel(file_path.name, file_path.suffix.lower())
+    _analyze_cobol_lines(fragment_lines, fragment_model, False)
+
+    # Model: replace the logical lines of the edited paragraphs, patching the stored record
+    # rather than rebuilding the whole model from it
+    text, starts, cics_commands, model_paragraphs = model_record[4], model_record[5], model_record[8], model_record[9]
+    line_count = len(starts) - 1
+    count = len(fragment_lines) - 1 - bool(following)
+    first = changed[0][5] if changed else (following[5] if following else line_count)
+    last = following[5] if following else line_count
+    new_paragraphs = fragment_model.paragraphs
+    if following:
+        if not new_paragraphs or new_paragraphs[-1].lines[0] != count + 1:
+            return None
+        new_paragraphs = new_paragraphs[:-1]
+    if count and (not new_paragraphs or new_paragraphs[0].lines[0] != 1):
+        return None
+    for _, lines in model_paragraphs:
+        head, tail = lines[0], lines[-1]
+        if head < first <= tail or head < last <= tail:
+            return None
+    logical_delta = count - (last - first)
+    fragment_table = fragment_model.lines
+    fragment_start, fragment_end = fragment_table.starts[1], fragment_table.starts[count + 1]
+    text_delta = fragment_end - fragment_start - (starts[last] - starts[first])
+    model = list(model_record)
+    model[4] = text[:starts[first]] + fragment_table.text[fragment_start:fragment_end] + text[starts[last]:]
+    model[5] = (starts[:first] + [starts[first] + offset - fragment_start for offset in fragment_table.starts[1:count + 1]]
+                + _shifted(starts[last:], text_delta))
+    model[8] = (
+        [command for command in cics_commands if command[1] < first]
+        + [[command.type, command.line + first - 1, command.offset, command.paragraph]
+           for command in fragment_model.cics_commands if 1 <= command.line <= count]
+        + [command if not logical_delta else [command[0], command[1] + logical_delta] + command[2:]
+           for command in cics_commands if command[1] >= last]
+    )
+    model[9] = (
+        [paragraph for paragraph in model_paragraphs if paragraph[1][0] < first]
+        + [[paragraph.name, [index + first - 1 for index in paragraph.lines]] for paragraph in new_paragraphs]
+        + [[name, _shifted(lines, logical_delta)] for name, lines in model_paragraphs if lines[0] >= last]
+    )
+
+    # AST: swap the paragraph records, then move everything after the edit
+    ast = structure["ast"]
+    units = procedure_units(ast)
+    if len(units) != len(segments) - 1:
+        return None
+    procedure_division = next(node for node in ast[_CHILDREN] if node[_KIND] == DIVISION and node[_NAME] == "PROCEDURE")
+    if prefix == 1:
+        parent = procedure_division
+    else:
+        node, parent = units[prefix - 2]
+        if node[_KIND] == SECTION:
+            parent = node
+    replaced = units[prefix - 1:prefix - 1 + len(changed)]
+    if any(unit_parent is not parent for _, unit_parent in replaced):
+        return None
+    removed = {id(node) for node, _ in replaced}
+    children = parent[_CHILDREN]
+    position = next((index for index, child in enumerate(children) if child[_LINE] > region_start), len(children))
+    # Enclosing nodes that did not end after the edit now end with their last child
+    ancestors = [parent] + [node for node in (procedure_division, ast) if node is not parent]
+    stale = [node for node in ancestors if node[_END_LINE] <= old_end]
+    children[:] = [child for child in children if id(child) not in removed]
+    if delta:
+        _shift(ast, old_end, delta)
+    children[position:position] = [ast_to_record(node) for node in paragraphs]
+    for node in stale:
+        if node[_CHILDREN]:
+            node[_END_LINE], node[_END_COLUMN] = node[_CHILDREN][-1][_END_LINE], node[_CHILDREN][-1][_END_COLUMN]
+
+    # Flow: one procedure entry per unit, in the same order
+    program_name, program_edges, procedures = structure["flow"]
+    section = parent[_NAME] if parent[_KIND] == SECTION else None
+    procedures = (procedures[:prefix - 1]
+                  + [[name, kind, section, edges] for name, kind, _, edges in fragment_flow[2][:len(paragraphs)]]
+                  + procedures[prefix - 1 + len(changed):])
+
+    # Symbols: references of the edited lines are replaced, later ones moved
+    definitions, references = structure["symbols"]
+    later = [reference for reference in references if reference[3] > old_end]
+    if delta or byte_delta:
+        later = [[name, start + byte_delta, end + byte_delta, line + delta, verb] for name, start, end, line, verb in later]
+    references = [reference for reference in references if reference[3] <= region_start] + fragment_references + later
+
+    # EXEC blocks: the same, by their first line
+    later = [block for block in structure["exec_blocks"] if block[3] > old_end]
+    if delta or byte_delta:
+        later = [block[:3] + [block[3] + delta, block[4] + delta, block[5] + byte_delta, block[6] + byte_delta] + block[7:]
+                 for block in later]
+    exec_blocks = [block for block in structure["exec_blocks"] if block[3] <= region_start] + fragment_blocks + later
+
+    # Segments: the edited paragraphs get new digests, the ones after move; blank and
+    # comment lines before the first new header belong to the segment before them
+    new_segments = segments[:prefix]
+    lead = (paragraphs[0].line - 1 if paragraphs else new_end) - region_start
+    if lead:
+        previous = new_segments[-1] = list(new_segments[-1])
+        previous[3] += lead
+        previous[7] = offsets[region_start + lead] - previous[4]
+        previous[6] = _digest(data, previous[4], previous[4] + previous[7])
+        region_start += lead
+    bounds = [region_start] + [node.line - 1 for node in paragraphs[1:]] + [new_end]
+    physical = [source_line.line for source_line in fragment_lines[1:]]
+    for node, start, end in zip(paragraphs, bounds, bounds[1:]):
+        new_segments.append([PARAGRAPH, node.name, start + 1, end - start, offsets[start],
+                             first + bisect_left(physical, start + 1), _digest(data, offsets[start], offsets[end]),
+                             offsets[end] - offsets[start]])
+    for kind, name, start, length, offset, model_line, digest, byte_length in segments[len(segments) - suffix:]:
+        new_segments.append([kind, name, start + delta, length, offset + byte_delta, model_line + logical_delta,
+                             digest, byte_length])
+
+    logger.info(f"File {file_path.name} re-analyzed incrementally: {len(changed)} paragraphs replaced by {len(paragraphs)}")
+    return {
+        "model": model,
+        "ast": ast,
+        "flow": [program_name, program_edges, procedures],
+        "symbols": [definitions, references],
+        "layouts": structure["layouts"],
+        "segments": new_segments,
+        "exec_blocks": exec_blocks
+    }
@@ -0,0 +1,142 @@
+import mmap
+import os
+import struct
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+from .analysis_model import dumps, loads
+
+# File layout: magic, header length (uint64), orjson header, then every array
+# 8-byte aligned. The header records each array's typecode, offset and length.
+INDEX_MAGIC = b"CBLIDX1\n"
+_LENGTH = struct.Struct("<Q")
+_ALIGN = 8
+
+
+def write_index(path: Path, header: Dict[str, Any], arrays: Dict[str, array]) -> None:
+    """
+    Write a header and named typed arrays to one index file, atomically.
+
+    Args:
+        path: Target file
+        header: Small JSON-serializable metadata
+        arrays: Named array.array objects stored as raw machine values
+    """
+    layout = {}
+    offset = 0
+    for name, values in arrays.items():
+        layout[name] = [values.typecode, offset, len(values)]
+        offset += -(-len(values) * values.itemsize // _ALIGN) * _ALIGN
+    header_bytes = dumps({"header": header, "arrays": layout})
+    data_start = -(-(len(INDEX_MAGIC) + _LENGTH.size + len(header_bytes)) // _ALIGN) * _ALIGN
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, mode='wb') as f:
+        f.write(INDEX_MAGIC)
+        f.write(_LENGTH.pack(len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for name, values in arrays.items():
+            f.seek(data_start + layout[name][1])
+            values.tofile(f)
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def read_index(path: Path) -> Tuple[Dict[str, Any], Dict[str, memoryview]]:
+    """
+    Map an index file written by write_index.
+
+    Arrays come back as memoryviews over the mapped file, so opening an index
+    costs the same regardless of its size; pages are read on first access.
+
+    Raises:
+        ValueError: When the file is not an index file
+        OSError: When the file cannot be read
+    """
+    with open(path, mode='rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+        raise ValueError(f"Not an index file: {path}")
+    header_start = len(INDEX_MAGIC) + _LENGTH.size
+    (header_length,) = _LENGTH.unpack_from(mm, len(INDEX_MAGIC))
+    meta = loads(mm[header_start:header_start + header_length])
+    data_start = -(-(header_start + header_length) // _ALIGN) * _ALIGN
+
+    view = memoryview(mm)
+    arrays = {}
+    for name, (typecode, offset, length) in meta["arrays"].items():
+        start = data_start + offset
+        itemsize = array(typecode).itemsize
+        arrays[name] = view[start:start + length * itemsize].cast(typecode)
+    return meta["header"], arrays
+
+
+def pack_strings(strings: List[str], prefix: str) -> Dict[str, array]:
+    """
+    Pack strings into the arrays read back by StringTable.
+
+    ``<prefix>_blob`` holds the UTF-8 bytes, ``<prefix>_offsets`` the start of
+    each string plus the end offset, and ``<prefix>_order`` the string indices
+    in sorted order for binary search.
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = array("I", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    order = array("I", sorted(range(len(encoded)), key=encoded.__getitem__))
+    return {
+        f"{prefix}_blob": array("B", b"".join(encoded)),
+        f"{prefix}_offsets": offsets,
+        f"{prefix}_order": order,
+    }
+
+
+class StringTable:
+    """Read-only view of strings packed by pack_strings, looked up by index or by value."""
+    __slots__ = ("blob", "offsets", "order")
+
+    def __init__(self, arrays: Dict[str, memoryview], prefix: str):
+        self.blob = arrays[f"{prefix}_blob"]
+        self.offsets = arrays[f"{prefix}_offsets"]
+        self.order = arrays[f"{prefix}_order"]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _bytes(self, index: int) -> bytes:
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+    def __getitem__(self, index: int) -> str:
+        return self._bytes(index).decode("utf-8")
+
+    def find(self, value: str) -> int:
+        """Index of ``value``, or -1 when it is not in the table."""
+        key = value.encode("utf-8")
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._bytes(self.order[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.order) and self._bytes(self.order[low]) == key:
+            return self.order[low]
+        return -1
+
+    def prefixed(self, prefix: str) -> Iterable[int]:
+        """Indices of all strings starting with ``prefix``, in sorted order."""
+        key = prefix.encode("utf-8")
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._bytes(self.order[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        for position in range(low, len(self.order)):
+            index = self.order[position]
+            if not self._bytes(index).startswith(key):
+                break
+            yield index
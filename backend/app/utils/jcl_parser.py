@@ -0,0 +1,688 @@
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from ..config import logger, output_dir
+from .analysis_model import dumps, loads
+from .source_reader import iter_records
+
+JCL_GRAPH_FILE = "jcl_graph.json"
+# Bump whenever the graph layout written by build_jcl_graph changes
+JCL_GRAPH_FORMAT = 1
+# z/OS allows procedures to be nested 15 levels deep
+MAX_PROC_DEPTH = 15
+# Keywords of EXEC that are step parameters; any other keyword on a procedure call sets a symbolic parameter
+EXEC_PARAMETERS = {
+    "PGM", "PROC", "PARM", "PARMDD", "COND", "REGION", "REGIONX", "TIME", "ACCT", "ADDRSPC",
+    "DPRTY", "DYNAMNBR", "PERFORM", "RD", "CCSID", "MEMLIMIT", "TVSMSG", "TVSAMCOM"
+}
+# Step parameters that can be overridden per procedure step as KEYWORD.PROCSTEP
+_STEP_OVERRIDES = ("PARM", "COND", "REGION", "TIME")
+# DISP statuses and how the step uses the dataset; a DD without DISP creates it
+DISP_ACCESS = {"NEW": "write", "MOD": "write", "OLD": "update", "SHR": "read"}
+
+# &NAME or &NAME. (the period only delimits the name); &&NAME is a temporary dataset, not a symbol
+_SYMBOL_RE = re.compile(r"(?<!&)&([A-Z@#$][A-Z0-9@#$]{0,7})\.?")
+_SEPARATOR_RE = re.compile(r"[(),']")
+_KEYWORD_RE = re.compile(r"([A-Z@#$][A-Z0-9@#$]*(?:\.[A-Z@#$][A-Z0-9@#$]*)?)=")
+# Card columns 1-71 hold the statement; 72 and beyond are the continuation indicator and sequence number
+_STATEMENT_END = 71
+# A continued quoted operand resumes in column 16 of the next card
+_QUOTED_CONTINUATION = 15
+
+
+class JclCard:
+    """One JCL statement with its continuation cards joined; ``data`` holds the in-stream lines of DD * / DD DATA."""
+    __slots__ = ("line", "name", "operation", "operands", "data")
+
+    def __init__(self, line: int, name: str, operation: str, operands: str):
+        self.line = line
+        self.name = name
+        self.operation = operation
+        self.operands = operands
+        self.data: Optional[List[str]] = None
+
+
+class JclProc:
+    """
+    A procedure definition: symbolic parameter defaults and unexpanded steps.
+
+    ``steps`` holds [step name, EXEC operands, [[ddname, DD operands, in-stream], ...]]
+    so expansion can substitute symbols in the original text.
+    """
+    __slots__ = ("name", "member", "defaults", "steps", "symbols")
+
+    def __init__(self, name: str, member: str, defaults: Dict[str, str]):
+        self.name = name
+        self.member = member
+        self.defaults = defaults
+        self.steps: List[List[Any]] = []
+        self.symbols: Set[str] = set()
+
+
+def _operand_field(text: str, start: int, in_quote: bool = False) -> Tuple[str, bool]:
+    """
+    The operand field of a card starting at ``start``: it ends at the first blank outside quotes.
+
+    Returns:
+        (field text, whether a quoted string is still open at the end of the card)
+    """
+    if not in_quote and "'" not in text:
+        end = text.find(" ", start)
+        return (text[start:] if end < 0 else text[start:end]), False
+    position = start
+    while position < len(text):
+        char = text[position]
+        if char == "'":
+            in_quote = not in_quote
+        elif char == " " and not in_quote:
+            break
+        position += 1
+    return text[start:position], in_quote
+
+
+def _instream_end(card: JclCard) -> Optional[Tuple[str, bool]]:
+    """For DD * and DD DATA: (delimiter, whether a // statement also ends the data), else None."""
+    if not card.operands.startswith(("*", "DATA")):
+        return None
+    positional, keywords = parse_operands(card.operands)
+    if not positional or positional[0] not in ("*", "DATA"):
+        return None
+    delimiter = _unquote(keywords["DLM"]) if "DLM" in keywords else "/*"
+    return delimiter, positional[0] == "*"
+
+
+def iter_jcl_statements(records: Iterable[str]) -> Iterator[JclCard]:
+    """
+    Stream the statements of a JCL member.
+
+    Continuation cards (an operand field ending in a comma, or a quoted string
+    running into column 71) are joined into one statement; comment cards,
+    delimiters and columns 72-80 are dropped. In-stream data of DD * and DD DATA
+    is attached to its DD statement, which is yielded once the data ends. A null
+    statement (``//`` alone) is yielded with operation ``NULL``.
+
+    Args:
+        records: Card images, e.g. source_reader.iter_records(path)
+    """
+    pending = None  # statement awaiting continuation cards
+    in_quote = False
+    data_card = None  # DD statement collecting in-stream data
+    delimiter = "/*"
+    ends_at_statement = True
+
+    for number, record in enumerate(records, 1):
+        text = record[:_STATEMENT_END].rstrip()
+        if pending is not None:
+            if text.startswith("//*"):
+                continue
+            card = pending
+            if text.startswith("// ") and text[3:].strip():
+                start = _QUOTED_CONTINUATION if in_quote else len(text) - len(text[2:].lstrip())
+                field, in_quote = _operand_field(text, start, in_quote)
+                card.operands += field
+                if in_quote or field.endswith(","):
+                    continue
+                text = None  # consumed by the statement
+            # Otherwise the continuation card is missing and this card starts something new
+            pending, in_quote = None, False
+            instream = _instream_end(card) if card.operation == "DD" else None
+            if instream is not None:
+                card.data = []
+                data_card = card
+                delimiter, ends_at_statement = instream
+            else:
+                yield card
+            if text is None:
+                continue
+
+        if data_card is not None:
+            if text.startswith(delimiter):
+                yield data_card
+                data_card = None
+                continue
+            if not (ends_at_statement and text.startswith("//")):
+                data_card.data.append(record.rstrip())
+                continue
+            yield data_card
+            data_card = None
+
+        if not text.startswith("//") or text.startswith("//*"):
+            continue
+        if text == "//":
+            yield JclCard(number, "", "NULL", "")
+            continue
+
+        if text[2] == " ":
+            name, rest = "", text[2:].lstrip()
+        else:
+            name, _, rest = text[2:].partition(" ")
+            rest = rest.lstrip()
+        operation, _, rest = rest.partition(" ")
+        if not operation:
+            continue
+        rest = rest.lstrip()
+        field, in_quote = _operand_field(text, len(text) - len(rest)) if rest else ("", False)
+
+        card = JclCard(number, name, operation, field)
+        if in_quote or field.endswith(","):
+            pending = card
+            continue
+        instream = _instream_end(card) if operation == "DD" else None
+        if instream is not None:
+            card.data = []
+            data_card = card
+            delimiter, ends_at_statement = instream
+        else:
+            yield card
+
+    if pending is not None:
+        yield pending
+    if data_card is not None:
+        yield data_card
+
+
+def split_operands(text: str) -> List[str]:
+    """Split an operand field on the commas that are outside parentheses and quotes."""
+    if "(" not in text and "'" not in text:
+        return text.split(",") if text else []
+    parts = []
+    depth = 0
+    in_quote = False
+    start = 0
+    for match in _SEPARATOR_RE.finditer(text):
+        char = match.group()
+        if char == "'":
+            in_quote = not in_quote
+        elif in_quote:
+            continue
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0:
+            parts.append(text[start:match.start()])
+            start = match.end()
+    parts.append(text[start:])
+    return parts
+
+
+def parse_operands(text: str) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Parse an operand field into positional and keyword parameters.
+
+    Returns:
+        (positional values, {KEYWORD or KEYWORD.PROCSTEP: value}); values keep
+        their quotes and parentheses
+    """
+    positional = []
+    keywords = {}
+    for part in split_operands(text):
+        match = _KEYWORD_RE.match(part)
+        if match:
+            keywords[match.group(1)] = part[match.end():]
+        else:
+            positional.append(part)
+    return positional, keywords
+
+
+def _unquote(value: str) -> str:
+    if len(value) > 1 and value[0] == "'" and value[-1] == "'":
+        return value[1:-1].replace("''", "'")
+    return value
+
+
+def _subparameters(value: str) -> List[str]:
+    """The subparameters of a value such as DISP=(NEW,CATLG,DELETE); a lone value is one subparameter."""
+    if value.startswith("(") and value.endswith(")"):
+        return split_operands(value[1:-1])
+    return [value]
+
+
+def substitute(text: str, symbols: Dict[str, str]) -> str:
+    """Replace the symbolic parameters in ``text``; unknown symbols are left as written."""
+    if "&" not in text or not symbols:
+        return text
+    return _SYMBOL_RE.sub(lambda match: symbols.get(match.group(1), match.group(0)), text)
+
+
+def _read_proc(header: JclCard, cards: Iterator[JclCard], member: str) -> JclProc:
+    """Collect a procedure from its PROC statement up to PEND or the end of the member."""
+    _, keywords = parse_operands(header.operands)
+    proc = JclProc(header.name, member, {key: _unquote(value) for key, value in keywords.items()})
+    for card in cards:
+        if card.operation == "PEND":
+            break
+        if card.operation == "EXEC":
+            proc.steps.append([card.name, card.operands, []])
+        elif card.operation == "DD" and proc.steps:
+            proc.steps[-1][2].append([card.name, card.operands, card.data is not None])
+        elif card.operation == "SET":
+            for key, value in parse_operands(card.operands)[1].items():
+                proc.defaults.setdefault(key, _unquote(value))
+        else:
+            continue
+        proc.symbols.update(_SYMBOL_RE.findall(card.operands))
+    return proc
+
+
+def _dataset(dsn: str) -> Dict[str, Any]:
+    """Dataset fields of a DSN value: name, PDS member or GDG generation, temporary or backward reference."""
+    dsn = _unquote(dsn)
+    dd: Dict[str, Any] = {"dataset": dsn}
+    if dsn.startswith("*."):
+        dd["reference"] = dsn[2:]
+        return dd
+    if dsn.endswith(")") and "(" in dsn:
+        base, _, qualifier = dsn[:-1].partition("(")
+        dd["dataset"] = base
+        dd["generation" if qualifier[:1] in "+-0" else "member"] = qualifier
+    if dsn.startswith("&&"):
+        dd["temporary"] = True
+    return dd
+
+
+def _dd_entry(ddname: str, text: str, instream: bool) -> Dict[str, Any]:
+    """Describe one DD statement: its dataset and access, or SYSOUT, DUMMY or in-stream data."""
+    positional, keywords = parse_operands(text)
+    dsn = keywords.get("DSN") or keywords.get("DSNAME")
+    if dsn:
+        dd = {"ddname": ddname, **_dataset(dsn)}
+        status = _subparameters(keywords["DISP"])[0] if "DISP" in keywords else ""
+        dd["disp"] = status or "NEW"
+        dd["access"] = DISP_ACCESS.get(dd["disp"], "read")
+        return dd
+    dd = {"ddname": ddname}
+    if "SYSOUT" in keywords:
+        dd["sysout"] = _unquote(keywords["SYSOUT"])
+    elif instream:
+        dd["instream"] = True
+    elif positional and positional[0] == "DUMMY":
+        dd["dummy"] = True
+    return dd
+
+
+def _step(name: str, keywords: Dict[str, str], program: Optional[str], proc: Optional[str]) -> Dict[str, Any]:
+    step = {"name": name, "program": program, "proc": proc, "dds": []}
+    for keyword in _STEP_OVERRIDES:
+        if keyword in keywords:
+            step[keyword.lower()] = _unquote(keywords[keyword])
+    return step
+
+
+def _call_symbols(keywords: Dict[str, str]) -> Dict[str, str]:
+    """The symbolic parameter values set on an EXEC statement that calls a procedure."""
+    return {
+        key: _unquote(value) for key, value in keywords.items()
+        if key not in EXEC_PARAMETERS and "." not in key
+    }
+
+
+def _called_proc(positional: List[str], keywords: Dict[str, str]) -> Optional[str]:
+    if "PROC" in keywords:
+        return keywords["PROC"]
+    return positional[0] if positional else None
+
+
+def _apply_step_overrides(steps: List[Dict[str, Any]], keywords: Dict[str, str]) -> None:
+    """Apply KEYWORD.PROCSTEP overrides of a procedure call; an unqualified PARM or COND goes to the first step."""
+    for key, value in keywords.items():
+        keyword, _, procstep = key.partition(".")
+        if keyword not in _STEP_OVERRIDES:
+            continue
+        for step in steps:
+            if (step.get("procstep") == procstep) if procstep else (step is steps[0]):
+                step[keyword.lower()] = _unquote(value)
+
+
+class ProcLibrary:
+    """
+    The procedures visible to a set of jobs.
+
+    Catalogued procedures are project members named like the procedure. Each
+    one is parsed at most once, and expanded once per distinct set of values of
+    the symbols it uses; jobs calling it with the same values share the
+    expansion. An in-stream procedure library chains to the project library.
+    """
+    __slots__ = ("members", "procs", "expansions", "parent", "hits", "misses")
+
+    def __init__(self, members: Optional[Dict[str, Path]] = None, parent: Optional["ProcLibrary"] = None):
+        self.members = members or {}
+        self.procs: Dict[str, Optional[JclProc]] = {}
+        self.expansions: Dict[Tuple, List[Dict[str, Any]]] = {}
+        self.parent = parent
+        self.hits = 0
+        self.misses = 0
+
+    def _owner(self, name: str) -> Optional["ProcLibrary"]:
+        if name in self.procs or name in self.members:
+            return self
+        return self.parent._owner(name) if self.parent is not None else None
+
+    def get(self, name: str) -> Optional[JclProc]:
+        """The procedure called ``name``, read from its member on first use; None when unknown."""
+        owner = self._owner(name)
+        if owner is None:
+            return None
+        if name not in owner.procs:
+            proc = None
+            cards = iter_jcl_statements(iter_records(owner.members[name]))
+            for card in cards:
+                if card.operation == "PROC":
+                    proc = _read_proc(card, cards, owner.members[name].name)
+                    break
+                if card.operation in ("JOB", "EXEC"):
+                    break
+            owner.procs[name] = proc
+        return owner.procs[name]
+
+    def expand(self, name: str, overrides: Dict[str, str], outer: Optional[Dict[str, str]] = None,
+               depth: int = 0) -> Optional[List[Dict[str, Any]]]:
+        """
+        The steps of procedure ``name`` with its symbols substituted.
+
+        Values on the calling EXEC (``overrides``) take precedence over the
+        PROC defaults, which take precedence over SET values of the job
+        (``outer``). The returned steps are shared between callers with equal
+        values and must not be modified.
+
+        Returns:
+            Step dictionaries with ``procstep`` set, or None when the procedure
+            is unknown or nested too deeply
+        """
+        owner = self._owner(name)
+        proc = self.get(name)
+        if proc is None or depth > MAX_PROC_DEPTH:
+            return None
+        values = {**(outer or {}), **proc.defaults, **overrides}
+        symbols = {symbol: values[symbol] for symbol in proc.symbols if symbol in values}
+        key = (name, tuple(sorted(symbols.items())))
+        steps = owner.expansions.get(key)
+        if steps is not None:
+            owner.hits += 1
+            return steps
+
+        owner.misses += 1
+        steps = []
+        for step_name, exec_text, dds in proc.steps:
+            positional, keywords = parse_operands(substitute(exec_text, symbols))
+            entries = [_dd_entry(ddname, substitute(text, symbols), instream) for ddname, text, instream in dds]
+            if "PGM" in keywords:
+                step = _step(step_name, keywords, _unquote(keywords["PGM"]), proc.name)
+                step["procstep"] = step_name
+                step["dds"] = entries
+                steps.append(step)
+                continue
+            called = _called_proc(positional, keywords)
+            nested = owner.expand(called, _call_symbols(keywords), None, depth + 1) if called else None
+            if nested is None:
+                step = _step(step_name, keywords, None, called)
+                step["procstep"] = step_name
+                step["unresolved"] = True
+                step["dds"] = entries
+                steps.append(step)
+                continue
+            nested = [dict(step, dds=list(step["dds"])) for step in nested]
+            _apply_step_overrides(nested, keywords)
+            steps.extend(nested)
+        owner.expansions[key] = steps
+        return steps
+
+
+def _resolve_references(steps: List[Dict[str, Any]]) -> None:
+    """Resolve DSN=*.STEP.DD (or *.STEP.PROCSTEP.DD) backward references within a job."""
+    for index, step in enumerate(steps):
+        for position, dd in enumerate(step["dds"]):
+            if "reference" not in dd:
+                continue
+            parts = dd["reference"].split(".")
+            for earlier in reversed(steps[:index + 1]):
+                if parts[0] not in (earlier["name"], earlier.get("procstep")):
+                    continue
+                if len(parts) == 3 and earlier.get("procstep") != parts[1]:
+                    continue
+                target = next((candidate for candidate in earlier["dds"] if candidate["ddname"] == parts[-1]), None)
+                if target is not None and "dataset" in target and "reference" not in target:
+                    resolved = {key: value for key, value in target.items() if key not in ("ddname", "disp", "access")}
+                    step["dds"][position] = {**dd, **resolved}
+                    del step["dds"][position]["reference"]
+                break
+
+
+def iter_jcl_jobs(file_path: Path, library: ProcLibrary) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the jobs of a JCL member with their procedure calls expanded.
+
+    A member that starts with a PROC statement is a catalogued procedure: it
+    is added to ``library`` and yields no jobs.
+
+    Yields:
+        {"name", "member", "line", "steps", "unresolved_procs"} per JOB statement,
+        where each step has ``name``, ``program``, ``proc``, ``procstep`` (for
+        procedure steps) and ``dds``
+    """
+    cards = iter_jcl_statements(iter_records(file_path))
+    job = None
+    local = library
+    set_symbols: Dict[str, str] = {}
+    current: List[Dict[str, Any]] = []  # steps of the last EXEC, the targets of the DDs that follow
+    last_ddname = ""
+    last_target = None
+
+    for card in cards:
+        operation = card.operation
+        if operation == "JOB":
+            if job is not None:
+                _resolve_references(job["steps"])
+                yield job
+            job = {"name": card.name, "member": file_path.name, "line": card.line, "steps": [], "unresolved_procs": []}
+            local = ProcLibrary(parent=library)
+            set_symbols = {}
+            current = []
+            last_target = None
+        elif job is None:
+            if operation == "PROC":
+                name = file_path.stem.upper()
+                library.procs.setdefault(name, _read_proc(card, cards, file_path.name))
+                return
+        elif operation == "PROC":
+            proc = _read_proc(card, cards, file_path.name)
+            local.procs[proc.name] = proc
+        elif operation == "SET":
+            for key, value in parse_operands(substitute(card.operands, set_symbols))[1].items():
+                set_symbols[key] = _unquote(value)
+        elif operation == "EXEC":
+            positional, keywords = parse_operands(substitute(card.operands, set_symbols))
+            if "PGM" in keywords:
+                current = [_step(card.name, keywords, _unquote(keywords["PGM"]), None)]
+            else:
+                called = _called_proc(positional, keywords)
+                expanded = local.expand(called, _call_symbols(keywords), set_symbols) if called else None
+                if expanded is None:
+                    current = [_step(card.name, keywords, None, called)]
+                    current[0]["unresolved"] = True
+                    job["unresolved_procs"].append(called)
+                else:
+                    current = [dict(step, name=card.name, dds=list(step["dds"])) for step in expanded]
+                    _apply_step_overrides(current, keywords)
+            job["steps"].extend(current)
+        elif operation == "DD" and current:
+            text = substitute(card.operands, set_symbols)
+            procstep, _, ddname = card.name.rpartition(".")
+            if procstep:
+                target = next((step for step in current if step.get("procstep") == procstep), None)
+                if target is None:
+                    continue
+            elif not ddname:
+                # Concatenated to the previous DD
+                ddname, target = last_ddname, last_target or current[0]
+            else:
+                # Unqualified DDs on a procedure call are added to its first step
+                target = current[0]
+            last_ddname, last_target = ddname, target
+            entry = _dd_entry(ddname, text, card.data is not None)
+            # An override replaces the procedure's DD of the same name; concatenations and new DDs are added
+            for position, dd in enumerate(target["dds"]):
+                if procstep and dd["ddname"] == ddname:
+                    target["dds"][position] = entry
+                    break
+            else:
+                target["dds"].append(entry)
+        elif operation == "NULL":
+            _resolve_references(job["steps"])
+            yield job
+            job = None
+
+    if job is not None:
+        _resolve_references(job["steps"])
+        yield job
+
+
+def _schedule(job_count: int, edges: Dict[Tuple[int, int], List[str]]) -> Tuple[List[List[int]], List[int]]:
+    """
+    Order jobs into waves by their dataset dependencies (Kahn's algorithm).
+
+    Returns:
+        (waves of job indices that can run once the previous waves finished,
+        indices of jobs on dependency cycles)
+    """
+    successors: List[List[int]] = [[] for _ in range(job_count)]
+    indegree = [0] * job_count
+    for source, target in edges:
+        successors[source].append(target)
+        indegree[target] += 1
+    wave = [index for index in range(job_count) if indegree[index] == 0]
+    waves = []
+    while wave:
+        waves.append(wave)
+        following = []
+        for source in wave:
+            for target in successors[source]:
+                indegree[target] -= 1
+                if indegree[target] == 0:
+                    following.append(target)
+        wave = sorted(following)
+    return waves, [index for index in range(job_count) if indegree[index] > 0]
+
+
+def build_jcl_graph(file_paths: List[Path]) -> Dict[str, Any]:
+    """
+    Build the job -> step -> program -> dataset graph of a project in one pass over its JCL members.
+
+    A job that reads a dataset (DISP SHR/OLD) depends on the job that writes it
+    (DISP NEW/MOD/OLD), which yields a run order in waves. Datasets written by
+    more than one job are listed as shared rather than ordered.
+
+    Args:
+        file_paths: JCL members; catalogued procedures are found among them by member name
+
+    Returns:
+        Dictionary with ``header`` (counts), ``jobs``, ``programs`` (program ->
+        step labels), ``datasets`` (dataset -> writer and reader step labels),
+        ``dependencies`` ([writer job, reader job, datasets]), ``shared_datasets``,
+        ``schedule`` and ``cyclic_jobs``
+    """
+    library = ProcLibrary({file_path.stem.upper(): file_path for file_path in file_paths})
+    jobs: List[Dict[str, Any]] = []
+    programs: Dict[str, List[str]] = {}
+    datasets: Dict[str, Dict[str, List]] = {}
+    job_ids: Set[str] = set()
+
+    for file_path in file_paths:
+        # Procedures already read for an earlier job need no second pass
+        if library.procs.get(file_path.stem.upper()) is not None:
+            continue
+        for job in iter_jcl_jobs(file_path, library):
+            job_id = job["name"] if job["name"] not in job_ids else f"{job['name']}@{job['member']}"
+            job_ids.add(job_id)
+            job["id"] = job_id
+            index = len(jobs)
+            jobs.append(job)
+            for step in job["steps"]:
+                label = f"{job_id}.{step['name']}" + (f".{step['procstep']}" if step.get("procstep") else "")
+                if step["program"]:
+                    programs.setdefault(step["program"], []).append(label)
+                for dd in step["dds"]:
+                    if "dataset" not in dd or dd.get("temporary") or "reference" in dd:
+                        continue
+                    entry = datasets.setdefault(dd["dataset"], {"writers": [], "readers": [], "jobs": [[], []]})
+                    if dd["access"] in ("write", "update"):
+                        entry["writers"].append(label)
+                        entry["jobs"][0].append(index)
+                    if dd["access"] in ("read", "update"):
+                        entry["readers"].append(label)
+                        entry["jobs"][1].append(index)
+
+    # Readers wait for the one job that writes a dataset; a dataset written by
+    # several jobs has no single producer and is reported as shared instead
+    edges: Dict[Tuple[int, int], List[str]] = {}
+    shared = []
+    for name, entry in datasets.items():
+        writers, readers = entry.pop("jobs")
+        writers = set(writers)
+        if len(writers) > 1:
+            shared.append(name)
+            continue
+        for writer in writers:
+            for reader in set(readers):
+                if reader != writer:
+                    edges.setdefault((writer, reader), []).append(name)
+    waves, cyclic = _schedule(len(jobs), edges)
+
+    header = {
+        "format": JCL_GRAPH_FORMAT,
+        "jobs": len(jobs),
+        "steps": sum(len(job["steps"]) for job in jobs),
+        "programs": len(programs),
+        "datasets": len(datasets),
+        "dependencies": len(edges),
+        "shared_datasets": len(shared),
+        "procedures": sum(proc is not None for proc in library.procs.values()),
+        "proc_expansions": library.misses,
+        "proc_expansion_hits": library.hits,
+        "unresolved_procs": sorted({name for job in jobs for name in job["unresolved_procs"]}),
+        "waves": len(waves),
+        "cyclic_jobs": len(cyclic)
+    }
+    return {
+        "header": header,
+        "jobs": jobs,
+        "programs": programs,
+        "datasets": datasets,
+        "dependencies": [[jobs[source]["id"], jobs[target]["id"], sorted(names)]
+                         for (source, target), names in sorted(edges.items())],
+        "shared_datasets": sorted(shared),
+        "schedule": [[jobs[index]["id"] for index in wave] for wave in waves],
+        "cyclic_jobs": [jobs[index]["id"] for index in cyclic]
+    }
+
+
+def jcl_graph_path(project_id: str) -> Path:
+    return Path(output_dir) / "analysis" / project_id / JCL_GRAPH_FILE
+
+
+def save_jcl_graph(project_id: str, graph: Dict[str, Any]) -> None:
+    """Persist the JCL graph of a project to output/analysis/<project_id>/jcl_graph.json."""
+    path = jcl_graph_path(project_id)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, mode='wb') as f:
+        f.write(dumps(graph))
+    os.replace(tmp_path, path)
+    logger.info(f"JCL graph saved to {path}: {graph['header']}")
+
+
+def load_jcl_graph(project_id: str) -> Optional[Dict[str, Any]]:
+    """Load the saved JCL graph of a project, or None when it is missing or from another format."""
+    path = jcl_graph_path(project_id)
+    if not path.exists():
+        return None
+    try:
+        with open(path, mode='rb') as f:
+            graph = loads(f.read())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable JCL graph {path}: {e}")
+        return None
+    if graph.get("header", {}).get("format") != JCL_GRAPH_FORMAT:
+        return None
+    return graph
@@ -0,0 +1,302 @@
+import mmap
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Union
+import numpy as np
+
+# Bytes folded and searched at a time; chunks end at a newline, so no keyword straddles two
+DEFAULT_CHUNK_SIZE = 1 << 20
+_NEWLINE = 10
+
+# Classification and database indicators, all found by one pass of indicator_scanner().
+# Category -> (keywords matched anywhere, keywords matched as whole words)
+SOURCE_INDICATORS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "cobol": ((), ("IDENTIFICATION DIVISION", "ID DIVISION", "ENVIRONMENT DIVISION", "DATA DIVISION",
+                   "PROCEDURE DIVISION", "PROGRAM-ID", "WORKING-STORAGE")),
+    "jcl": (("//", "JOB ", "EXEC PGM=", "DD DSN="), ()),
+    "copybook": ((), ("PIC", "PICTURE")),
+    "bms": (("DFHMSD", "DFHMDI", "DFHMDF"), ()),
+    "vsam": ((), ("DEFINE CLUSTER", "DEFINE AIX", "DEFINE ALTERNATEINDEX", "DEFINE PATH")),
+    "exec": ((), ("EXEC SQL", "EXEC SQLIMS", "EXEC DLI", "EXEC CICS")),
+    "call": ((), ("CALL",)),
+    "select": ((), ("SELECT",)),
+    "fd": ((), ("FD",)),
+    "file_io": ((), ("OPEN", "READ", "WRITE", "REWRITE", "START", "DELETE")),
+}
+
+
+def _word_table() -> np.ndarray:
+    table = np.zeros(256, dtype=bool)
+    for char in b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_":
+        table[char] = True
+    return table
+
+
+# Bytes that continue a COBOL word: a whole-word keyword may not touch one on either side
+_WORD_BYTES = _word_table()
+_COMMENT_INDICATORS = np.array([ord("*"), ord("/")], dtype=np.uint8)
+
+
+def _fold(data: np.ndarray, out: np.ndarray) -> None:
+    """ASCII upper-case ``data`` into ``out``; arithmetic is several times faster than a table lookup."""
+    np.subtract(data, ((data - 97) < 26).view(np.uint8) * np.uint8(32), out=out)
+
+
+class KeywordScanner:
+    """
+    Find a fixed set of keywords in one pass over a source, ignoring ASCII case.
+
+    The scan is a prefix filter followed by per-keyword verification, both
+    vectorized over chunks of about a MB: every offset is looked up once in a
+    64K-entry table of keyword two-byte prefixes, the candidates it leaves are
+    narrowed by their third byte, and only those are compared against the
+    keywords that start with their prefix. Bytes and mmap sources are searched
+    in place; str sources are encoded one chunk at a time.
+    """
+
+    def __init__(self, keywords: Iterable[str] = (), words: Iterable[str] = ()):
+        """
+        Args:
+            keywords: Keywords matched anywhere
+            words: Keywords matched only as whole COBOL words, i.e. not
+                preceded or followed by a letter, digit, hyphen or underscore
+        """
+        self.keywords: List[str] = []
+        self._patterns: List[bytes] = []
+        self._whole: List[bool] = []
+        for whole, group in ((False, keywords), (True, words)):
+            for keyword in group:
+                pattern = keyword.upper().encode("ascii")
+                if len(pattern) < 2 or b"\n" in pattern:
+                    raise ValueError(f"Keyword {keyword!r} must be at least two characters on one line")
+                if keyword.upper() not in self.keywords:
+                    self.keywords.append(keyword.upper())
+                    self._patterns.append(pattern)
+                    self._whole.append(whole)
+        # Keyword indexes by their first two bytes, as little-endian 16-bit codes
+        prefixes: Dict[int, List[int]] = {}
+        for index, pattern in enumerate(self._patterns):
+            prefixes.setdefault(pattern[0] | pattern[1] << 8, []).append(index)
+        # Group number (from 1) of every two-byte code, the third bytes each group
+        # allows and its keywords, padded with -1
+        self._group_of = np.zeros(1 << 16, dtype=np.uint16)
+        self._group_of[list(prefixes)] = np.arange(1, len(prefixes) + 1)
+        # A bool table is looked up and scanned for hits about twice as fast as the group numbers
+        self._candidates = self._group_of > 0
+        self._third = np.zeros((len(prefixes) + 1, 256), dtype=bool)
+        self._members = np.full((len(prefixes) + 1, max(map(len, prefixes.values()), default=1)), -1, dtype=np.int64)
+        for group, indexes in enumerate(prefixes.values(), 1):
+            self._members[group, :len(indexes)] = indexes
+            for index in indexes:
+                if len(self._patterns[index]) == 2:
+                    self._third[group] = True
+                else:
+                    self._third[group, self._patterns[index][2]] = True
+        # Keywords as zero-padded rows, so candidates are verified by window comparisons instead of byte loops
+        self._width = max(map(len, self._patterns), default=2)
+        self._rows = np.zeros((len(self._patterns), self._width), dtype=np.uint8)
+        self._used = np.zeros((len(self._patterns), self._width), dtype=bool)
+        for index, pattern in enumerate(self._patterns):
+            self._rows[index, :len(pattern)] = np.frombuffer(pattern, dtype=np.uint8)
+            self._used[index, :len(pattern)] = True
+        self._lengths = np.array([len(pattern) for pattern in self._patterns], dtype=np.int64)
+        self._whole_words = np.array(self._whole, dtype=bool)
+
+    def _scan_chunk(self, data: np.ndarray, folded: np.ndarray, fixed_comments: bool
+                    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Keyword indexes, offsets, line indexes and line start offsets of the matches in one chunk."""
+        size = len(data)
+        _fold(data, folded[:size])
+        # Zeros past the end complete the last byte pair and pad the last windows; no keyword contains one
+        folded[size:size + self._width + 1] = 0
+        even = folded[:(size + 1) // 2 * 2].view("<u2")
+        odd = folded[1:size // 2 * 2 + 1].view("<u2")
+        offsets = np.concatenate((np.flatnonzero(self._candidates[even]) * 2,
+                                  np.flatnonzero(self._candidates[odd]) * 2 + 1))
+        groups = self._group_of[folded[offsets].astype(np.uint16) | folded[offsets + 1].astype(np.uint16) << 8]
+        keep = self._third[groups, folded[offsets + 2]]
+        offsets, groups = offsets[keep], groups[keep]
+
+        # One (offset, keyword) pair per keyword of the candidate's group
+        members = self._members[groups]
+        offsets = np.repeat(offsets, members.shape[1])
+        keywords = members.ravel()
+        keep = keywords >= 0
+        offsets, keywords = offsets[keep], keywords[keep]
+        # Short windows first: most pairs fail within a few bytes, and only the rest pay for the long keywords
+        for columns in (slice(2, 6), slice(6, self._width)):
+            window = folded[offsets[:, None] + np.arange(self._width)[columns]]
+            keep = ((window == self._rows[keywords, columns]) | ~self._used[keywords, columns]).all(axis=1)
+            offsets, keywords = offsets[keep], keywords[keep]
+        # Whole words: chunks start at a line start and end at a newline or the end of the source
+        before = _WORD_BYTES[folded[np.maximum(offsets - 1, 0)]] & (offsets > 0)
+        after = _WORD_BYTES[folded[offsets + self._lengths[keywords]]]
+        keep = ~(self._whole_words[keywords] & (before | after))
+        offsets, keywords = offsets[keep], keywords[keep]
+
+        order = np.lexsort((keywords, offsets))
+        found_offsets, found_keywords = offsets[order], keywords[order]
+        newlines = np.flatnonzero(data == _NEWLINE)
+        lines = np.searchsorted(newlines, found_offsets)
+        if len(newlines):
+            line_starts = np.where(lines > 0, newlines[np.maximum(lines - 1, 0)] + 1, 0)
+        else:
+            line_starts = np.zeros_like(lines)
+        if fixed_comments:
+            # Fixed-format comment lines carry '*' or '/' in column 7, counted in bytes
+            indicators = line_starts + 6
+            comment = (indicators < found_offsets) & np.isin(folded[np.minimum(indicators, size)], _COMMENT_INDICATORS)
+            keep = ~comment
+            found_keywords, found_offsets, lines, line_starts = (
+                found_keywords[keep], found_offsets[keep], lines[keep], line_starts[keep])
+        return found_keywords, found_offsets, lines, line_starts
+
+    def _iter_byte_chunks(self, source: Union[bytes, bytearray, mmap.mmap], chunk_size: int
+                          ) -> Iterator[Tuple[int, np.ndarray]]:
+        data = np.frombuffer(source, dtype=np.uint8)
+        size = len(data)
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                cut = source.rfind(b"\n", start, end)
+                end = cut + 1 if cut >= 0 else (source.find(b"\n", end) + 1 or size)
+            yield start, data[start:end]
+            start = end
+
+    def _iter_chunks(self, source: Union[str, bytes, bytearray, mmap.mmap], chunk_size: int
+                     ) -> Iterator[Tuple[int, np.ndarray, Union[str, None]]]:
+        """(start offset, chunk bytes, chunk text or None) per chunk of ``source``."""
+        if not isinstance(source, str):
+            for start, data in self._iter_byte_chunks(source, chunk_size):
+                yield start, data, None
+            return
+        size = len(source)
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                end = source.find("\n", end) + 1 or size
+            text = source[start:end]
+            yield start, np.frombuffer(text.encode("utf-8", "surrogatepass"), dtype=np.uint8), text
+            start = end
+
+    def _iter_chunk_matches(self, source: Union[str, bytes, bytearray, mmap.mmap], fixed_comments: bool,
+                            chunk_size: int) -> Iterator[Tuple[int, int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """(start offset, lines before it, keyword indexes, offsets, line indexes, line starts) per chunk."""
+        folded = np.empty(chunk_size + self._width + 1, dtype=np.uint8)
+        line_base = 0
+        for start, data, text in self._iter_chunks(source, chunk_size):
+            if len(data) + self._width + 1 > len(folded):
+                folded = np.empty(len(data) + self._width + 1, dtype=np.uint8)
+            keywords, offsets, lines, line_starts = self._scan_chunk(data, folded, fixed_comments)
+            if text is not None and len(offsets) and not text.isascii():
+                # UTF-8 byte offsets -> character offsets: drop the continuation bytes before each offset
+                continuation = np.concatenate(([0], np.cumsum((data & 0xC0) == 0x80)))
+                offsets = offsets - continuation[offsets]
+                line_starts = line_starts - continuation[line_starts]
+            yield start, line_base, keywords, offsets, lines, line_starts
+            line_base += int(np.count_nonzero(data == _NEWLINE))
+
+    def finditer(self, source: Union[str, bytes, bytearray, mmap.mmap], fixed_comments: bool = False,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, int, int, int]]:
+        """
+        Yield the keyword matches of ``source`` lazily, in source order.
+
+        Matches are produced a chunk at a time, so a caller that stops at the
+        first interesting match never scans the rest of the source.
+
+        Args:
+            source: Text, bytes or an mmap of the source
+            fixed_comments: Skip matches on fixed-format comment lines ('*' or
+                '/' in the seventh byte of the line)
+            chunk_size: Approximate bytes scanned per chunk
+
+        Returns:
+            (keyword, offset, line, column) per match. Offsets and columns
+            count characters for str sources and bytes otherwise; lines and
+            columns are 1-based.
+        """
+        for start, line_base, keywords, offsets, lines, line_starts in self._iter_chunk_matches(
+                source, fixed_comments, chunk_size):
+            for keyword, offset, line, line_start in zip(keywords.tolist(), offsets.tolist(),
+                                                         lines.tolist(), line_starts.tolist()):
+                yield self.keywords[keyword], start + offset, line_base + line + 1, offset - line_start + 1
+
+    def found(self, source: Union[str, bytes, bytearray, mmap.mmap], fixed_comments: bool = False,
+              until: Iterable[str] = (), chunk_size: int = DEFAULT_CHUNK_SIZE) -> Set[str]:
+        """
+        The keywords that occur in ``source``, without materializing each match.
+
+        Args:
+            source, fixed_comments, chunk_size: As for finditer
+            until: Keywords that end the scan after the chunk they turn up in,
+                for callers that only need to know one of them is there
+        """
+        stop = {self.keywords.index(keyword.upper()) for keyword in until}
+        seen: Set[int] = set()
+        for _, _, keywords, _, _, _ in self._iter_chunk_matches(source, fixed_comments, chunk_size):
+            seen.update(np.unique(keywords).tolist())
+            if not stop.isdisjoint(seen):
+                break
+        return {self.keywords[index] for index in seen}
+
+    def found_in_parts(self, parts: Iterable[Union[str, bytes]], fixed_comments: bool = False,
+                       batch_size: int = DEFAULT_CHUNK_SIZE) -> List[Set[str]]:
+        """
+        The keywords that occur in each of many small sources, e.g. file prefixes.
+
+        Parts are joined by newlines into batches of about ``batch_size`` bytes
+        and each batch is scanned at once, so thousands of parts cost a few
+        scans rather than one each.
+        """
+        results: List[Set[str]] = []
+        folded = np.empty(batch_size + self._width + 1, dtype=np.uint8)
+        batch: List[bytes] = []
+        batch_bytes = 0
+
+        def flush() -> None:
+            nonlocal folded
+            joined = b"\n".join(batch)
+            if len(joined) + self._width + 1 > len(folded):
+                folded = np.empty(len(joined) + self._width + 1, dtype=np.uint8)
+            keywords, offsets, _, _ = self._scan_chunk(np.frombuffer(joined, dtype=np.uint8), folded, fixed_comments)
+            starts = np.cumsum([0] + [len(data) + 1 for data in batch[:-1]])
+            owners = np.searchsorted(starts, offsets, side="right") - 1
+            first = len(results)
+            results.extend(set() for _ in batch)
+            for pair in np.unique(owners * len(self.keywords) + keywords).tolist():
+                results[first + pair // len(self.keywords)].add(self.keywords[pair % len(self.keywords)])
+            batch.clear()
+
+        for part in parts:
+            data = part.encode("utf-8", "surrogatepass") if isinstance(part, str) else bytes(part)
+            batch.append(data)
+            batch_bytes += len(data) + 1
+            if batch_bytes >= batch_size:
+                flush()
+                batch_bytes = 0
+        if batch:
+            flush()
+        return results
+
+    def scan(self, source: Union[str, bytes, bytearray, mmap.mmap], fixed_comments: bool = False,
+             chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Tuple[str, int, int, int]]:
+        """All (keyword, offset, line, column) matches of ``source``, see finditer."""
+        return list(self.finditer(source, fixed_comments, chunk_size))
+
+
+@lru_cache(maxsize=1)
+def indicator_scanner() -> KeywordScanner:
+    """The shared scanner for every keyword of SOURCE_INDICATORS."""
+    keywords = [keyword for anywhere, _ in SOURCE_INDICATORS.values() for keyword in anywhere]
+    words = [keyword for _, whole in SOURCE_INDICATORS.values() for keyword in whole]
+    return KeywordScanner(keywords, words)
+
+
+@lru_cache(maxsize=None)
+def indicator_category(keyword: str) -> str:
+    """SOURCE_INDICATORS category of a keyword reported by indicator_scanner()."""
+    for category, (anywhere, whole) in SOURCE_INDICATORS.items():
+        if keyword in anywhere or keyword in whole:
+            return category
+    raise KeyError(keyword)
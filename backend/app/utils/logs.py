@@ -96,6 +96,14 @@ def log_request_details(endpoint_name, request_data):
         code_preview = safe_data['sourceCode'][:200] + "..." if len(safe_data['sourceCode']) > 200 else safe_data['sourceCode']
         logger.info(f"Source Code Preview: {code_preview}")
         logger.info(f"Source Code Length: {len(safe_data['sourceCode'])} characters")
+
+    if 'file_data' in safe_data:
+        # Summarized rather than copied into the log with every source
+        file_data = safe_data['file_data']
+        if isinstance(file_data, dict):
+            safe_data['file_data'] = f"<{len(file_data)} files: {', '.join(map(str, list(file_data)[:20]))}>"
+        else:
+            safe_data['file_data'] = f"<{len(str(file_data))} characters>"
     
     logger.info(f"Full Request Data: {json.dumps(safe_data, indent=2, default=str)}")
 
@@ -0,0 +1,446 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from ..config import logger, output_dir
+from .analysis_model import dumps, loads
+
+# One database for all projects; every table is keyed by project_id first
+PROJECT_STORE_FILE = "project_store.db"
+# Bump whenever the schema below changes incompatibly
+STORE_SCHEMA_VERSION = 3
+
+# Stage outputs and the JSON files they were written to before the store existed
+STAGE_FILES = {
+    "cobol_analysis": "cobol_analysis.json",
+    "target_structure": "target_structure.json",
+    "reverse_engineering": "reverse_engineering_analysis.json",
+    "business_requirements": "business_requirements.json",
+    "technical_requirements": "technical_requirements.json",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    project_id TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    analyzer_version TEXT NOT NULL,
+    model BLOB NOT NULL,
+    structure BLOB,
+    PRIMARY KEY (project_id, file_path)
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    project_id TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    picture TEXT NOT NULL,
+    usage TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS symbols_by_name ON symbols (project_id, name);
+CREATE INDEX IF NOT EXISTS symbols_by_file ON symbols (project_id, file_path);
+CREATE TABLE IF NOT EXISTS exec_blocks (
+    project_id TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    verb TEXT NOT NULL,
+    paragraph TEXT,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER NOT NULL,
+    details BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS exec_blocks_by_file ON exec_blocks (project_id, file_path, line);
+CREATE INDEX IF NOT EXISTS exec_blocks_by_verb ON exec_blocks (project_id, kind, verb);
+CREATE TABLE IF NOT EXISTS exec_names (
+    project_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    role TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    line INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS exec_names_by_name ON exec_names (project_id, name);
+CREATE INDEX IF NOT EXISTS exec_names_by_file ON exec_names (project_id, file_path);
+CREATE TABLE IF NOT EXISTS layouts (
+    project_id TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    member TEXT NOT NULL,
+    layout BLOB NOT NULL,
+    PRIMARY KEY (project_id, file_path)
+);
+CREATE INDEX IF NOT EXISTS layouts_by_member ON layouts (project_id, member);
+CREATE TABLE IF NOT EXISTS stages (
+    project_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    document BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (project_id, stage)
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    project_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (project_id, key)
+);
+"""
+
+# Tables filled from the uploaded sources by create_cobol_json, safe to drop on a schema change
+_DERIVED_TABLES = ("files", "symbols", "exec_blocks", "exec_names", "layouts")
+
+_local = threading.local()
+
+
+def store_path() -> Path:
+    return Path(output_dir) / "analysis" / PROJECT_STORE_FILE
+
+
+def connect() -> sqlite3.Connection:
+    """
+    Return this thread's connection to the project store, creating the schema on first use.
+
+    The database runs in WAL mode, so status requests keep reading while an
+    analysis writes; connections are not shared between threads.
+    """
+    path = store_path()
+    connection = getattr(_local, "connection", None)
+    if connection is not None and _local.path == path:
+        return connection
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+    connection = sqlite3.connect(str(path), timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    (version,) = connection.execute("PRAGMA user_version").fetchone()
+    if version != STORE_SCHEMA_VERSION:
+        if version:
+            # Only the tables the next analysis rebuilds are dropped; stages hold LLM outputs that
+            # exist nowhere else, so they and the metadata are kept (a change to their layout needs a migration)
+            logger.info(f"Project store {path} has schema {version}, recreating its derived tables")
+            with connection:
+                for table in _DERIVED_TABLES:
+                    connection.execute(f"DROP TABLE IF EXISTS {table}")
+        with connection:
+            connection.executescript(_SCHEMA)
+            connection.execute(f"PRAGMA user_version={STORE_SCHEMA_VERSION}")
+    _local.connection, _local.path = connection, path
+    return connection
+
+
+def load_file_models(project_id: str, analyzer_version: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-file analysis models of a project.
+
+    Returns:
+        Project-relative path -> {"sha256", "model"}; rows written by another
+        analyzer version are left out
+    """
+    rows = connect().execute(
+        "SELECT file_path, sha256, model FROM files WHERE project_id = ? AND analyzer_version = ?",
+        (project_id, analyzer_version))
+    return {file_path: {"sha256": sha256, "model": loads(model)} for file_path, sha256, model in rows}
+
+
+def load_file_structures(project_id: str, analyzer_version: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-file AST, call-graph flow, symbols, record layouts, segments and EXEC blocks of a project.
+
+    Returns:
+        Project-relative path -> {"sha256", "ast", "flow", "symbols", "layouts", "segments", "exec_blocks"}
+    """
+    rows = connect().execute(
+        "SELECT file_path, sha256, structure FROM files "
+        "WHERE project_id = ? AND analyzer_version = ? AND structure IS NOT NULL",
+        (project_id, analyzer_version))
+    return {file_path: {"sha256": sha256, **loads(structure)} for file_path, sha256, structure in rows}
+
+
+def iter_file_asts(project_id: str, analyzer_version: str) -> Iterator[Tuple[str, List[Any]]]:
+    """
+    AST records (cobol_parser.ast_to_record) of a project's files, one file at a time.
+
+    Unlike cobol_parser.load_project_ast, each row is decoded as it is
+    fetched, so only one file's structure is in memory at once.
+    """
+    rows = connect().execute(
+        "SELECT file_path, structure FROM files "
+        "WHERE project_id = ? AND analyzer_version = ? AND structure IS NOT NULL ORDER BY file_path",
+        (project_id, analyzer_version))
+    for file_path, structure in rows:
+        ast = loads(structure)["ast"]
+        if ast is not None:
+            yield file_path, ast
+
+
+def update_file_analyses(project_id: str, analyzer_version: str, models: Dict[str, Dict[str, Any]],
+                         structures: Dict[str, Dict[str, Any]], removed: Iterable[str] = ()) -> None:
+    """
+    Write the rows, symbol definitions and EXEC blocks of re-analyzed files in one transaction.
+
+    Rows of other files are left as they are, so re-analyzing one file of a
+    large project rewrites one row; rows written by another analyzer version
+    are dropped.
+
+    Args:
+        project_id: Project identifier
+        analyzer_version: Version the rows were produced by
+        models: Project-relative path -> {"sha256", "model"}
+        structures: Project-relative path -> {"ast", "flow", "symbols", "layouts", "segments", "exec_blocks"}
+        removed: Paths whose rows are deleted, e.g. files no longer in the project
+    """
+    rows = []
+    symbol_rows = []
+    block_rows = []
+    name_rows = []
+    for file_path, entry in models.items():
+        structure = structures.get(file_path)
+        rows.append((project_id, file_path, entry["model"][2], entry["sha256"], analyzer_version,
+                     dumps(entry["model"]),
+                     None if structure is None else dumps({
+                         "ast": structure["ast"], "flow": structure["flow"], "symbols": structure["symbols"],
+                         "layouts": structure["layouts"], "segments": structure["segments"],
+                         "exec_blocks": structure["exec_blocks"]
+                     })))
+        if structure is not None and structure["symbols"] is not None:
+            for name, level, picture, usage, _, start, end, line in structure["symbols"][0]:
+                symbol_rows.append((project_id, file_path, name, level, picture, usage, line, start, end))
+        if structure is not None and structure["exec_blocks"] is not None:
+            for kind, verb, paragraph, line, end_line, start, end, tables, cursors, host_variables, resources in structure["exec_blocks"]:
+                block_rows.append((project_id, file_path, line, end_line, kind, verb, paragraph, start, end,
+                                   dumps([tables, cursors, host_variables, resources])))
+                names = ([(name, "table") for name in tables] + [(name, "cursor") for name in cursors]
+                         + [(name, "host_variable") for name in host_variables] + [(name, role) for role, name in resources])
+                name_rows.extend((project_id, name, role, file_path, line) for name, role in names)
+    stale = [(project_id, file_path) for file_path in set(removed) | set(models)]
+
+    connection = connect()
+    with connection:
+        outdated = connection.execute("DELETE FROM files WHERE project_id = ? AND analyzer_version != ?",
+                                      (project_id, analyzer_version)).rowcount
+        for table in ("files", "symbols", "exec_blocks", "exec_names"):
+            if outdated and table != "files":
+                connection.execute(
+                    f"DELETE FROM {table} WHERE project_id = ? AND file_path NOT IN "
+                    "(SELECT file_path FROM files WHERE project_id = ?)", (project_id, project_id))
+            connection.executemany(f"DELETE FROM {table} WHERE project_id = ? AND file_path = ?", stale)
+        connection.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        connection.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", symbol_rows)
+        connection.executemany("INSERT INTO exec_blocks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", block_rows)
+        connection.executemany("INSERT INTO exec_names VALUES (?, ?, ?, ?, ?)", name_rows)
+    logger.info(f"Stored {len(rows)} files, {len(symbol_rows)} symbol definitions and {len(block_rows)} "
+                f"EXEC blocks for project {project_id}")
+
+
+def load_file_model(project_id: str, file_path: str) -> Optional[List[Any]]:
+    """The analysis model record (see analysis_model.model_to_record) of one file, or None."""
+    row = connect().execute("SELECT model FROM files WHERE project_id = ? AND file_path = ?",
+                            (project_id, file_path)).fetchone()
+    return loads(row[0]) if row else None
+
+
+def find_symbol_definitions(project_id: str, name: str) -> List[Dict[str, Any]]:
+    """Definitions of a data name across the files of a project, in file and line order."""
+    rows = connect().execute(
+        "SELECT file_path, level, picture, usage, line, start_offset, end_offset FROM symbols "
+        "WHERE project_id = ? AND name = ? ORDER BY file_path, line",
+        (project_id, name))
+    return [
+        {"file": file_path, "level": level, "picture": picture, "usage": usage,
+         "line": line, "start": start, "end": end}
+        for file_path, level, picture, usage, line, start, end in rows
+    ]
+
+
+def find_exec_blocks(project_id: str, kind: Optional[str] = None, verb: Optional[str] = None,
+                     name: Optional[str] = None, file_path: Optional[str] = None,
+                     paragraph: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    EXEC SQL/CICS/DLI blocks of a project (see exec_blocks.extract_exec_blocks), in file and line order.
+
+    Args:
+        project_id: Project identifier
+        kind: SQL, CICS, DLI or SQLIMS
+        verb: Statement or command, e.g. SELECT, DECLARE CURSOR, READ or SEND MAP
+        name: A table, cursor, host variable or resource the block uses
+        file_path: Project-relative path of one member
+        paragraph: Enclosing paragraph or section
+        limit: Most blocks returned
+
+    Returns:
+        One dictionary per block: file, line, end_line, kind, verb, paragraph,
+        start and end byte offsets, tables, cursors, host_variables, resources
+    """
+    conditions, parameters = ["project_id = ?"], [project_id]
+    for column, value in (("kind", kind), ("verb", verb), ("file_path", file_path), ("paragraph", paragraph)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            parameters.append(value)
+    if name is not None:
+        conditions.append("(file_path, line) IN (SELECT file_path, line FROM exec_names WHERE project_id = ? AND name = ?)")
+        parameters += [project_id, name]
+    sql = ("SELECT file_path, line, end_line, kind, verb, paragraph, start_offset, end_offset, details "
+           f"FROM exec_blocks WHERE {' AND '.join(conditions)} ORDER BY file_path, line")
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    blocks = []
+    for file_path, line, end_line, kind, verb, paragraph, start, end, details in connect().execute(sql, parameters):
+        tables, cursors, host_variables, resources = loads(details)
+        blocks.append({"file": file_path, "line": line, "end_line": end_line, "kind": kind, "verb": verb,
+                       "paragraph": paragraph, "start": start, "end": end, "tables": tables, "cursors": cursors,
+                       "host_variables": host_variables, "resources": resources})
+    return blocks
+
+
+def exec_block_summary(project_id: str) -> Dict[str, Any]:
+    """Counts of a project's EXEC blocks by kind and verb, and of the distinct tables they use."""
+    connection = connect()
+    by_kind: Dict[str, Dict[str, int]] = {}
+    for kind, verb, count in connection.execute(
+            "SELECT kind, verb, count(*) FROM exec_blocks WHERE project_id = ? GROUP BY kind, verb", (project_id,)):
+        by_kind.setdefault(kind, {})[verb] = count
+    (tables,) = connection.execute(
+        "SELECT count(DISTINCT name) FROM exec_names WHERE project_id = ? AND role = 'table'", (project_id,)).fetchone()
+    return {
+        "blocks": sum(sum(verbs.values()) for verbs in by_kind.values()),
+        "by_kind": by_kind,
+        "tables": tables
+    }
+
+
+def save_layouts(project_id: str, layouts: Dict[str, Any]) -> None:
+    """
+    Replace the compiled record layouts of a project.
+
+    Args:
+        project_id: Project identifier
+        layouts: Project-relative path -> layout document (see record_layout);
+            the member name is the file name without its extension
+    """
+    rows = [(project_id, file_path, Path(file_path).stem.upper(), dumps(layout)) for file_path, layout in layouts.items()]
+    connection = connect()
+    with connection:
+        connection.execute("DELETE FROM layouts WHERE project_id = ?", (project_id,))
+        connection.executemany("INSERT INTO layouts VALUES (?, ?, ?, ?)", rows)
+
+
+def load_layout_blob(project_id: str, file_path: str, member: str) -> Optional[Tuple[str, bytes]]:
+    """
+    The serialized layout document of one file, found by path or else by member name.
+
+    When several files share the member name, copybooks (.cpy) win.
+
+    Returns:
+        (file path, document bytes) or None
+    """
+    return connect().execute(
+        "SELECT file_path, layout FROM layouts WHERE project_id = ? AND (file_path = ? OR member = ?) "
+        "ORDER BY file_path = ? DESC, lower(file_path) LIKE '%.cpy' DESC, file_path LIMIT 1",
+        (project_id, file_path, member, file_path)).fetchone()
+
+
+def save_stage(project_id: str, stage: str, document: Any) -> None:
+    """
+    Store the output of an analysis stage (one of STAGE_FILES), replacing the previous one.
+
+    ``document`` is JSON-serializable, or already serialized to JSON bytes.
+    """
+    if stage not in STAGE_FILES:
+        raise ValueError(f"Unknown analysis stage: {stage}")
+    blob = document if isinstance(document, bytes) else dumps(document)
+    connection = connect()
+    with connection:
+        connection.execute("INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?)",
+                           (project_id, stage, blob, time.time()))
+
+
+def load_stage(project_id: str, stage: str) -> Optional[Any]:
+    """
+    Load one stage output of a project.
+
+    Projects analyzed before the store existed fall back to the stage's JSON
+    file under output/analysis/<project_id>.
+
+    Returns:
+        The stored document, or None when the stage has not run
+    """
+    if stage not in STAGE_FILES:
+        raise ValueError(f"Unknown analysis stage: {stage}")
+    row = connect().execute("SELECT document FROM stages WHERE project_id = ? AND stage = ?",
+                            (project_id, stage)).fetchone()
+    if row:
+        return loads(row[0])
+    legacy_path = Path(output_dir) / "analysis" / project_id / STAGE_FILES[stage]
+    if legacy_path.exists():
+        with open(legacy_path, mode='rb') as f:
+            return loads(f.read())
+    return None
+
+
+def load_stages(project_id: str, stages: Iterable[str]) -> Dict[str, Any]:
+    """Load several stage outputs; stages that have not run are left out."""
+    documents = {}
+    for stage in stages:
+        document = load_stage(project_id, stage)
+        if document is not None:
+            documents[stage] = document
+    return documents
+
+
+def stage_status(project_id: str) -> Dict[str, Dict[str, Any]]:
+    """
+    When each stage of a project last ran and the size of its output, without reading the outputs.
+
+    Stages that only exist as legacy JSON files are reported with their file's
+    modification time.
+    """
+    status = {}
+    rows = connect().execute(
+        "SELECT stage, updated_at, length(document) FROM stages WHERE project_id = ?", (project_id,))
+    for stage, updated_at, size in rows:
+        status[stage] = {"updated_at": updated_at, "bytes": size}
+    for stage, file_name in STAGE_FILES.items():
+        legacy_path = Path(output_dir) / "analysis" / project_id / file_name
+        if stage not in status and legacy_path.exists():
+            stat = legacy_path.stat()
+            status[stage] = {"updated_at": stat.st_mtime, "bytes": stat.st_size}
+    return status
+
+
+def set_metadata(project_id: str, values: Dict[str, Any]) -> None:
+    """Store JSON-serializable metadata values of a project by key."""
+    connection = connect()
+    with connection:
+        connection.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?)",
+                               [(project_id, key, dumps(value)) for key, value in values.items()])
+
+
+def get_metadata(project_id: str, keys: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Metadata of a project, limited to ``keys`` when given."""
+    rows = connect().execute("SELECT key, value FROM metadata WHERE project_id = ?", (project_id,))
+    wanted = set(keys) if keys is not None else None
+    return {key: loads(value) for key, value in rows if wanted is None or key in wanted}
+
+
+def project_status(project_id: str) -> Dict[str, Any]:
+    """
+    Summary of what the store holds for a project: file counts by type, symbol
+    definitions, stage status and metadata. Only counts and small values are read.
+    """
+    connection = connect()
+    file_types = dict(connection.execute(
+        "SELECT file_type, count(*) FROM files WHERE project_id = ? GROUP BY file_type", (project_id,)))
+    (symbol_count,) = connection.execute(
+        "SELECT count(*) FROM symbols WHERE project_id = ?", (project_id,)).fetchone()
+    return {
+        "project_id": project_id,
+        "files": sum(file_types.values()),
+        "file_types": file_types,
+        "symbol_definitions": symbol_count,
+        "stages": stage_status(project_id),
+        "metadata": get_metadata(project_id)
+    }
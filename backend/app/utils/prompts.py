@@ -1,6 +1,8 @@
 """
 Module for generating prompts for code analysis and conversion.
 """
+from .cobol_parser import PARAGRAPH, STATEMENT, EXEC, ENTRY, FILE_DESCRIPTION
+
 def create_target_structure_prompt( source_code):
     """
     Creates a prompt for analyzing COBOL code and all related artifacts (JCL, VSAM, Copybooks, BMS Maps, Control Files, CICS screens/sections) to generate a comprehensive target .NET 8 WebAPI project structure.
@@ -101,13 +103,62 @@ def create_target_structure_prompt( source_code):
  
     """
  
-def create_business_requirements_prompt(source_language, source_code):
+def create_program_structure_summary(asts):
+    """
+    Summarizes parsed COBOL programs for the requirement prompts.
+
+    Lists, per program, its files and records and, per paragraph, the
+    paragraphs it performs, the programs it calls, its file I/O and its
+    EXEC SQL/CICS blocks, all taken from the statement-level AST.
+
+    Args:
+        asts (dict): Project-relative file path -> AST root, as returned by
+            cobol_parser.load_project_ast, or an iterable of (path, AST root)
+            pairs, which is summarized one program at a time
+
+    Returns:
+        str: Plain-text outline, empty when there is nothing to summarize
+    """
+    summary = []
+    for path, ast in (asts.items() if isinstance(asts, dict) else asts):
+        files = [node.name for node in ast.walk(FILE_DESCRIPTION)]
+        records = [node.name for node in ast.walk(ENTRY) if node.level == 1]
+        paragraphs = []
+        for paragraph in ast.walk(PARAGRAPH):
+            actions = []
+            for node in paragraph.walk():
+                action = None
+                if node.kind == EXEC:
+                    action = f"EXEC {node.name} {' '.join(node.operands[:1])}".rstrip()
+                elif node.kind == STATEMENT and node.operands and node.name in ("PERFORM", "CALL", "GO"):
+                    target = node.operands[1] if node.name == "GO" and node.operands[0] == "TO" and len(node.operands) > 1 else node.operands[0]
+                    action = f"{node.name} {target}"
+                elif node.kind == STATEMENT and node.operands and node.name in ("OPEN", "READ", "WRITE", "REWRITE", "DELETE", "START"):
+                    action = f"{node.name} {node.operands[-1] if node.name == 'OPEN' else node.operands[0]}"
+                if action and action not in actions:
+                    actions.append(action)
+            if actions:
+                paragraphs.append(f"    {paragraph.name}: {'; '.join(actions)}")
+        if not (files or records or paragraphs):
+            continue
+        summary.append(f"PROGRAM {ast.name} ({path})")
+        if files:
+            summary.append(f"  Files: {', '.join(files)}")
+        if records:
+            summary.append(f"  Records: {', '.join(records)}")
+        if paragraphs:
+            summary.append("  Paragraphs:")
+            summary.extend(paragraphs)
+    return "\n".join(summary)
+ 
+def create_business_requirements_prompt(source_language, source_code, program_structure=""):
     """
     Creates a prompt for analyzing business requirements from source code.
  
     Args:
         source_language (str): The programming language of the source code
         source_code (str): The source code to analyze
+        program_structure (str): Optional outline from create_program_structure_summary
  
     Returns:
         str: The prompt for business requirements analysis
@@ -115,7 +166,7 @@ def create_business_requirements_prompt(source_language, source_code):
     return f"""
             You are a business analyst responsible for analyzing and documenting the business requirements from the following {source_language} code. Your task is to interpret the code's intent and extract meaningful business logic suitable for non-technical stakeholders.
  
-            The code may be written in a legacy language like COBOL, possibly lacking comments or modern structure. You must infer business rules by examining variable names, control flow, data manipulation, and any input/output operations. Focus only on business intent—do not describe technical implementation.
+            The code may be written in a legacy language like COBOL, possibly lacking comments or modern structure. You must infer business rules by examining variable names, control flow, data manipulation, and any input/output operations. Focus only on business intent; do not describe technical implementation.
  
             ### Output Format Instructions:
             - Use plain text headings and paragraphs with the following structure:
@@ -161,12 +212,12 @@ def create_business_requirements_prompt(source_language, source_code):
             ### Describe the main outputs (e.g., reports, logs, updates).
             ## Business Significance
             ### Explain why these outputs matter for business processes.
- 
+            {_program_structure_section(program_structure)}
             {source_language} Code:
             {source_code}
             """
  
-def create_technical_requirements_prompt(source_language, target_language, source_code):
+def create_technical_requirements_prompt(source_language, target_language, source_code, program_structure=""):
     """
     Creates a prompt for analyzing technical requirements from source code.
  
@@ -174,6 +225,7 @@ def create_technical_requirements_prompt(source_language, target_language, sourc
         source_language (str): The programming language of the source code
         target_language (str): The target programming language for conversion (.NET 8)
         source_code (str): The source code to analyze
+        program_structure (str): Optional outline from create_program_structure_summary
  
     Returns:
         str: The prompt for technical requirements analysis
@@ -204,11 +256,19 @@ def create_technical_requirements_prompt(source_language, target_language, sourc
  
             Format your response as a numbered list with '# Technical Requirements' as the title.
             Each requirement should start with a number followed by a period (e.g., "1.", "2.", etc.)
- 
+            {_program_structure_section(program_structure)}
             {source_language} Code:
             {source_code}
             """
  
+def _program_structure_section(program_structure):
+    if not program_structure:
+        return ""
+    return f"""
+            Program Structure (parsed paragraphs, control flow, files and embedded SQL/CICS):
+            {program_structure}
+"""
+
 def create_cobol_to_dotnet_conversion_prompt():
     """
     Creates a comprehensive prompt for converting COBOL code to .NET 8 WebAPI with Entity Framework Core.
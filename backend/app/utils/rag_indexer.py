@@ -9,6 +9,8 @@ from langchain_community.vectorstores import FAISS
 from langchain.schema import Document
 from langchain_openai import AzureOpenAIEmbeddings
 from ..config import logger, AZURE_CONFIG, output_dir
+from .source_reader import read_source
+from .embedding_cache import embed_texts_cached
 import PyPDF2
 from docx import Document as DocxDocument
 
@@ -44,6 +46,12 @@ def test_embedding_service():
         logger.error(f"Embedding test failed: {str(e)}")
         return False
 
+def _require_embedding_service():
+    """Raise ValueError unless the embedding service answers a test request."""
+    if not test_embedding_service():
+        logger.error("Embedding service is not available")
+        raise ValueError("Embedding service is not available")
+
 def extract_text_from_file(file_path: Path) -> str:
     """Extract text from PDF, DOC, DOCX, or TXT files."""
     logger.info(f"Extracting text from file: {file_path}")
@@ -65,20 +73,48 @@ def extract_text_from_file(file_path: Path) -> str:
             doc = DocxDocument(file_path)
             return "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
         elif file_path.suffix.lower() == ".txt":
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                return f.read()
+            return read_source(file_path, record_format="newline")
     except Exception as e:
         logger.error(f"Error extracting text from {file_path}: {str(e)}")
         return ""
 
+def _embed_into_vector_store(output_dir: Path, chunks: List[Document]):
+    """
+    Embed chunks through the embedding cache and add them to the FAISS index in ``output_dir``.
+
+    Only chunks the cache does not hold are sent to the embedding service,
+    which is checked first; re-indexing unchanged content makes no embedding
+    calls. The index is created when it does not exist yet. Embedding happens
+    before the index is touched, so a failed embedding leaves the saved index
+    as it was.
+
+    Returns:
+        (vector store, embedding stats from embed_texts_cached)
+    """
+    texts = [chunk.page_content for chunk in chunks]
+    vectors, stats = embed_texts_cached(embedding_client, texts, before_embedding=_require_embedding_service)
+    text_embeddings = list(zip(texts, vectors))
+    metadatas = [chunk.metadata for chunk in chunks]
+    try:
+        vector_store = FAISS.load_local(
+            str(output_dir),
+            embedding_client,
+            allow_dangerous_deserialization=True
+        )
+    except Exception:
+        vector_store = None
+    if vector_store is not None:
+        vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+        logger.info(f"Updated existing vector store in {output_dir}")
+    else:
+        vector_store = FAISS.from_embeddings(text_embeddings, embedding_client, metadatas=metadatas)
+        logger.info(f"Created new vector store in {output_dir}")
+    return vector_store, stats
+
 def index_standards_document(project_id: str, file_path: Path):
     """Index a standards document into a FAISS vector store."""
     logger.info(f"Indexing standards document for project: {project_id}, file: {file_path}")
     
-    if not test_embedding_service():
-        logger.error("Embedding service is not available")
-        raise ValueError("Embedding service is not available")
-    
     output_dir = STANDARDS_RAG_DIR / project_id / "faiss_index"
     output_dir.mkdir(parents=True, exist_ok=True)
     
@@ -105,17 +141,8 @@ def index_standards_document(project_id: str, file_path: Path):
     chunks = text_splitter.split_documents([document])
     logger.info(f"Split standards document into {len(chunks)} chunks")
     
-    try:
-        vector_store = FAISS.load_local(
-            str(output_dir),
-            embedding_client,
-            allow_dangerous_deserialization=True
-        )
-        vector_store.add_documents(chunks)
-        logger.info(f"Updated existing standards vector store for project: {project_id}")
-    except Exception:
-        vector_store = FAISS.from_documents(chunks, embedding_client)
-        logger.info(f"Created new standards vector store for project: {project_id}")
+    vector_store, embedding_stats = _embed_into_vector_store(output_dir, chunks)
+    logger.info(f"Embedded standards document for project {project_id} at {embedding_stats['chunks_per_second']} chunks/s")
     
     try:
         vector_store.save_local(str(output_dir))
@@ -130,6 +157,7 @@ def index_standards_document(project_id: str, file_path: Path):
         "total_documents": 1,
         "total_chunks": len(chunks),
         "embedding_model": AZURE_CONFIG["AZURE_OPENAI_EMBED_MODEL"],
+        "embedding": embedding_stats,
         "created_at": datetime.now().isoformat(),
     }
     
@@ -142,10 +170,6 @@ def index_files_for_rag(project_id: str, cobol_json: Dict[str, Any], file_data:
     """Index COBOL files and analysis JSON for RAG."""
     logger.info(f"Indexing files for RAG: {project_id}")
     
-    if not test_embedding_service():
-        logger.error("Embedding service is not available")
-        raise ValueError("Embedding service is not available")
-    
     output_dir = RAG_DIR / project_id / "faiss_index"
     output_dir.mkdir(parents=True, exist_ok=True)
     
@@ -198,17 +222,7 @@ def index_files_for_rag(project_id: str, cobol_json: Dict[str, Any], file_data:
     chunks = text_splitter.split_documents(documents)
     logger.info(f"Split into {len(chunks)} chunks")
     
-    try:
-        vector_store = FAISS.load_local(
-            str(output_dir),
-            embedding_client,
-            allow_dangerous_deserialization=True
-        )
-        vector_store.add_documents(chunks)
-        logger.info(f"Updated existing vector store for project: {project_id}")
-    except Exception:
-        vector_store = FAISS.from_documents(chunks, embedding_client)
-        logger.info(f"Created new vector store for project: {project_id}")
+    vector_store, embedding_stats = _embed_into_vector_store(output_dir, chunks)
     
     try:
         vector_store.save_local(str(output_dir))
@@ -223,6 +237,7 @@ def index_files_for_rag(project_id: str, cobol_json: Dict[str, Any], file_data:
         "total_documents": len(documents),
         "total_chunks": len(chunks),
         "embedding_model": AZURE_CONFIG["AZURE_OPENAI_EMBED_MODEL"],
+        "embedding": embedding_stats,
         "created_at": datetime.now().isoformat(),
     }
     
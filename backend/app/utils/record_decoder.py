@@ -0,0 +1,379 @@
+import codecs
+import mmap
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from ..config import logger
+from .record_layout import Field, BINARY_USAGES, CONDITION_LEVEL, RENAMES_LEVEL, COPY_LEVEL
+
+# Records decoded per batch by RecordDecoder.iter_file; batches of a few MB stay in the CPU cache
+DEFAULT_BATCH_RECORDS = 8192
+DEFAULT_ENCODING = "cp037"
+# Packed and zoned values with more digits than this are accumulated in float64 instead of int64
+MAX_EXACT_DIGITS = 18
+
+# Column kinds
+TEXT = "text"
+ZONED = "zoned"
+PACKED = "packed"
+BINARY = "binary"
+NATIONAL = "national"
+HEX_FLOAT = "float"
+RAW = "raw"
+
+
+def _is_ebcdic(encoding: str) -> bool:
+    return codecs.lookup(encoding).decode(b"\xf0")[0] == "0"
+
+
+def _text_table(encoding: str) -> np.ndarray:
+    """Byte -> Unicode code point of a single-byte code page, for decoding text as UTF-32."""
+    return np.array([ord(char) for char in bytes(range(256)).decode(encoding, errors="replace")], dtype=np.uint32)
+
+
+def _zoned_tables(ebcdic: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Digit value, invalid flag and negative sign flag of every byte of a zoned decimal.
+
+    EBCDIC digits are zone F (C/A/E/F positive, D/B negative overpunch);
+    ASCII digits are '0'-'9', with both the '{', 'A'-'I' / '}', 'J'-'R'
+    overpunch and the 'p'-'y' negative convention.
+    """
+    digits = np.full(256, -1, dtype=np.int64)
+    negative = np.zeros(256, dtype=bool)
+    if ebcdic:
+        for zone in (0xA, 0xB, 0xC, 0xD, 0xE, 0xF):
+            for digit in range(10):
+                digits[zone << 4 | digit] = digit
+                negative[zone << 4 | digit] = zone in (0xB, 0xD)
+    else:
+        for digit in range(10):
+            digits[0x30 + digit] = digit
+            digits[0x70 + digit] = digit
+            negative[0x70 + digit] = True
+        for digit, (positive, minus) in enumerate(zip("{ABCDEFGHI", "}JKLMNOPQR")):
+            digits[ord(positive)] = digits[ord(minus)] = digit
+            negative[ord(minus)] = True
+    invalid = digits < 0
+    digits[invalid] = 0
+    return digits, invalid, negative
+
+
+def _packed_tables() -> Tuple[np.ndarray, ...]:
+    """Per-byte lookup tables of packed decimals: digit pairs, last-byte digit and sign, invalid nibbles."""
+    high, low = np.arange(256) >> 4, np.arange(256) & 0x0F
+    pairs = np.where((high <= 9) & (low <= 9), high * 10 + low, 0).astype(np.int64)
+    last_digit = np.where(high <= 9, high, 0).astype(np.int64)
+    return pairs, (high > 9) | (low > 9), last_digit, (high > 9) | (low < 0x0A), (low == 0x0B) | (low == 0x0D)
+
+
+_PACKED_PAIRS, _PACKED_INVALID, _PACKED_LAST_DIGIT, _PACKED_LAST_INVALID, _PACKED_NEGATIVE = _packed_tables()
+
+
+def _positional_value(table: np.ndarray, invalid_table: np.ndarray, data: np.ndarray, base: int,
+                      digits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Value of the digit groups along the last axis of ``data`` in ``base``, looked up per byte in ``table``.
+
+    Horner's rule runs over the (few) byte positions, each step a whole-batch
+    array operation; int64 is exact up to MAX_EXACT_DIGITS digits, float64 is
+    used beyond that.
+
+    Returns:
+        (values, invalid flags from ``invalid_table``)
+    """
+    if not digits <= MAX_EXACT_DIGITS:
+        table = table.astype(np.float64)
+    shape = data.shape[:-1]
+    # One position-major copy of the column's bytes makes the gathers of every step sequential
+    data = np.ascontiguousarray(np.moveaxis(data, -1, 0)).reshape(data.shape[-1], -1)
+    value = np.take(table, data[0])
+    invalid = np.take(invalid_table, data[0])
+    for column in data[1:]:
+        value *= base
+        value += np.take(table, column)
+        invalid |= np.take(invalid_table, column)
+    return value.reshape(shape), invalid.reshape(shape)
+
+
+def _fixed_strings(code_points: np.ndarray) -> np.ndarray:
+    """Fixed-width strings from rows of UTF-32 code points, without the trailing spaces."""
+    text = code_points.view(f"U{code_points.shape[-1]}")[..., 0]
+    return np.strings.rstrip(text) if hasattr(np, "strings") else np.char.rstrip(text)
+
+
+class Column:
+    """How one elementary item of a record is decoded."""
+    __slots__ = ("name", "path", "kind", "length", "digits", "scale", "signed", "sign", "shape")
+
+    def __init__(self, name: str, path: Tuple[str, ...], field: Field, kind: str, shape: Tuple[int, ...]):
+        self.name = name
+        self.path = path
+        self.kind = kind
+        self.length = field.length
+        self.digits = field.digits
+        self.scale = field.scale
+        self.signed = field.signed
+        self.sign = field.sign
+        self.shape = shape
+
+    def __repr__(self) -> str:
+        return f"Column({self.name} {self.kind} {self.length}{'x' + str(self.shape) if self.shape else ''})"
+
+
+def _column_kind(field: Field) -> str:
+    if field.category in ("alphanumeric", "edited", "national"):
+        return NATIONAL if field.usage == "NATIONAL" or field.category == "national" else TEXT
+    if field.category == "numeric":
+        if field.usage == "COMP-3":
+            return PACKED
+        if field.usage in BINARY_USAGES:
+            return BINARY
+        return ZONED
+    if field.category == "float":
+        return HEX_FLOAT
+    if field.category in ("index", "pointer"):
+        return BINARY
+    return RAW
+
+
+class RecordDecoder:
+    """
+    Vectorized decoder of fixed-length records described by a compiled layout.
+
+    The layout becomes a NumPy structured dtype (``dtype``) whose fields are
+    the raw bytes of every elementary item at its offset, with OCCURS tables
+    as sub-arrays, so a whole batch of records is viewed without copying and
+    each column is decoded with array operations: packed decimal (COMP-3) and
+    zoned decimal through nibble and lookup tables, big-endian binary (COMP,
+    COMP-5) by dtype, IBM hexadecimal floating point (COMP-1/COMP-2), and
+    text through the code page. FILLER, 66 and 88 entries are not decoded;
+    both sides of a REDEFINES are.
+    """
+    __slots__ = ("record", "encoding", "dtype", "columns", "_text", "_translation", "_digits", "_invalid", "_negative",
+                 "_plus", "_minus")
+
+    def __init__(self, record: Field, encoding: str = DEFAULT_ENCODING):
+        self.record = record
+        self.encoding = encoding
+        self.columns: List[Column] = []
+        self.dtype = self._struct(record, record.offset, (), set())
+        ebcdic = _is_ebcdic(encoding)
+        self._text = _text_table(encoding)
+        # Code pages whose characters are all Latin-1 (cp037, cp500, ...) are decoded byte for byte with bytes.translate
+        self._translation = self._text.astype(np.uint8).tobytes() if self._text.max() < 256 else None
+        self._digits, self._invalid, self._negative = _zoned_tables(ebcdic)
+        self._plus, self._minus = (0x4E, 0x60) if ebcdic else (0x2B, 0x2D)
+
+    def _struct(self, group: Field, base: int, path: Tuple[str, ...], taken: set) -> np.dtype:
+        """Structured dtype of a group: groups without OCCURS are flattened, tables become sub-arrays."""
+        names, formats, offsets = [], [], []
+
+        def add(field: Field, parents: Tuple[str, ...]) -> None:
+            for child in field.children:
+                if child.level in (CONDITION_LEVEL, RENAMES_LEVEL, COPY_LEVEL) or not child.length:
+                    continue
+                if child.category == "group":
+                    if child.occurs > 1:
+                        name = self._unique(child.name, parents, taken)
+                        names.append(name)
+                        formats.append((self._struct(child, child.offset, path + (name,), set()), (child.occurs,)))
+                        offsets.append(child.offset - base)
+                    else:
+                        add(child, parents + (child.name,))
+                    continue
+                if child.name == "FILLER":
+                    continue
+                kind = _column_kind(child)
+                name = self._unique(child.name, parents, taken)
+                shape = (child.occurs,) if child.occurs > 1 else ()
+                if kind == BINARY:
+                    code = "i" if child.signed or child.category in ("index", "pointer") else "u"
+                    base_format = f">{code}{child.length}"
+                else:
+                    base_format = ("u1", (child.length,))
+                names.append(name)
+                formats.append((base_format, shape) if shape else base_format)
+                offsets.append(child.offset - base)
+                self.columns.append(Column(".".join(path + (name,)), path + (name,), child, kind, shape))
+
+        add(group, ())
+        return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": group.length})
+
+    @staticmethod
+    def _unique(name: str, parents: Tuple[str, ...], taken: set) -> str:
+        # Same-named items in different groups are qualified with their enclosing groups
+        qualified = name
+        for parent in reversed(parents):
+            if qualified not in taken:
+                break
+            qualified = f"{parent}.{qualified}"
+        while qualified in taken:
+            qualified += "_"
+        taken.add(qualified)
+        return qualified
+
+    def _raw(self, records: np.ndarray, column: Column) -> np.ndarray:
+        data = records
+        for name in column.path:
+            data = data[name]
+        return data
+
+    def _text_values(self, data: np.ndarray) -> np.ndarray:
+        if self._translation is None:
+            return _fixed_strings(np.take(self._text, np.ascontiguousarray(data)))
+        # Several times faster than np.take into UTF-32: one byte in, one byte out, then a widening copy
+        latin1 = np.frombuffer(data.tobytes().translate(self._translation), dtype=np.uint8).reshape(data.shape)
+        return _fixed_strings(latin1.astype(np.uint32))
+
+    @staticmethod
+    def _national_values(data: np.ndarray) -> np.ndarray:
+        # UTF-16 big-endian code units; characters outside the BMP are not combined
+        return _fixed_strings(np.ascontiguousarray(data).view(">u2").astype(np.uint32))
+
+    def _zoned_values(self, data: np.ndarray, column: Column) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        position = 0 if column.sign.startswith("LEADING") else -1
+        sign_byte = data[..., position]
+        if column.sign.endswith("SEPARATE"):
+            data = data[..., 1:] if position == 0 else data[..., :-1]
+            negative = sign_byte == self._minus
+            invalid = ~negative & (sign_byte != self._plus)
+        else:
+            negative = np.take(self._negative, sign_byte) if column.signed else np.zeros(sign_byte.shape, dtype=bool)
+            invalid = np.zeros(sign_byte.shape, dtype=bool)
+        value, invalid_digits = _positional_value(self._digits, self._invalid, data, 10, column.digits)
+        return value, negative, invalid | invalid_digits
+
+    @staticmethod
+    def _packed_values(data: np.ndarray, column: Column) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # All bytes but the last hold two digits; the last one holds a digit and the sign
+        last = data[..., -1]
+        value, invalid = _positional_value(_PACKED_PAIRS, _PACKED_INVALID, data[..., :-1], 100, column.digits)
+        value *= 10
+        value += np.take(_PACKED_LAST_DIGIT, last)
+        return value, np.take(_PACKED_NEGATIVE, last), invalid | np.take(_PACKED_LAST_INVALID, last)
+
+    def _hex_float_values(self, data: np.ndarray) -> np.ndarray:
+        # IBM hexadecimal floating point: sign bit, excess-64 base-16 exponent, fraction
+        first = data[..., 0].astype(np.int64)
+        fraction = np.zeros(first.shape, dtype=np.float64)
+        for index in range(1, data.shape[-1]):
+            fraction = fraction * 256.0 + data[..., index]
+        fraction /= 256.0 ** (data.shape[-1] - 1)
+        value = fraction * np.power(16.0, (first & 0x7F) - 64)
+        return np.where(first & 0x80, -value, value)
+
+    def decode(self, records: np.ndarray, scaled: bool = True) -> Tuple[Dict[str, np.ndarray], Dict[str, int]]:
+        """
+        Decode a batch of records viewed with ``dtype``.
+
+        Args:
+            records: Structured array of records, e.g. a slice of a memory map
+            scaled: Return numbers with decimal places as float64; when False
+                they stay exact int64 values in units of 10**-scale
+
+        Returns:
+            (column name -> array with one row per record, column name -> count
+            of invalid values); invalid numbers (bad digits or sign) decode as 0
+        """
+        columns: Dict[str, np.ndarray] = {}
+        invalid_counts: Dict[str, int] = {}
+        for column in self.columns:
+            data = self._raw(records, column)
+            invalid = None
+            if column.kind == TEXT:
+                values = self._text_values(data)
+            elif column.kind == NATIONAL:
+                values = self._national_values(data)
+            elif column.kind in (ZONED, PACKED):
+                values, negative, invalid = (self._packed_values(data, column) if column.kind == PACKED
+                                             else self._zoned_values(data, column))
+                values = np.where(negative, -values, values)
+                values = np.where(invalid, 0, values)
+                if column.scale < 0:
+                    values = values * 10 ** -column.scale
+                elif column.scale and scaled:
+                    values = values / 10.0 ** column.scale
+            elif column.kind == BINARY:
+                values = data.astype(np.int64 if data.dtype.kind == "i" or data.dtype.itemsize < 8 else np.uint64)
+                if column.scale and scaled:
+                    values = values / 10.0 ** column.scale
+            elif column.kind == HEX_FLOAT:
+                values = self._hex_float_values(data)
+            else:
+                values = np.ascontiguousarray(data)
+            columns[column.name] = values
+            if invalid is not None:
+                count = int(np.count_nonzero(invalid))
+                if count:
+                    invalid_counts[column.name] = count
+        return columns, invalid_counts
+
+    def _map(self, path: Path, start: int) -> Tuple[Optional[mmap.mmap], np.ndarray]:
+        size = path.stat().st_size
+        itemsize = self.dtype.itemsize
+        count = size // itemsize
+        if size % itemsize:
+            logger.warning(f"{path.name}: {size % itemsize} trailing bytes do not make a full {itemsize}-byte record")
+        if start >= count:
+            return None, np.empty(0, dtype=self.dtype)
+        with open(path, mode='rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapping, np.frombuffer(mapping, dtype=self.dtype, count=count - start, offset=start * itemsize)
+
+    def open(self, path: Path, start: int = 0) -> np.ndarray:
+        """
+        Memory-map a file of fixed-length records from record ``start`` on.
+
+        A trailing partial record is ignored with a warning.
+        """
+        return self._map(path, start)[1]
+
+    def iter_file(self, path: Path, batch_records: int = DEFAULT_BATCH_RECORDS, start: int = 0,
+                  scaled: bool = True) -> Iterator[Tuple[int, Dict[str, np.ndarray], Dict[str, int]]]:
+        """
+        Decode a data file in batches straight from its memory map.
+
+        The pages of a batch are released once it is decoded, so memory stays
+        bounded by ``batch_records`` whatever the file size.
+
+        Args:
+            path: File of fixed-length records
+            batch_records: Records per batch
+            start: Index of the first record to decode, e.g. to resume
+            scaled: See decode
+
+        Yields:
+            (index of the batch's first record, columns, invalid counts)
+        """
+        mapping, records = self._map(path, start)
+        itemsize = self.dtype.itemsize
+        released = 0
+        for offset in range(0, len(records), batch_records):
+            columns, invalid = self.decode(records[offset:offset + batch_records], scaled)
+            if hasattr(mmap, "MADV_DONTNEED"):
+                end = (start + offset + batch_records) * itemsize // mmap.PAGESIZE * mmap.PAGESIZE
+                if end > released:
+                    mapping.madvise(mmap.MADV_DONTNEED, released, end - released)
+                    released = end
+            yield start + offset, columns, invalid
+
+
+def decoder_for(records: List[Field], name: Optional[str] = None, encoding: str = DEFAULT_ENCODING) -> RecordDecoder:
+    """
+    Decoder for one record of a compiled layout (see record_layout.load_layouts).
+
+    Args:
+        records: Records of a copybook or program
+        name: Record name; defaults to the longest record
+
+    Raises:
+        ValueError: When the record does not exist or has no length
+    """
+    candidates = [record for record in records if record.level != COPY_LEVEL and (name is None or record.name == name.upper())]
+    if not candidates:
+        raise ValueError(f"Record not found: {name}")
+    record = max(candidates, key=lambda candidate: candidate.length)
+    if not record.length:
+        raise ValueError(f"Record {record.name} has no fixed length")
+    return RecordDecoder(record, encoding)
@@ -0,0 +1,548 @@
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from ..config import logger
+from .analysis_model import loads
+from .cobol_parser import AstNode, ENTRY, COPY, DIVISION, SECTION, FILE_DESCRIPTION
+from .symbol_index import USAGE_CLAUSES
+from . import project_store
+
+# Bump whenever the records written by layout_to_record change
+LAYOUT_FORMAT = 1
+CONDITION_LEVEL = 88
+RENAMES_LEVEL = 66
+# Level of the placeholder left for a COPY statement inside a group until the copybook is spliced in
+COPY_LEVEL = 0
+
+# Synonyms folded to one spelling per storage format
+_USAGE_NAMES = {
+    "BINARY": "COMP", "COMP-4": "COMP", "COMPUTATIONAL": "COMP", "COMPUTATIONAL-4": "COMP",
+    "COMPUTATIONAL-1": "COMP-1", "COMPUTATIONAL-2": "COMP-2", "COMPUTATIONAL-3": "COMP-3",
+    "PACKED-DECIMAL": "COMP-3", "COMPUTATIONAL-5": "COMP-5",
+}
+BINARY_USAGES = frozenset(("COMP", "COMP-5"))
+_FIXED_SIZES = {"COMP-1": 4, "COMP-2": 8, "INDEX": 4, "POINTER": 4}
+# Words that start a clause; the VALUE list of a condition name ends at the first one
+_CLAUSE_WORDS = frozenset((
+    "PIC", "PICTURE", "USAGE", "OCCURS", "REDEFINES", "VALUE", "VALUES", "SIGN", "LEADING", "TRAILING",
+    "SYNC", "SYNCHRONIZED", "JUST", "JUSTIFIED", "BLANK", "EXTERNAL", "GLOBAL", "RENAMES", "INDEXED",
+    "ASCENDING", "DESCENDING",
+)) | USAGE_CLAUSES
+_REPEAT_RE = re.compile(r"(.)\((\d+)\)")
+_NUMERIC_SYMBOLS = frozenset("9SVP")
+
+
+class Field:
+    """
+    One data description entry with its place in the record.
+
+    ``offset`` is the byte offset from the start of the 01/77 record and
+    ``length`` the size of one occurrence; ``size`` includes OCCURS. Items in
+    or after an OCCURS DEPENDING ON table are laid out with the maximum number
+    of occurrences. Condition names (88) carry the offset and length of their
+    item, RENAMES (66) entries the span they rename.
+    """
+    __slots__ = ("name", "level", "offset", "length", "occurs_min", "occurs", "depending_on", "redefines",
+                 "picture", "usage", "category", "digits", "scale", "signed", "sign", "sync", "value",
+                 "values", "renames", "line", "section", "implicit", "children")
+
+    def __init__(self, name: str, level: int, line: int = 0):
+        self.name = name
+        self.level = level
+        self.offset = 0
+        self.length = 0
+        self.occurs_min = 1
+        self.occurs = 1
+        self.depending_on = ""
+        self.redefines = ""
+        self.picture = ""
+        self.usage = ""
+        self.category = ""
+        self.digits = 0
+        self.scale = 0
+        self.signed = False
+        self.sign = ""  # "", LEADING, TRAILING, LEADING SEPARATE or TRAILING SEPARATE
+        self.sync = False
+        self.value = None
+        self.values: List[List[Optional[str]]] = []  # condition values as [low, high or None]
+        self.renames: List[str] = []
+        self.line = line
+        self.section = ""  # records only: WORKING-STORAGE, LINKAGE, FD <file>, ...
+        self.implicit = False  # synthetic record around a copybook's unnamed group members
+        self.children: List["Field"] = []
+
+    @property
+    def size(self) -> int:
+        return self.length * self.occurs
+
+    @property
+    def is_group(self) -> bool:
+        return self.category == "group"
+
+    def walk(self) -> Iterator["Field"]:
+        """This field and its descendants in definition order."""
+        pending = [self]
+        while pending:
+            field = pending.pop()
+            yield field
+            pending.extend(reversed(field.children))
+
+    def __repr__(self) -> str:
+        return f"Field({self.level:02d} {self.name} @{self.offset}+{self.length}x{self.occurs})"
+
+
+def parse_picture(picture: str) -> Tuple[int, int, int, bool, str]:
+    """
+    Measure a PICTURE character string.
+
+    Returns:
+        (display positions, digits, scale, signed, category) where category is
+        numeric, edited, alphanumeric or national; S, V and P take no position
+    """
+    expanded = _REPEAT_RE.sub(lambda match: match.group(1) * int(match.group(2)), picture.upper())
+    symbols = set(expanded)
+    signed = "S" in symbols
+    if symbols <= _NUMERIC_SYMBOLS:
+        integer, _, fraction = expanded.replace("S", "").partition("V")
+        digits = integer.count("9") + fraction.count("9")
+        scale = fraction.count("9")
+        if "P" in symbols:
+            # Leading P positions scale the value down, trailing ones up
+            scale += fraction.count("P") + (integer.count("P") if integer.startswith("P") else -integer.count("P"))
+        return digits, digits, scale, signed, "numeric"
+    if symbols <= {"N"} or symbols <= {"G", "B"}:
+        return len(expanded), 0, 0, False, "national"
+    positions = len(expanded) - expanded.count("V") - expanded.count("S") - expanded.count("P")
+    if symbols & set("9Z*+-$,.CRDB0/") and not symbols & {"X", "A"}:
+        fraction = expanded.partition("." if "." in expanded else "V")[2]
+        digits = sum(expanded.count(symbol) for symbol in "9Z*")
+        return positions, digits, sum(fraction.count(symbol) for symbol in "9Z*"), bool(symbols & set("+-CRDB")), "edited"
+    return positions, 0, 0, False, "alphanumeric"
+
+
+def _storage_length(field: Field, positions: int) -> int:
+    usage = field.usage
+    if usage == "COMP-3":
+        return field.digits // 2 + 1
+    if usage in BINARY_USAGES:
+        return 2 if field.digits <= 4 else 4 if field.digits <= 9 else 8
+    if usage in _FIXED_SIZES:
+        return _FIXED_SIZES[usage]
+    if usage in ("NATIONAL", "DISPLAY-1") or field.category == "national":
+        return 2 * positions
+    return positions + (1 if field.sign.endswith("SEPARATE") else 0)
+
+
+def _literal(value: str) -> str:
+    return value[1:-1] if len(value) > 1 and value[0] in "'\"" and value[-1] == value[0] else value
+
+
+def _apply_clauses(field: Field, operands: List[str]) -> None:
+    """Read the clauses of one entry into ``field``."""
+    count = len(operands)
+    index = 0
+    while index < count:
+        word = operands[index]
+        following = operands[index + 1] if index + 1 < count else ""
+        if word in ("PIC", "PICTURE"):
+            if following == "IS":
+                index += 1
+                following = operands[index + 1] if index + 1 < count else ""
+            field.picture = following
+            index += 2
+        elif word == "USAGE":
+            index += 2 if following == "IS" else 1
+        elif word in USAGE_CLAUSES:
+            field.usage = _USAGE_NAMES.get(word, word)
+            index += 1
+        elif word == "OCCURS":
+            index += 1
+            if index < count and operands[index].isdigit():
+                field.occurs_min = field.occurs = int(operands[index])
+                index += 1
+            if index + 1 < count and operands[index] == "TO" and operands[index + 1].isdigit():
+                field.occurs = int(operands[index + 1])
+                index += 2
+            if index < count and operands[index] == "TIMES":
+                index += 1
+        elif word == "DEPENDING":
+            index += 2 if following == "ON" else 1
+            if index < count:
+                field.depending_on = operands[index]
+                index += 1
+        elif word == "REDEFINES" and following:
+            field.redefines = following
+            index += 2
+        elif word == "RENAMES" and following:
+            field.renames = [following]
+            index += 2
+            if index + 1 < count and operands[index] in ("THRU", "THROUGH"):
+                field.renames.append(operands[index + 1])
+                index += 2
+        elif word in ("SIGN", "LEADING", "TRAILING"):
+            if word == "SIGN":
+                index += 2 if following == "IS" else 1
+                word = operands[index] if index < count else ""
+            if word in ("LEADING", "TRAILING"):
+                field.sign = word
+                index += 1
+                if index < count and operands[index] == "SEPARATE":
+                    field.sign += " SEPARATE"
+                    index += 2 if index + 1 < count and operands[index + 1] == "CHARACTER" else 1
+        elif word in ("SYNC", "SYNCHRONIZED"):
+            field.sync = True
+            index += 1
+        elif word in ("VALUE", "VALUES"):
+            index += 1
+            if index < count and operands[index] in ("IS", "ARE"):
+                index += 1
+            while index < count and operands[index] not in _CLAUSE_WORDS:
+                low = _literal(operands[index])
+                high = None
+                if index + 2 < count and operands[index + 1] in ("THRU", "THROUGH"):
+                    high = _literal(operands[index + 2])
+                    index += 2
+                field.values.append([low, high])
+                index += 1
+                if field.level != CONDITION_LEVEL:
+                    break
+            if field.level != CONDITION_LEVEL and field.values:
+                field.value = field.values.pop()[0]
+        else:
+            index += 1
+
+
+def _build(node: AstNode, usage: str, sign: str, siblings: List[Field]) -> Field:
+    """
+    Build the field tree of one entry and append it to ``siblings``.
+
+    Group USAGE and SIGN clauses apply to the members. The parser nests a
+    COPY statement under the last open entry, so a COPY that follows an
+    elementary item becomes a sibling of that item instead of its member.
+    """
+    operands = node.operands
+    name = node.name
+    if name in _CLAUSE_WORDS:
+        # "05 PIC X(10)." is an unnamed FILLER; the parser took the first clause word for its name
+        operands = [name] + operands
+        name = "FILLER"
+    field = Field(name, node.level, node.line)
+    _apply_clauses(field, operands)
+    field.usage = field.usage or usage
+    field.sign = field.sign or sign
+    siblings.append(field)
+    elementary = bool(field.picture) or field.usage in _FIXED_SIZES
+
+    for child in node.children:
+        if child.kind == ENTRY:
+            _build(child, field.usage, field.sign, field.children)
+        elif child.kind == COPY:
+            (siblings if elementary else field.children).append(Field(child.name, COPY_LEVEL, child.line))
+
+    if field.level == CONDITION_LEVEL:
+        field.category = "condition"
+    elif field.level == RENAMES_LEVEL:
+        field.category = "renames"
+    elif not elementary or any(child.level != CONDITION_LEVEL for child in field.children):
+        field.category = "group"
+    else:
+        positions, field.digits, field.scale, field.signed, field.category = parse_picture(field.picture) if field.picture else (0, 0, 0, False, "")
+        if field.usage in ("COMP-1", "COMP-2"):
+            field.category = "float"
+        elif field.usage in ("INDEX", "POINTER"):
+            field.category = field.usage.lower()
+        field.length = _storage_length(field, positions)
+    return field
+
+
+def _assign(field: Field, offset: int) -> int:
+    """Give ``field`` and its members their offsets; returns the length of one occurrence."""
+    field.offset = offset
+    if field.category == "group":
+        cursor = end = offset
+        laid_out: Dict[str, Field] = {}
+        for child in field.children:
+            if child.level in (CONDITION_LEVEL, RENAMES_LEVEL):
+                continue
+            target = laid_out.get(child.redefines) if child.redefines else None
+            start = target.offset if target is not None else cursor
+            if child.sync and child.length and child.category != "group":
+                start += -start % min(child.length, 8)
+            size = _assign(child, start) * child.occurs
+            laid_out[child.name] = child
+            end = max(end, start + size)
+            if target is None:
+                cursor = start + size
+        field.length = end - offset
+    for child in field.children:
+        if child.level == CONDITION_LEVEL:
+            child.offset, child.length = field.offset, field.length
+    return field.length
+
+
+def layout_record(record: Field) -> Field:
+    """(Re)compute the offsets of a 01/77 record after its members changed, including RENAMES spans."""
+    _assign(record, 0)
+    renames = [child for child in record.children if child.level == RENAMES_LEVEL]
+    if renames:
+        by_name = {field.name: field for field in record.walk() if field.level not in (CONDITION_LEVEL, RENAMES_LEVEL)}
+        for field in renames:
+            first = by_name.get(field.renames[0]) if field.renames else None
+            last = by_name.get(field.renames[-1]) if field.renames else None
+            if first is None or last is None:
+                logger.warning(f"RENAMES of {field.name} refers to unknown items {field.renames}")
+                continue
+            field.offset = first.offset
+            field.length = max(first.size, last.offset + last.size - first.offset)
+    return record
+
+
+def compile_layouts(ast: AstNode, name: str = "") -> List[Field]:
+    """
+    Compile the data description entries of a member into record layouts.
+
+    Every 01 and 77 entry becomes a record with the full level hierarchy
+    (02-49, 66 and 88 included), USAGE, SIGN, SYNCHRONIZED, OCCURS (with
+    DEPENDING ON) and REDEFINES resolved into byte offsets and lengths.
+    Entries of a copybook that has no 01 level (members meant to be copied
+    into a group) are wrapped in an implicit record named after the member.
+    COPY statements are left as COPY_LEVEL placeholders, in a group or in
+    place of records; see expand_copies.
+
+    Args:
+        ast: Member AST from cobol_parser.parse_cobol
+        name: Member name, used for the implicit record
+
+    Returns:
+        Records in source order
+    """
+    # Imported here because copybook_resolver builds on cobol_analyzer, which imports this module
+    from .copybook_resolver import copybook_member_name
+
+    records: List[Field] = []
+    implicit: Optional[Field] = None
+
+    def visit(node: AstNode, section: str) -> None:
+        nonlocal implicit
+        for child in node.children:
+            if child.kind == ENTRY:
+                if child.level == RENAMES_LEVEL:
+                    if records:
+                        _build(child, "", "", records[-1].children)
+                elif child.level in (1, 77):
+                    _build(child, "", "", records).section = section
+                    implicit = None
+                else:
+                    if implicit is None:
+                        implicit = Field(name or "FILLER", 1, child.line)
+                        implicit.category = "group"
+                        implicit.implicit = True
+                        implicit.section = section
+                        records.append(implicit)
+                    _build(child, "", "", implicit.children)
+            elif child.kind == COPY:
+                placeholder = Field(child.name, COPY_LEVEL, child.line)
+                placeholder.section = section
+                records.append(placeholder)
+                implicit = None
+            elif child.kind == DIVISION and child.name == "DATA" or child.kind == SECTION:
+                implicit = None
+                visit(child, child.name)
+            elif child.kind == FILE_DESCRIPTION:
+                implicit = None
+                visit(child, f"FD {child.name}")
+
+    visit(ast, "")
+    for record in records:
+        for field in record.walk():
+            if field.level == COPY_LEVEL:
+                field.name = copybook_member_name(field.name)
+        layout_record(record)
+    return records
+
+
+def layout_to_record(field: Field) -> List[Any]:
+    """Flatten a field tree into nested lists for compact serialization."""
+    return [getattr(field, slot) for slot in Field.__slots__[:-1]] + [list(map(layout_to_record, field.children))]
+
+
+def layout_from_record(record: List[Any]) -> Field:
+    """Rebuild a field tree from layout_to_record output."""
+    field = Field.__new__(Field)
+    for slot, value in zip(Field.__slots__[:-1], record):
+        setattr(field, slot, value)
+    field.children = [layout_from_record(child) for child in record[-1]]
+    return field
+
+
+def expand_copies(layouts: Dict[str, List[List[Any]]]) -> Dict[str, List[Field]]:
+    """
+    Splice copybook layouts into the COPY placeholders of every member and recompute offsets.
+
+    Copybooks are looked up by member name among ``layouts`` (.cpy members
+    before .cbl ones, as in copybook_resolver) and each one is expanded once.
+    Inside a group, the members of an implicit copybook record take the place
+    of the COPY statement; outside, the copybook's records do. Unknown and
+    recursive copybooks keep their placeholder.
+
+    Args:
+        layouts: Project-relative file path -> records from layout_to_record
+
+    Returns:
+        Project-relative file path -> laid out records
+    """
+    from .copybook_resolver import copybook_member_name, COPYBOOK_SUFFIXES
+
+    members: Dict[str, str] = {}
+    for suffix in COPYBOOK_SUFFIXES:
+        for path in sorted(layouts):
+            if path.lower().endswith(suffix):
+                members.setdefault(copybook_member_name(path.rsplit("/", 1)[-1]), path)
+    expanded: Dict[str, List[List[Any]]] = {}
+
+    def copybook(member: str, stack: Tuple[str, ...]) -> List[Field]:
+        if member not in expanded:
+            expanded[member] = [layout_to_record(record) for record in splice(
+                [layout_from_record(record) for record in layouts[members[member]]], stack + (member,))]
+        # Fresh copies: every includer lays them out at its own offsets
+        return [layout_from_record(record) for record in expanded[member]]
+
+    def splice(fields: List[Field], stack: Tuple[str, ...], in_group: bool = False) -> List[Field]:
+        spliced = []
+        for field in fields:
+            if field.level == COPY_LEVEL and field.name in members and field.name not in stack:
+                for record in copybook(field.name, stack):
+                    if in_group and record.implicit:
+                        spliced.extend(record.children)
+                    else:
+                        record.section = field.section
+                        spliced.append(record)
+            else:
+                field.children = splice(field.children, stack, True)
+                spliced.append(field)
+        return spliced
+
+    result = {}
+    for path, records in layouts.items():
+        fields = splice([layout_from_record(record) for record in records], ())
+        for field in fields:
+            layout_record(field)
+        result[path] = fields
+    return result
+
+
+def build_project_layouts(layouts: Dict[str, List[List[Any]]]) -> Dict[str, Any]:
+    """
+    Expand the per-file layouts of a project (see expand_copies) into documents for the project store.
+
+    Returns:
+        Dictionary with ``header`` (counts, including COPY statements whose
+        copybook is not in the project) and ``documents``: project-relative
+        path -> {"format", "records"}
+    """
+    documents = {}
+    records = fields = unresolved = 0
+    for path, expanded in expand_copies(layouts).items():
+        documents[path] = {"format": LAYOUT_FORMAT, "records": [layout_to_record(record) for record in expanded]}
+        records += len(expanded)
+        for record in expanded:
+            for field in record.walk():
+                if field.level == COPY_LEVEL:
+                    unresolved += 1
+                else:
+                    fields += 1
+    header = {
+        "format": LAYOUT_FORMAT,
+        "files": len(documents),
+        "records": records,
+        "fields": fields,
+        "unresolved_copies": unresolved
+    }
+    return {"header": header, "documents": documents}
+
+
+def field_to_dict(field: Field) -> Dict[str, Any]:
+    """JSON view of a field tree; clauses that are not present are left out."""
+    entry: Dict[str, Any] = {"name": field.name, "level": field.level, "offset": field.offset, "length": field.length}
+    if field.category:
+        entry["category"] = field.category
+    for key in ("picture", "usage", "sign", "depending_on", "redefines", "section"):
+        if getattr(field, key):
+            entry[key] = getattr(field, key)
+    if field.occurs != 1 or field.occurs_min != 1:
+        entry.update(occurs=field.occurs, occurs_min=field.occurs_min, size=field.size)
+    if field.digits:
+        entry.update(digits=field.digits, scale=field.scale, signed=field.signed)
+    if field.sync:
+        entry["sync"] = True
+    if field.value is not None:
+        entry["value"] = field.value
+    if field.values:
+        entry["values"] = field.values
+    if field.renames:
+        entry["renames"] = field.renames
+    if field.level == COPY_LEVEL:
+        entry["unresolved_copy"] = True
+    if field.children:
+        entry["children"] = [field_to_dict(child) for child in field.children]
+    return entry
+
+
+def flatten_layout(record: Field) -> List[Dict[str, Any]]:
+    """
+    One row per field of a record, with the dotted path of group names.
+
+    Offsets are those of the first occurrence; an item inside OCCURS tables
+    repeats every ``length`` bytes of the table it belongs to.
+    """
+    rows = []
+
+    def visit(field: Field, prefix: str) -> None:
+        path = f"{prefix}.{field.name}" if prefix else field.name
+        row = field_to_dict(field)
+        row.pop("children", None)
+        row["path"] = path
+        rows.append(row)
+        for child in field.children:
+            visit(child, path)
+
+    visit(record, "")
+    return rows
+
+
+_cache: "OrderedDict[Tuple[str, str, bytes], List[Field]]" = OrderedDict()
+# Members whose decoded layouts are kept in memory by load_layouts
+LAYOUT_CACHE_SIZE = 256
+
+
+def load_layouts(project_id: str, member: str) -> Optional[List[Field]]:
+    """
+    Compiled record layouts of a copybook or program from the project store.
+
+    Layouts are compiled, and their COPY statements expanded, during analysis,
+    so nothing is parsed here; recently used layouts are also kept in memory.
+
+    Args:
+        project_id: Project identifier
+        member: Project-relative file path or member name ("CUSTREC", "custrec.cpy")
+
+    Returns:
+        The laid out records, or None when the project has no such member
+    """
+    from .copybook_resolver import copybook_member_name
+
+    found = project_store.load_layout_blob(project_id, member, copybook_member_name(member))
+    if found is None:
+        return None
+    file_path, blob = found
+    key = (project_id, file_path, blob)
+    records = _cache.get(key)
+    if records is not None:
+        _cache.move_to_end(key)
+        return records
+    data = loads(blob)
+    records = [layout_from_record(record) for record in data["records"]] if data.get("format") == LAYOUT_FORMAT else []
+    _cache[key] = records
+    if len(_cache) > LAYOUT_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return records
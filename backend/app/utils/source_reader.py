@@ -0,0 +1,144 @@
+import mmap
+import os
+import re
+from array import array
+from pathlib import Path
+from typing import Iterator, Union
+
+# Mainframe card images: 80 bytes per record, no line terminators
+CARD_RECORD_LENGTH = 80
+# Decode the mapping this many bytes at a time so peak memory stays flat however large the file is
+WINDOW_SIZE = 1 << 20
+_SNIFF_RECORDS = 64
+_NEWLINE_RE = re.compile(b"\n")
+
+
+def detect_record_format(buffer: Union[mmap.mmap, bytes], record_length: int = CARD_RECORD_LENGTH) -> str:
+    """
+    Return ``"fixed"`` for unterminated card images and ``"newline"`` otherwise.
+
+    A buffer is treated as fixed-length records when its size is a multiple of
+    ``record_length`` and the first records contain no newline.
+    """
+    size = len(buffer)
+    if size and size % record_length == 0 and buffer.find(b"\n", 0, min(size, record_length * _SNIFF_RECORDS)) < 0:
+        return "fixed"
+    return "newline"
+
+
+def _iter_newline_records(mm: mmap.mmap, encoding: str, errors: str) -> Iterator[str]:
+    size = len(mm)
+    start = 0
+    while start < size:
+        end = min(start + WINDOW_SIZE, size)
+        if end < size:
+            # Cut after the last newline so no record (or multi-byte character) straddles two windows
+            cut = mm.rfind(b"\n", start, end)
+            end = cut + 1 if cut >= 0 else mm.find(b"\n", end) + 1 or size
+        text = str(mm[start:end], encoding, errors)
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        records = text.split("\n")
+        if records[-1] == "":
+            records.pop()
+        yield from records
+        start = end
+
+
+def _iter_fixed_records(mm: mmap.mmap, record_length: int, encoding: str, errors: str) -> Iterator[str]:
+    size = len(mm)
+    window = max(1, WINDOW_SIZE // record_length) * record_length
+    for start in range(0, size, window):
+        chunk = mm[start:start + window]
+        text = str(chunk, encoding, errors)
+        if len(text) == len(chunk):
+            # Single-byte text: records can be sliced from the decoded window
+            for offset in range(0, len(text), record_length):
+                yield text[offset:offset + record_length]
+        else:
+            for offset in range(0, len(chunk), record_length):
+                yield str(chunk[offset:offset + record_length], encoding, errors)
+
+
+def iter_records(file_path: Path, record_format: str = "auto", encoding: str = "utf-8",
+                 errors: str = "ignore", record_length: int = CARD_RECORD_LENGTH) -> Iterator[str]:
+    """
+    Stream the records of a source file through a read-only memory map.
+
+    The file is decoded one window at a time, so neither the raw bytes nor the
+    full text are ever copied into Python objects at once.
+
+    Args:
+        file_path: File to read
+        record_format: "newline", "fixed" (card images of ``record_length`` bytes)
+            or "auto" to sniff the file
+        encoding: Text encoding, e.g. "cp037" for EBCDIC card images
+        errors: Decoding error handler, "ignore" like the text readers it replaces
+        record_length: Record length for fixed-format files
+
+    Yields:
+        Records without line terminators
+    """
+    with open(file_path, mode='rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if record_format == "auto":
+                record_format = detect_record_format(mm, record_length)
+            if record_format == "fixed":
+                yield from _iter_fixed_records(mm, record_length, encoding, errors)
+            else:
+                yield from _iter_newline_records(mm, encoding, errors)
+
+
+def read_source(file_path: Path, record_format: str = "auto", encoding: str = "utf-8",
+                errors: str = "ignore", record_length: int = CARD_RECORD_LENGTH) -> str:
+    """
+    Read a whole source file as text, decoding straight from its memory map.
+
+    Card images are returned one record per line so callers see the same
+    shape as newline-delimited sources.
+    """
+    with open(file_path, mode='rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if record_format == "auto":
+                record_format = detect_record_format(mm, record_length)
+            if record_format == "fixed":
+                return "\n".join(_iter_fixed_records(mm, record_length, encoding, errors))
+            # str() decodes from the buffer protocol directly, without an intermediate bytes copy
+            text = str(mm, encoding, errors)
+    return text.replace("\r\n", "\n") if "\r" in text else text
+
+
+def record_offsets(file_path: Path, record_format: str = "auto",
+                   record_length: int = CARD_RECORD_LENGTH) -> array:
+    """
+    Byte offset of every record iter_records yields, plus the file size.
+
+    Record ``n`` (0-based) spans ``offsets[n]`` to ``offsets[n + 1]``,
+    terminator included, so a 1-based (line, column) position of single-byte
+    text maps to ``offsets[line - 1] + column - 1``.
+    """
+    with open(file_path, mode='rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return array("Q", [0])
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if record_format == "auto":
+                record_format = detect_record_format(mm, record_length)
+            if record_format == "fixed":
+                offsets = array("Q", range(0, size, record_length))
+            else:
+                offsets = array("Q", [0])
+                offsets.extend(match.end() for match in _NEWLINE_RE.finditer(mm))
+                if offsets[-1] == size:
+                    offsets.pop()
+    offsets.append(size)
+    return offsets
+
+
+def count_lines(content: Union[str, bytes]) -> int:
+    """Count lines the way ``len(content.split('\\n'))`` does, without building the list."""
+    return content.count("\n" if isinstance(content, str) else b"\n") + 1
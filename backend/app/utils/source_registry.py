@@ -0,0 +1,57 @@
+import json
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Iterator, Mapping, Union
+from ..config import logger
+
+
+class SourceRegistry(Mapping):
+    """
+    The sources of one request, each held once and shared read-only.
+
+    The registry is a read-only mapping of file name -> content built from
+    a request's ``file_data``. Every consumer (the classifier, database
+    detection, prompt builders) is handed the same string objects, so a
+    request holds about one copy of its sources however many steps use
+    them, plus the prompt that is being sent.
+    """
+
+    def __init__(self, file_data: Union[str, Mapping[str, Any], None]):
+        """
+        Args:
+            file_data: Dict of filename -> content, dict of file objects with
+                fileName and content, or either of them as a JSON string
+        """
+        if isinstance(file_data, str):
+            file_data = json.loads(file_data) if file_data.strip() else {}
+        sources: Dict[str, str] = {}
+        for key, value in (file_data or {}).items():
+            if isinstance(value, Mapping) and "fileName" in value:
+                key, value = value["fileName"], value.get("content", "")
+            sources[key] = value if isinstance(value, str) else "" if value is None else str(value)
+        self._sources = MappingProxyType(sources)
+        logger.info(f"Source registry: {len(sources)} files, {sum(map(len, sources.values()))} characters")
+
+    def __getitem__(self, name: str) -> str:
+        return self._sources[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sources)
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def join(self, names: Iterable[str], separator: str = "\n", headers: bool = False) -> str:
+        """
+        The given sources concatenated in one pass.
+
+        The result is not kept: callers hold it only as long as the prompt
+        they build from it, so it is not a lasting second copy.
+
+        Args:
+            names: Sources to join, in order
+            separator: Text between two sources
+            headers: Put ``=== name ===`` on a line of its own before each source
+        """
+        if headers:
+            return separator.join(f"=== {name} ===\n{self._sources[name]}" for name in names)
+        return separator.join(self._sources[name] for name in names)
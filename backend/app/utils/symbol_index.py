@@ -0,0 +1,300 @@
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+from ..config import logger, output_dir, UPLOAD_DIR
+from .cobol_parser import AstNode, ENTRY, STATEMENT, EXEC
+from .index_store import write_index, read_index, pack_strings, StringTable
+
+SYMBOL_INDEX_FILE = "symbol_index.idx"
+# Bump whenever the arrays written by build_symbol_index change
+SYMBOL_INDEX_FORMAT = 1
+NO_PARENT = 0xFFFFFFFF
+
+USAGE_CLAUSES = frozenset((
+    "BINARY", "COMP", "COMP-1", "COMP-2", "COMP-3", "COMP-4", "COMP-5", "COMPUTATIONAL",
+    "COMPUTATIONAL-1", "COMPUTATIONAL-2", "COMPUTATIONAL-3", "COMPUTATIONAL-4", "COMPUTATIONAL-5",
+    "DISPLAY", "DISPLAY-1", "INDEX", "NATIONAL", "PACKED-DECIMAL", "POINTER",
+))
+# Words that are never data names; they are dropped before names are matched against definitions
+_RESERVED = frozenset((
+    "ALL", "ALSO", "AND", "ADVANCING", "AFTER", "AT", "BEFORE", "BY", "CORRESPONDING", "CORR", "DELIMITED",
+    "DEPENDING", "DOWN", "END", "EQUAL", "ERROR", "EXCEPTION", "FALSE", "FOR", "FROM", "GIVING", "GREATER",
+    "HIGH-VALUE", "HIGH-VALUES", "I-O", "IN", "INPUT", "INTO", "INVALID", "IS", "KEY", "LESS", "LOW-VALUE",
+    "LOW-VALUES", "NEXT", "NOT", "OF", "ON", "OR", "OTHER", "OUTPUT", "OVERFLOW", "RECORD", "REFERENCE",
+    "REMAINDER", "ROUNDED", "RUN", "SENTENCE", "SIZE", "SPACE", "SPACES", "TALLYING", "TEST", "THAN", "THEN",
+    "THROUGH", "THRU", "TIMES", "TO", "TRUE", "UNTIL", "UP", "UPON", "USING", "VALUE", "VARYING", "WHEN",
+    "WITH", "ZERO", "ZEROES", "ZEROS", "EXTEND", "CONTENT", "REPLACING", "LEADING", "CHARACTERS",
+))
+
+
+# First characters of literals, numbers and parentheses
+_NOT_A_NAME = frozenset("'\"()0123456789+-.=<>*/")
+
+
+def _byte_offset(offsets: array, line: int, column: int) -> int:
+    # Continued lines report columns past the physical line; never point past the file
+    return min(offsets[line - 1] + column - 1, offsets[-1])
+
+
+def _reference_names(operands: List[str]) -> Set[str]:
+    """Distinct candidate data names among statement operands, without subscripts or host-variable colons."""
+    names = set()
+    for operand in operands:
+        if operand[0] in _NOT_A_NAME:
+            continue
+        if operand[0] == ":":
+            operand = operand[1:]
+        if "(" in operand:
+            operand = operand.split("(", 1)[0]
+        names.add(operand)
+    names -= _RESERVED
+    names.discard("")
+    return names
+
+
+def extract_symbols(ast: AstNode, offsets: array) -> List[List[Any]]:
+    """
+    Collect the data definitions and reference sites of one member.
+
+    Args:
+        ast: Member AST from cobol_parser.parse_cobol
+        offsets: Record byte offsets from source_reader.record_offsets
+
+    Returns:
+        [definitions, references] where a definition is [name, level, picture,
+        usage, parent definition index or -1, start byte, end byte, line] and
+        a reference is [name, start byte, end byte, line, verb] for every
+        statement (or REDEFINES / DEPENDING ON clause) that names a data item
+    """
+    definitions = []
+    references = []
+
+    def define(node: AstNode, parent: int) -> None:
+        operands = node.operands
+        picture = usage = ""
+        for index, operand in enumerate(operands):
+            if operand in ("PIC", "PICTURE") and index + 1 < len(operands):
+                picture = operands[index + 2] if operands[index + 1] == "IS" and index + 2 < len(operands) else operands[index + 1]
+            elif operand in USAGE_CLAUSES and not usage:
+                usage = operand
+            elif operand in ("REDEFINES", "DEPENDING") and index + 1 < len(operands):
+                target = operands[index + 2] if operands[index + 1] == "ON" and index + 2 < len(operands) else operands[index + 1]
+                references.append([target, _byte_offset(offsets, node.line, node.column),
+                                   _byte_offset(offsets, node.end_line, node.end_column), node.line, operand])
+        definitions.append([node.name, node.level, picture, usage, parent,
+                            _byte_offset(offsets, node.line, node.column),
+                            _byte_offset(offsets, node.end_line, node.end_column), node.line])
+        own = len(definitions) - 1
+        for child in node.children:
+            if child.kind == ENTRY:
+                define(child, own)
+
+    def refer(node: AstNode) -> None:
+        for child in node.children:
+            if child.kind in (STATEMENT, EXEC) and child.operands:
+                # A block statement's own operands end where its nested statements begin
+                end_line, end_column = (child.children[0].line, child.children[0].column) if child.children else (child.end_line, child.end_column)
+                start = _byte_offset(offsets, child.line, child.column)
+                end = _byte_offset(offsets, end_line, end_column)
+                verb = child.name if child.kind == STATEMENT else f"EXEC {child.name}"
+                for name in _reference_names(child.operands):
+                    references.append([name, start, end, child.line, verb])
+            if child.kind == ENTRY:
+                define(child, -1)
+            else:
+                refer(child)
+
+    refer(ast)
+    return [definitions, references]
+
+
+def build_symbol_index(symbols: Dict[str, List[List[Any]]]) -> Dict[str, Any]:
+    """
+    Link per-file symbol records (see extract_symbols) into one project index.
+
+    References are kept only for names defined somewhere in the project, so
+    keywords and paragraph names drop out.
+
+    Args:
+        symbols: Project-relative file path -> symbol record
+
+    Returns:
+        Dictionary with ``header`` (counts) and ``arrays`` for write_index
+    """
+    files = sorted(symbols)
+    strings: Dict[str, int] = {"": 0}
+    names: Dict[str, int] = {}
+
+    def string(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    # Definitions in file order; parents become global definition indices
+    def_rows = []
+    for file_index, path in enumerate(files):
+        base = len(def_rows)
+        for name, level, picture, usage, parent, start, end, line in symbols[path][0]:
+            symbol = names.setdefault(name, len(names))
+            def_rows.append((symbol, file_index, level, string(picture), string(usage),
+                             NO_PARENT if parent < 0 else base + parent, start, end, line))
+    ref_rows = []
+    for file_index, path in enumerate(files):
+        for name, start, end, line, verb in symbols[path][1]:
+            symbol = names.get(name)
+            if symbol is not None:
+                ref_rows.append((symbol, file_index, string(verb), start, end, line))
+
+    # Group by symbol; parents were indices in file order, so remap them to the new positions
+    order = sorted(range(len(def_rows)), key=lambda index: def_rows[index][0])
+    position = array("I", bytes(4 * len(def_rows)))
+    for new, old in enumerate(order):
+        position[old] = new
+    def_rows = [def_rows[old] for old in order]
+    parents = array("I", [row[5] if row[5] == NO_PARENT else position[row[5]] for row in def_rows])
+    ref_rows.sort(key=lambda row: row[0])
+
+    symbol_count = len(names)
+    def_offsets = array("I", bytes(4 * (symbol_count + 1)))
+    for row in def_rows:
+        def_offsets[row[0] + 1] += 1
+    ref_offsets = array("I", bytes(4 * (symbol_count + 1)))
+    for row in ref_rows:
+        ref_offsets[row[0] + 1] += 1
+    for symbol in range(symbol_count):
+        def_offsets[symbol + 1] += def_offsets[symbol]
+        ref_offsets[symbol + 1] += ref_offsets[symbol]
+
+    arrays = pack_strings(list(names), "names")
+    arrays.update(pack_strings(files, "files"))
+    arrays.update(pack_strings(list(strings), "strings"))
+    arrays.update({
+        "def_offsets": def_offsets,
+        "def_symbol": array("I", [row[0] for row in def_rows]),
+        "def_file": array("I", [row[1] for row in def_rows]),
+        "def_level": array("B", [row[2] for row in def_rows]),
+        "def_picture": array("I", [row[3] for row in def_rows]),
+        "def_usage": array("I", [row[4] for row in def_rows]),
+        "def_parent": parents,
+        "def_start": array("Q", [row[6] for row in def_rows]),
+        "def_end": array("Q", [row[7] for row in def_rows]),
+        "def_line": array("I", [row[8] for row in def_rows]),
+        "ref_offsets": ref_offsets,
+        "ref_file": array("I", [row[1] for row in ref_rows]),
+        "ref_verb": array("I", [row[2] for row in ref_rows]),
+        "ref_start": array("Q", [row[3] for row in ref_rows]),
+        "ref_end": array("Q", [row[4] for row in ref_rows]),
+        "ref_line": array("I", [row[5] for row in ref_rows]),
+    })
+    header = {
+        "format": SYMBOL_INDEX_FORMAT,
+        "symbols": symbol_count,
+        "definitions": len(def_rows),
+        "references": len(ref_rows),
+        "files": len(files)
+    }
+    return {"header": header, "arrays": arrays}
+
+
+def symbol_index_path(project_id: str) -> Path:
+    return Path(output_dir) / "analysis" / project_id / SYMBOL_INDEX_FILE
+
+
+def save_symbol_index(project_id: str, index: Dict[str, Any]) -> Path:
+    """Write an index from build_symbol_index to output/analysis/<project_id>/symbol_index.idx."""
+    path = symbol_index_path(project_id)
+    write_index(path, index["header"], index["arrays"])
+    return path
+
+
+class SymbolIndex:
+    """
+    Query view over a saved symbol index.
+
+    Everything stays memory-mapped: opening the index is constant time and a
+    lookup is a binary search over the sorted names plus the rows it returns.
+    Definitions and references carry byte offsets into the uploaded member,
+    so callers can read exactly the lines they need with source_slice.
+    """
+    __slots__ = ("project_id", "header", "names", "files", "strings", "def_offsets", "def_symbol", "def_file",
+                 "def_level", "def_picture", "def_usage", "def_parent", "def_start", "def_end", "def_line",
+                 "ref_offsets", "ref_file", "ref_verb", "ref_start", "ref_end", "ref_line")
+
+    def __init__(self, project_id: str, header: Dict[str, Any], arrays: Dict[str, memoryview]):
+        self.project_id = project_id
+        self.header = header
+        self.names = StringTable(arrays, "names")
+        self.files = StringTable(arrays, "files")
+        self.strings = StringTable(arrays, "strings")
+        for name in self.__slots__[5:]:
+            setattr(self, name, arrays[name])
+
+    def _definition(self, row: int) -> Dict[str, Any]:
+        parent = self.def_parent[row]
+        return {
+            "file": self.files[self.def_file[row]],
+            "level": self.def_level[row],
+            "picture": self.strings[self.def_picture[row]],
+            "usage": self.strings[self.def_usage[row]],
+            "parent": None if parent == NO_PARENT else self.names[self.def_symbol[parent]],
+            "line": self.def_line[row],
+            "start": self.def_start[row],
+            "end": self.def_end[row]
+        }
+
+    def _reference(self, row: int) -> Dict[str, Any]:
+        return {
+            "file": self.files[self.ref_file[row]],
+            "verb": self.strings[self.ref_verb[row]],
+            "line": self.ref_line[row],
+            "start": self.ref_start[row],
+            "end": self.ref_end[row]
+        }
+
+    def lookup(self, name: str, max_references: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Definitions and reference sites of a data name, or None when it is not defined in the project.
+
+        Args:
+            name: Data name, case-insensitive
+            max_references: Return at most this many references; the total is
+                always reported as ``reference_count``
+        """
+        symbol = self.names.find(name.upper())
+        if symbol < 0:
+            return None
+        ref_start, ref_end = self.ref_offsets[symbol], self.ref_offsets[symbol + 1]
+        if max_references is not None:
+            ref_end = min(ref_end, ref_start + max_references)
+        return {
+            "name": self.names[symbol],
+            "definitions": [self._definition(row) for row in range(self.def_offsets[symbol], self.def_offsets[symbol + 1])],
+            "reference_count": self.ref_offsets[symbol + 1] - ref_start,
+            "references": [self._reference(row) for row in range(ref_start, ref_end)]
+        }
+
+    def search(self, prefix: str, limit: int = 100) -> List[str]:
+        """Defined names starting with ``prefix``, in sorted order."""
+        found = []
+        for symbol in self.names.prefixed(prefix.upper()):
+            found.append(self.names[symbol])
+            if len(found) >= limit:
+                break
+        return found
+
+
+def source_slice(project_id: str, file: str, start: int, end: int, encoding: str = "utf-8") -> str:
+    """Read bytes ``start`` to ``end`` of an uploaded member, e.g. one definition or reference site."""
+    with open(Path(UPLOAD_DIR) / project_id / file, mode='rb') as f:
+        f.seek(start)
+        return f.read(max(0, end - start)).decode(encoding, errors="ignore")
+
+
+def load_symbol_index(project_id: str) -> Optional[SymbolIndex]:
+    """Open the saved symbol index of a project, or None when the project has none or an outdated one."""
+    path = symbol_index_path(project_id)
+    if not path.exists():
+        return None
+    header, arrays = read_index(path)
+    if header.get("format") != SYMBOL_INDEX_FORMAT:
+        logger.info(f"Symbol index of {project_id} has format {header.get('format')}, ignoring it")
+        return None
+    return SymbolIndex(project_id, header, arrays)
@@ -0,0 +1 @@
+"""Synthetic COBOL corpora and throughput/memory benchmarks for the analyzer (``python -m benchmarks.run``)."""
@@ -0,0 +1,310 @@
+"""
+Deterministic generator of synthetic COBOL projects for the benchmarks.
+
+Programs are fixed-format (sequence numbers in columns 1-6, areas A and B)
+and mix the constructs the analyzer has to handle: nested group levels,
+OCCURS (fixed and DEPENDING ON), REDEFINES, 88 levels, COMP/COMP-3 items,
+COPY statements, FD entries, EXEC CICS and EXEC SQL blocks, sections with
+deep PERFORM chains, PERFORM THRU, GO TO, IF/EVALUATE nesting and CALLs.
+Copybooks carry record layouts and JCL members run the programs through a
+catalogued procedure. The same seed and size always give the same files.
+"""
+import random
+from pathlib import Path
+from typing import Dict, List
+
+# Lines per generated program when a project is split into members
+PROGRAM_LINES = 2000
+# Paragraphs per PERFORM chain: each one PERFORMs the next
+CHAIN_DEPTH = 24
+_PICTURES = ("X(10)", "X(30)", "9(5)", "S9(7)V99", "9(9)", "X(1)", "S9(4)", "X(80)")
+_USAGES = ("", "", " COMP-3", " COMP", "")
+
+
+class _Writer:
+    """Collects fixed-format cards with ascending sequence numbers."""
+
+    def __init__(self):
+        self.cards: List[str] = []
+
+    def a(self, text: str) -> None:
+        self.cards.append(f"{len(self.cards) + 1:06d} {text}")
+
+    def b(self, text: str, indent: int = 0) -> None:
+        self.cards.append(f"{len(self.cards) + 1:06d}     {' ' * indent}{text}")
+
+    def comment(self, text: str) -> None:
+        self.cards.append(f"{len(self.cards) + 1:06d}*{text}")
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def text(self) -> str:
+        return "\n".join(self.cards) + "\n"
+
+
+def _record_layout(out: _Writer, rng: random.Random, prefix: str, fields: int) -> List[str]:
+    """Emit a group with nested levels, OCCURS, REDEFINES and 88 levels; returns the elementary names."""
+    names = []
+    out.a(f"01  {prefix}-REC.")
+    group = 0
+    index = 0
+    while index < fields:
+        group += 1
+        out.b(f"05  {prefix}-GRP-{group}.", 1)
+        for _ in range(min(rng.randint(3, 8), fields - index)):
+            index += 1
+            name = f"{prefix}-F{index}"
+            names.append(name)
+            kind = rng.random()
+            picture = rng.choice(_PICTURES)
+            usage = rng.choice(_USAGES) if picture[0] in "9S" else ""
+            if kind < 0.12:
+                out.b(f"10  {name}-TAB OCCURS {rng.randint(2, 20)} TIMES.", 3)
+                out.b(f"15  {name} PIC {picture}{usage}.", 5)
+            elif kind < 0.18:
+                out.b(f"10  {name} PIC X(20).", 3)
+                out.b(f"10  {name}-R REDEFINES {name}.", 3)
+                out.b(f"15  {name}-P1 PIC X(10).", 5)
+                out.b(f"15  {name}-P2 PIC X(10).", 5)
+            elif kind < 0.26:
+                out.b(f"10  {name} PIC X(1).", 3)
+                out.b(f"88  {name}-YES VALUE 'Y'.", 7)
+                out.b(f"88  {name}-NO  VALUE 'N'.", 7)
+            else:
+                out.b(f"10  {name} PIC {picture}{usage}.", 3)
+    return names
+
+
+def generate_copybook(name: str, rng: random.Random, fields: int = 30) -> str:
+    """A record layout copybook of about ``fields * 1.4`` lines."""
+    out = _Writer()
+    out.comment(f" COPYBOOK {name} - GENERATED RECORD LAYOUT")
+    _record_layout(out, rng, name, fields)
+    return out.text()
+
+
+def generate_program(name: str, lines: int, rng: random.Random, copybooks: List[str] = ()) -> str:
+    """
+    A program of roughly ``lines`` lines: about a third data division and the rest procedure code.
+    """
+    out = _Writer()
+    out.a("IDENTIFICATION DIVISION.")
+    out.a(f"PROGRAM-ID. {name}.")
+    out.a("AUTHOR. BENCHMARK.")
+    out.a("ENVIRONMENT DIVISION.")
+    out.a("INPUT-OUTPUT SECTION.")
+    out.a("FILE-CONTROL.")
+    out.b(f"SELECT {name}-FILE ASSIGN TO {name[:6]}DD")
+    out.b("ORGANIZATION IS INDEXED ACCESS MODE IS DYNAMIC", 4)
+    out.b(f"RECORD KEY IS {name}-KEY FILE STATUS IS WS-STATUS.", 4)
+    out.a("DATA DIVISION.")
+    out.a("FILE SECTION.")
+    out.a(f"FD  {name}-FILE.")
+    out.a(f"01  {name}-FREC.")
+    out.b(f"05  {name}-KEY PIC X(10).", 1)
+    out.b(f"05  {name}-DATA PIC X(190).", 1)
+    out.a("WORKING-STORAGE SECTION.")
+    out.a("01  WS-STATUS PIC XX.")
+    out.a("01  WS-COUNT PIC S9(4) COMP VALUE 0.")
+    out.a("01  WS-DYN-TABLE.")
+    out.b("05  WS-DYN-ENTRY OCCURS 1 TO 500 TIMES", 1)
+    out.b("DEPENDING ON WS-COUNT.", 5)
+    out.b("10  WS-DYN-KEY PIC X(10).", 3)
+    out.b("10  WS-DYN-AMT PIC S9(7)V99 COMP-3.", 3)
+    for copybook in copybooks:
+        out.a(f"COPY {copybook}.")
+    out.b("EXEC SQL INCLUDE SQLCA END-EXEC.")
+
+    names: List[str] = []
+    data_budget = max(20, lines // 3)
+    group = 0
+    while len(out) < data_budget:
+        group += 1
+        names.extend(_record_layout(out, rng, f"WS{group}", rng.randint(10, 40)))
+    out.a("LINKAGE SECTION.")
+    out.a("01  DFHCOMMAREA PIC X(100).")
+
+    out.a("PROCEDURE DIVISION.")
+    out.a("MAIN-SECTION SECTION.")
+    out.a("MAIN-PARA.")
+    chains = max(1, (lines - len(out)) // (CHAIN_DEPTH * 14))
+    for chain in range(chains):
+        out.b(f"PERFORM C{chain}-P0 THRU C{chain}-EXIT")
+    out.b("EXEC CICS RETURN END-EXEC.")
+    out.b("GOBACK.")
+
+    chain = 0
+    while len(out) < lines:
+        out.a(f"C{chain}-SECTION SECTION.")
+        for depth in range(CHAIN_DEPTH):
+            out.a(f"C{chain}-P{depth}.")
+            field = rng.choice(names) if names else "WS-STATUS"
+            other = rng.choice(names) if names else "WS-STATUS"
+            kind = rng.random()
+            if kind < 0.15:
+                out.b("EXEC CICS READ")
+                out.b(f"DATASET('{name[:8]}') INTO({field})", 4)
+                out.b("RIDFLD(WS-STATUS) RESP(WS-COUNT)", 4)
+                out.b("END-EXEC")
+                out.b("IF WS-COUNT NOT = 0")
+                out.b("EXEC CICS SEND MAP('MAP1') MAPSET('SET1') END-EXEC", 4)
+                out.b("END-IF")
+            elif kind < 0.3:
+                out.b("EXEC SQL")
+                out.b(f"SELECT COL1, COL2 INTO :{field}, :{other}", 4)
+                out.b(f"FROM TB_{name} WHERE KEY_COL = :WS-STATUS", 4)
+                out.b("END-EXEC")
+                out.b("IF SQLCODE NOT = 0")
+                out.b(f"MOVE SPACES TO {field}", 4)
+                out.b("END-IF")
+            elif kind < 0.45:
+                out.b("EVALUATE TRUE")
+                out.b("WHEN WS-COUNT > 100", 4)
+                out.b(f"MOVE {other} TO {field}", 8)
+                out.b("WHEN WS-COUNT > 10", 4)
+                out.b("ADD 1 TO WS-COUNT", 8)
+                out.b("WHEN OTHER", 4)
+                out.b(f"CALL 'SUBPGM' USING {field} {other}", 8)
+                out.b("END-EVALUATE")
+            elif kind < 0.55:
+                out.b(f"READ {name}-FILE NEXT RECORD")
+                out.b("AT END", 4)
+                out.b("MOVE 'Y' TO WS-STATUS", 8)
+                out.b("NOT AT END", 4)
+                out.b("ADD 1 TO WS-COUNT", 8)
+                out.b("END-READ")
+            else:
+                out.b(f"MOVE {other} TO {field}")
+                out.b("COMPUTE WS-COUNT = WS-COUNT + 1")
+                out.b("IF WS-COUNT > 1000")
+                out.b("MOVE 0 TO WS-COUNT", 4)
+                out.b("ELSE")
+                out.b(f"PERFORM C{chain}-EXIT", 4)
+                out.b("END-IF")
+            if depth + 1 < CHAIN_DEPTH:
+                out.b(f"PERFORM C{chain}-P{depth + 1}")
+            else:
+                out.b(f"GO TO C{chain}-EXIT")
+            out.b(".")
+        out.a(f"C{chain}-EXIT.")
+        out.b("EXIT.")
+        chain += 1
+    return out.text()
+
+
+def generate_proc(name: str, programs: List[str]) -> str:
+    """A catalogued procedure running each program with symbolic dataset names."""
+    cards = [f"//{name:<8} PROC HLQ=PROD,ENV=P"]
+    for index, program in enumerate(programs):
+        cards += [
+            f"//S{index:<7} EXEC PGM={program},PARM='&ENV'",
+            f"//INFILE   DD DSN=&HLQ..{program}.INPUT,DISP=SHR",
+            f"//OUTFILE  DD DSN=&HLQ..{program}.OUTPUT(+1),",
+            "//            DISP=(NEW,CATLG,DELETE),SPACE=(CYL,(10,5))",
+            "//SYSOUT   DD SYSOUT=*",
+        ]
+    return "\n".join(cards) + "\n"
+
+
+def generate_job(name: str, proc: str, programs: List[str], rng: random.Random) -> str:
+    """A job calling the procedure plus a few direct program steps with in-stream data."""
+    cards = [
+        f"//{name:<8} JOB (ACCT),'BENCHMARK',CLASS=A,",
+        "//             MSGCLASS=X",
+        "//         SET HLQ=TEST",
+        f"//RUN      EXEC {proc},ENV={rng.choice(['P', 'T'])}",
+    ]
+    for index, program in enumerate(programs):
+        cards += [
+            f"//D{index:<7} EXEC PGM={program}",
+            f"//IN       DD DSN=PROD.{program}.OUTPUT(0),DISP=SHR",
+            "//SYSIN    DD *",
+            "  SORT FIELDS=(1,10,CH,A)",
+            "/*",
+        ]
+    return "\n".join(cards) + "\n"
+
+
+def generate_project(directory: Path, total_lines: int, seed: int = 0, program_lines: int = PROGRAM_LINES) -> Dict[str, int]:
+    """
+    Write a project of about ``total_lines`` lines into ``directory``.
+
+    Returns:
+        Counts of programs, copybooks and JCL members and the total line count
+    """
+    rng = random.Random(f"{seed}:{total_lines}")
+    directory.mkdir(parents=True, exist_ok=True)
+    program_count = max(1, round(total_lines * 0.9 / program_lines))
+    size = max(200, int(total_lines * 0.9) // program_count)
+    copybooks = [f"CPY{index:04d}" for index in range(max(1, program_count // 2))]
+    programs = [f"PGM{index:04d}" for index in range(program_count)]
+
+    lines = 0
+    for copybook in copybooks:
+        text = generate_copybook(copybook, rng, rng.randint(20, 40))
+        (directory / f"{copybook}.cpy").write_text(text)
+        lines += text.count("\n")
+    for program in programs:
+        text = generate_program(program, size, rng, rng.sample(copybooks, min(2, len(copybooks))))
+        (directory / f"{program}.cbl").write_text(text)
+        lines += text.count("\n")
+    jobs = 0
+    for start in range(0, program_count, 10):
+        group = programs[start:start + 10]
+        for text, member in ((generate_proc(f"PRC{start:05d}", group), f"PRC{start:05d}.jcl"),
+                             (generate_job(f"JOB{start:05d}", f"PRC{start:05d}", group, rng), f"JOB{start:05d}.jcl")):
+            (directory / member).write_text(text)
+            lines += text.count("\n")
+        jobs += 1
+    return {"programs": program_count, "copybooks": len(copybooks), "jcl": jobs * 2, "lines": lines}
+
+
+def generate_data_file(path: Path, copybook: str, count: int, seed: int = 0, batch_records: int = 8192) -> int:
+    """
+    Write ``count`` valid EBCDIC records of the first record in ``copybook`` (source text) to ``path``.
+
+    Zoned and packed decimals get random digits and signs, binary items random
+    values within their PICTURE, text items random capital letters.
+
+    Returns:
+        Record length in bytes
+    """
+    import numpy as np
+    from app.utils.cobol_parser import parse_cobol
+    from app.utils.cobol_tokenizer import iter_source_lines
+    from app.utils.record_layout import compile_layouts
+    from app.utils.record_decoder import RecordDecoder, TEXT, ZONED, PACKED, BINARY
+
+    decoder = RecordDecoder(compile_layouts(parse_cobol(iter_source_lines(copybook.splitlines())))[0])
+    letters = np.frombuffer("ABCDEFGHIJKLMNOPQRSTUVWXYZ ".encode("cp037"), dtype=np.uint8)
+    rng = np.random.default_rng(seed)
+    with open(path, mode='wb') as f:
+        for start in range(0, count, batch_records):
+            records = np.zeros(min(batch_records, count - start), dtype=decoder.dtype)
+            for column in decoder.columns:
+                target = records
+                for name in column.path[:-1]:
+                    target = target[name]
+                shape = target.shape + column.shape
+                if column.kind == TEXT:
+                    data = letters[rng.integers(0, len(letters), shape + (column.length,))]
+                elif column.kind == ZONED:
+                    data = (0xF0 | rng.integers(0, 10, shape + (column.length,))).astype(np.uint8)
+                    position = 0 if column.sign.startswith("LEADING") else -1
+                    if column.sign.endswith("SEPARATE"):
+                        data[..., position] = np.where(rng.random(shape) < 0.5, 0x4E, 0x60)  # '+' or '-'
+                    elif column.signed:
+                        data[..., position] = (data[..., position] & 0x0F) | np.where(rng.random(shape) < 0.5, 0xC0, 0xD0)
+                elif column.kind == PACKED:
+                    nibbles = rng.integers(0, 10, shape + (2 * column.length,))
+                    nibbles[..., -1] = np.where(rng.random(shape) < 0.5, 0x0C, 0x0D) if column.signed else 0x0F
+                    data = (nibbles[..., 0::2] << 4 | nibbles[..., 1::2]).astype(np.uint8)
+                elif column.kind == BINARY:
+                    limit = 10 ** min(column.digits or 4, 18)
+                    data = rng.integers(-limit + 1 if column.signed else 0, limit, shape)
+                else:
+                    continue
+                target[column.path[-1]] = data
+            records.tofile(f)
+    return decoder.dtype.itemsize
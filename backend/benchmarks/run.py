@@ -0,0 +1,293 @@
+"""
+Analyzer benchmark suite.
+
+Run from ``backend/``::
+
+    python -m benchmarks.run                       # 1k, 10k and 100k lines
+    python -m benchmarks.run --sizes 1000000       # 1M lines
+    python -m benchmarks.run --compare benchmarks/results/<commit>.json
+
+Every (benchmark, size) case runs in a fresh process inside a scratch working
+directory, so peak RSS is that of the case alone and nothing is written under
+``uploads/`` or ``output/``. For each case the suite records the best wall
+time of ``--repeat`` runs, throughput in lines and megabytes per second, the
+process peak RSS and its growth over the prepared inputs, and one extra run
+under tracemalloc for the peak of Python allocations and the number of
+memory blocks still allocated afterwards. Results are written as JSON to
+``benchmarks/results/<commit>.json``; ``--compare`` reports the cases that
+got slower or bigger than a previous results file by more than
+``--threshold`` and exits with status 1 if there are any.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+# Bump whenever the layout of the results file changes
+RESULTS_FORMAT = 1
+BENCHMARKS = (
+    "analyze_cobol_file",
+    "create_cobol_json_cold",
+    "create_cobol_json_warm",
+    "classify_uploaded_files",
+    "detect_database_usage",
+    "decode_records",
+)
+DEFAULT_SIZES = (1000, 10000, 100000)
+# Metrics compared by --compare; larger is worse for all of them
+COMPARED_METRICS = ("seconds", "peak_rss_mb", "alloc_peak_mb")
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _current_rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20), 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _prepare(benchmark: str, size: int, workers: int) -> Tuple[Callable[[], Any], Callable[[], None], Dict[str, int]]:
+    """
+    Generate the inputs of a case in the current (scratch) directory.
+
+    Returns:
+        (the measured call, a reset run before every call, input counts)
+    """
+    import random
+    import shutil
+    from .corpus import generate_copybook, generate_data_file, generate_program, generate_project
+
+    if benchmark == "analyze_cobol_file":
+        from app.utils.cobol_analyzer import analyze_cobol_file
+        path = Path("uploads") / "single" / "BENCH.cbl"
+        path.parent.mkdir(parents=True)
+        path.write_text(generate_program("BENCH", size, random.Random(f"single:{size}")))
+        inputs = {"files": 1, "lines": size, "bytes": path.stat().st_size}
+        return lambda: analyze_cobol_file(path), lambda: None, inputs
+
+    if benchmark == "decode_records":
+        # Here size counts records (reported as lines) of a generated copybook's layout
+        from app.utils.record_decoder import decoder_for
+        from app.utils.cobol_parser import parse_cobol
+        from app.utils.cobol_tokenizer import iter_source_lines
+        from app.utils.record_layout import compile_layouts
+        copybook = generate_copybook("BENCHREC", random.Random(f"records:{size}"))
+        path = Path("BENCH.dat")
+        generate_data_file(path, copybook, size)
+        decoder = decoder_for(compile_layouts(parse_cobol(iter_source_lines(copybook.splitlines()))))
+        inputs = {"files": 1, "lines": size, "bytes": path.stat().st_size}
+        return lambda: sum(1 for _ in decoder.iter_file(path)), lambda: None, inputs
+
+    project_id = f"bench-{size}"
+    project_dir = Path("uploads") / project_id
+    counts = generate_project(project_dir, size)
+    paths = sorted(project_dir.iterdir())
+    inputs = {"files": len(paths), "lines": counts["lines"], "bytes": sum(path.stat().st_size for path in paths)}
+
+    if benchmark.startswith("create_cobol_json"):
+        from app.config import output_dir
+        from app.utils.cobol_analyzer import create_cobol_json
+
+        def cold() -> None:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+        if benchmark.endswith("_warm"):
+            create_cobol_json(project_id, workers=workers)
+            return lambda: create_cobol_json(project_id, workers=workers), lambda: None, inputs
+        return lambda: create_cobol_json(project_id, workers=workers), cold, inputs
+
+    # Members are named without extensions, as they come out of a PDS, so they are classified by content
+    contents = {path.stem: path.read_text() for path in paths}
+    if benchmark == "classify_uploaded_files":
+        from app.utils.file_classifier import classify_uploaded_files
+        return lambda: classify_uploaded_files(contents), lambda: None, inputs
+
+    if benchmark == "detect_database_usage":
+        from app.utils.db_usage import detect_database_usage
+        # The conversion route passes the programs joined into one string
+        source = "\n".join(text for path, text in zip(paths, contents.values()) if path.suffix == ".cbl")
+        inputs.update(files=sum(path.suffix == ".cbl" for path in paths), lines=source.count("\n") + 1,
+                      bytes=len(source))
+        return lambda: detect_database_usage(source), lambda: None, inputs
+
+    raise ValueError(f"Unknown benchmark: {benchmark}")
+
+
+def _run_case(benchmark: str, size: int, repeat: int, workers: int, workdir: str, queue) -> None:
+    """Child process entry point: measure one case and put its result dictionary on ``queue``."""
+    try:
+        os.chdir(workdir)
+        os.makedirs("logs", exist_ok=True)  # app.config logs to logs/app.log
+        sys.path.insert(0, str(BACKEND_DIR))
+        import logging
+        import app.config  # noqa: F401 - configures logging, which is then silenced
+        logging.disable(logging.WARNING)
+
+        call, reset, inputs = _prepare(benchmark, size, workers)
+        gc.collect()
+        rss_before = _current_rss_mb()
+
+        timings = []
+        for _ in range(repeat):
+            reset()
+            started = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - started)
+        peak_rss = _peak_rss_mb()
+
+        reset()
+        gc.collect()
+        blocks_before = sys.getallocatedblocks()
+        tracemalloc.start()
+        call()
+        _, alloc_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        gc.collect()
+        blocks = sys.getallocatedblocks() - blocks_before
+
+        seconds = min(timings)
+        queue.put({
+            "benchmark": benchmark,
+            "size": size,
+            **inputs,
+            "seconds": round(seconds, 4),
+            "seconds_all": [round(timing, 4) for timing in timings],
+            "lines_per_second": round(inputs["lines"] / seconds) if seconds else None,
+            "mb_per_second": round(inputs["bytes"] / (1 << 20) / seconds, 2) if seconds else None,
+            "peak_rss_mb": peak_rss,
+            "rss_growth_mb": round(peak_rss - rss_before, 1) if peak_rss is not None and rss_before is not None else None,
+            "alloc_peak_mb": round(alloc_peak / (1 << 20), 2),
+            "alloc_blocks": blocks
+        })
+    except Exception as e:
+        queue.put({"benchmark": benchmark, "size": size, "error": f"{type(e).__name__}: {e}"})
+
+
+def run_case(benchmark: str, size: int, repeat: int = 3, workers: int = 1) -> Dict[str, Any]:
+    """Run one case in a fresh process and scratch directory and return its result."""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    with tempfile.TemporaryDirectory(prefix="cobol-bench-") as workdir:
+        process = context.Process(target=_run_case, args=(benchmark, size, repeat, workers, workdir, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+    return result
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Cases whose compared metrics grew by more than ``threshold`` (0.1 = 10%) over ``baseline``.
+
+    Returns:
+        One description per regression
+    """
+    previous = {(case["benchmark"], case["size"]): case for case in baseline.get("results", [])}
+    regressions = []
+    for case in results["results"]:
+        before = previous.get((case["benchmark"], case["size"]))
+        if before is None or "error" in case or "error" in before:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = before.get(metric), case.get(metric)
+            if old and new is not None and new > old * (1 + threshold):
+                regressions.append(f"{case['benchmark']} @ {case['size']}: {metric} {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def _print_row(case: Dict[str, Any]) -> None:
+    if "error" in case:
+        print(f"{case['benchmark']:<26}{case['size']:>9}  {case['error']}", flush=True)
+        return
+    print(f"{case['benchmark']:<26}{case['size']:>9}{case['seconds']:>10.3f}{case['lines_per_second']:>12,}"
+          f"{case['mb_per_second']:>8.2f}{case['peak_rss_mb'] or 0:>10.1f}{case['alloc_peak_mb']:>10.1f}", flush=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the COBOL analyzer on generated corpora.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated corpus sizes in lines (default: %(default)s)")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS),
+                        help="Comma-separated benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case; the best is reported")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for create_cobol_json (default 1, for comparable numbers)")
+    parser.add_argument("--output", type=Path, help="Results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="Previous results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative growth counted as a regression")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    benchmarks = args.benchmarks.split(",")
+    unknown = set(benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    commit = _git("rev-parse", "HEAD")
+    results = {
+        "format": RESULTS_FORMAT,
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "results": []
+    }
+    print(f"{'benchmark':<26}{'size':>9}{'seconds':>10}{'lines/s':>12}{'MB/s':>8}{'peak RSS':>10}{'alloc MB':>10}")
+    for size in sizes:
+        for benchmark in benchmarks:
+            case = run_case(benchmark, size, args.repeat, args.workers)
+            results["results"].append(case)
+            _print_row(case)
+
+    output = args.output or RESULTS_DIR / f"{(commit or 'unversioned')[:12]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions over {args.compare} (threshold {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())